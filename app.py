@@ -1,16 +1,29 @@
 # app.py
 import streamlit as st
 import pandas as pd
-import json
 import os
 from datetime import datetime
 from mastery import EMAMastery
+from mastery_snapshot import SnapshotEMAMastery
+import instrumentation
 from recommender import Recommender
+from recommendation_cache import RecommendationCache
+from progress_store import SQLiteProgressStore, new_entry
+from resources import get_interaction_log, get_online_trainer, get_progress_store, get_question_index, get_shared_mastery
 
 DATA_DIR = "data"
 SUBJECTS_FILE = os.path.join(DATA_DIR, "subjects.json")
 PROGRESS_FILE = os.path.join(DATA_DIR, "progress.json")
+# progress backend: a .json path (default) or a .db/.sqlite path for the SQLite store
+PROGRESS_STORE = os.environ.get("PROGRESS_STORE", PROGRESS_FILE)
 LOG_CSV = os.path.join(DATA_DIR, "students.csv")
+# answers are written to the log in batches (by count or after LOG_FLUSH_SECONDS);
+# LOG_ROTATE=1 writes daily files (students-YYYY-MM-DD.csv) next to it
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "32"))
+LOG_FLUSH_SECONDS = float(os.environ.get("LOG_FLUSH_SECONDS", "2"))
+LOG_ROTATE = os.environ.get("LOG_ROTATE", "0") == "1"
+# optional mastery snapshot (python mastery_snapshot.py build); loaded lazily per student
+MASTERY_SNAPSHOT = os.path.join(DATA_DIR, "mastery_snapshot")
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -19,20 +32,16 @@ if not os.path.exists(SUBJECTS_FILE):
     st.error("subjects.json not found in data/. Please add data/subjects.json")
     st.stop()
 
-with open(SUBJECTS_FILE, "r", encoding="utf-8") as f:
-    subjects_data = json.load(f)["subjects"]
+# compiled to data/subjects.db on first use (and again when subjects.json changes);
+# opened once per process, question text is read one question at a time
+question_bank = get_question_index(SUBJECTS_FILE)
 
-# Load or init progress
-if not os.path.exists(PROGRESS_FILE):
-    with open(PROGRESS_FILE, "w", encoding="utf-8") as f:
-        json.dump({}, f)
+# Open (or init) the progress store (once per process; SQLite connections are per thread)
+progress_store = get_progress_store(PROGRESS_STORE)
 
-with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
-    progress = json.load(f)
-
-# Ensure students.csv exists (header) so logging append works
-if not os.path.exists(LOG_CSV):
-    pd.DataFrame(columns=["student_id", "topic_id", "timestamp", "correct"]).to_csv(LOG_CSV, index=False)
+# Shared interaction log (loaded once per process; new answers are appended in memory)
+interaction_log = get_interaction_log(LOG_CSV, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_SECONDS,
+                                      rotate=LOG_ROTATE)
 
 # Pastel theme injection (minimal)
 st.markdown(
@@ -58,25 +67,35 @@ if not student_id:
     st.stop()
 
 # Build a mapping structures
-subject_names = [s["subject_name"] for s in subjects_data]
-subject_map = {s["subject_name"]: s for s in subjects_data}
-
-# Flatten topics list and make topics list for recommender
-topics_flat = []
-topic_meta = {}  # topic_id -> metadata
-for s in subjects_data:
-    for t in s["topics"]:
-        topics_flat.append(t["topic_id"])
-        topic_meta[t["topic_id"]] = {
-            "subject": s["subject_name"],
-            "title": t["title"],
-            "questions": t["questions"]
-        }
+subject_names = question_bank.subjects()
+
+# Flattened topics list for recommender (cached with the question bank)
+topics_flat = question_bank.topics_flat
+
+# Only the active student's progress is read
+progress = {student_id: progress_store.load_student(student_id)}
 
 # Initialize mastery engine and preload from progress (EMA)
-if 'ema_engine' not in st.session_state:
-    st.session_state['ema_engine'] = EMAMastery(alpha=0.3)
-    # preload any existing progress entries into the mastery engine
+# with the SQLite store every session and process shares one mastery state (shared_mastery.py)
+shared_mastery = isinstance(progress_store, SQLiteProgressStore)
+if shared_mastery:
+    st.session_state['ema_engine'] = get_shared_mastery(PROGRESS_STORE, alpha=0.3)
+elif 'ema_engine' not in st.session_state:
+    if os.path.exists(os.path.join(MASTERY_SNAPSHOT, "meta.json")):
+        # memory-mapped snapshot + the student's newer progress entries, one student at a time
+        st.session_state['ema_engine'] = SnapshotEMAMastery(MASTERY_SNAPSHOT, progress=progress_store)
+    else:
+        # a session touches a handful of pairs one answer at a time: the dict engine's
+        # single updates are faster than the array-backed ones (see compact_mastery.py)
+        st.session_state['ema_engine'] = EMAMastery(alpha=0.3)
+    st.session_state['loaded_students'] = set()
+if shared_mastery:
+    pass  # nothing to preload: reads go to the store
+elif isinstance(st.session_state['ema_engine'], SnapshotEMAMastery):
+    st.session_state['ema_engine'].load_student(student_id, entries=progress[student_id])
+elif student_id not in st.session_state['loaded_students']:
+    st.session_state['loaded_students'].add(student_id)
+    # preload the student's existing progress entries into the mastery engine
     for sid, v in progress.items():
         for topic_id, stats in v.items():
             # stats expected: {attempts, corrects, mastery (optional), last_review_iso}
@@ -90,19 +109,25 @@ if 'ema_engine' not in st.session_state:
             # If a saved mastery present use it, else compute ratio
             saved_mastery = stats.get("mastery")
             if saved_mastery is not None:
-                st.session_state['ema_engine'].mastery[f"{sid}||{topic_id}"] = saved_mastery
-                if last_dt:
-                    st.session_state['ema_engine'].last_review[f"{sid}||{topic_id}"] = last_dt
+                st.session_state['ema_engine'].set_state(sid, topic_id, saved_mastery, last_dt)
             else:
                 attempts = stats.get("attempts", 0)
                 corrects = stats.get("corrects", 0)
                 ratio = corrects / attempts if attempts > 0 else 0.2
-                st.session_state['ema_engine'].mastery[f"{sid}||{topic_id}"] = ratio
-                if last_dt:
-                    st.session_state['ema_engine'].last_review[f"{sid}||{topic_id}"] = last_dt
+                st.session_state['ema_engine'].set_state(sid, topic_id, ratio, last_dt)
 
-# Build recommender (it will try to load ML model if present)
-rec = Recommender(topics_flat, mastery_engine=st.session_state['ema_engine'], data_csv=LOG_CSV)
+# Online learning: answers train a model in a background thread (toggled in the sidebar)
+online_trainer = get_online_trainer()
+
+# Build recommender (cheap: the ML model and the log come from process-wide caches);
+# while online learning runs, its latest model is swapped in on every rerun
+online_model = online_trainer.model if online_trainer.running and online_trainer.ready else None
+# rankings are cached per session and invalidated by this session's mastery updates
+# (not with the shared engine: other sessions and processes change it too)
+if 'rec_cache' not in st.session_state:
+    st.session_state['rec_cache'] = None if shared_mastery else RecommendationCache(max_students=64)
+rec = Recommender(topics_flat, mastery_engine=st.session_state['ema_engine'], data_csv=LOG_CSV, log=interaction_log,
+                  model=online_model, cache=st.session_state['rec_cache'])
 
 # Sidebar controls
 st.sidebar.header("Controls")
@@ -112,8 +137,18 @@ if st.sidebar.button("Get 3 topic recommendations"):
     st.sidebar.success("Study these next: " + ", ".join(recs))
 
 st.sidebar.markdown("---")
-if st.sidebar.button("Train ML model (train_ml.py)"):
-    st.sidebar.info("Run `python train_ml.py` in terminal; Streamlit cannot run long CPU tasks reliably here.")
+if st.sidebar.button("Stop online learning" if online_trainer.running else "Start online learning"):
+    if online_trainer.running:
+        online_trainer.stop()
+        st.sidebar.info("Online learning stopped; model checkpointed to " + online_trainer.checkpoint_path)
+    else:
+        online_trainer.start()
+        st.sidebar.info("Every answer now trains the model in the background. "
+                        "For a full retrain run `python train_ml.py` in a terminal.")
+if online_trainer.running:
+    seen = online_trainer.model.n_seen if online_trainer.model is not None else 0
+    st.sidebar.caption(f"Online model v{online_trainer.version}: {seen} answers"
+                       + ("" if online_trainer.ready else f" (used after {online_trainer.min_rows})"))
 
 # Main UI: choose subject -> topic
 col1, col2 = st.columns([3, 1])
@@ -121,13 +156,10 @@ with col1:
     st.subheader("Subjects")
     chosen_subject = st.selectbox("Pick a subject", subject_names)
     st.markdown(f"**{chosen_subject}** — pick a topic to begin")
-    subject_obj = subject_map[chosen_subject]
-    topics = subject_obj["topics"]
-    topic_titles = [f'{t["topic_id"]} — {t["title"]}' for t in topics]
-    chosen_topic_label = st.selectbox("Topic", topic_titles)
-    # extract topic_id
-    chosen_topic_id = chosen_topic_label.split(" — ")[0]
-    meta = topic_meta[chosen_topic_id]
+    topic_ids = question_bank.topic_ids(chosen_subject)
+    chosen_topic_id = st.selectbox("Topic", topic_ids,
+                                   format_func=lambda tid: f'{tid} — {question_bank.topic(tid)["title"]}')
+    meta = question_bank.topic(chosen_topic_id)
     st.markdown(f"**Topic:** {meta['title']}")
 
 with col2:
@@ -136,10 +168,9 @@ with col2:
     student_progress = progress.get(student_id, {})
     # create a small table of mastery across current subject's topics
     rows = []
-    for t in topics:
-        tid = t["topic_id"]
+    for tid in topic_ids:
         m = st.session_state['ema_engine'].get_mastery(student_id, tid)
-        rows.append({"topic_id": tid, "title": t["title"], "mastery": f"{m:.2f}"})
+        rows.append({"topic_id": tid, "title": question_bank.topic(tid)["title"], "mastery": f"{m:.2f}"})
     st.table(pd.DataFrame(rows))
 
 st.markdown("---")
@@ -151,13 +182,13 @@ if sess_key not in st.session_state:
     st.session_state[sess_key] = 0  # 0 or 1 for two questions
 
 q_index = st.session_state[sess_key]
-questions = meta["questions"]
-if q_index >= len(questions):
+n_questions = meta["n_questions"]
+if q_index >= n_questions:
     st.session_state[sess_key] = 0
     q_index = 0
 
-current_q = questions[q_index]
-st.markdown(f"### Question {q_index + 1} of {len(questions)}")
+current_q = question_bank.question(chosen_topic_id, q_index)
+st.markdown(f"### Question {q_index + 1} of {n_questions}")
 st.markdown(f"**{current_q['q']}**", unsafe_allow_html=True)
 
 # Show options as radio
@@ -175,39 +206,44 @@ with colA:
             st.success("Correct! ✅")
         else:
             st.error(f"Incorrect — correct answer: {correct_letter}.")
-        # update progress json and mastery engine and append to CSV log
-        # initialize student entry if missing
-        if student_id not in progress:
-            progress[student_id] = {}
-        student_dict = progress[student_id]
-        if chosen_topic_id not in student_dict:
-            student_dict[chosen_topic_id] = {"attempts": 0, "corrects": 0, "last_review": None, "mastery": None}
-        entry = student_dict[chosen_topic_id]
-        entry["attempts"] = entry.get("attempts", 0) + 1
-        entry["corrects"] = entry.get("corrects", 0) + (1 if is_correct else 0)
-        entry["last_review"] = datetime.utcnow().isoformat()
-        # update mastery via EMA engine
-        st.session_state['ema_engine'].update(student_id, chosen_topic_id, int(is_correct), timestamp=datetime.utcnow())
-        # store current mastery back
-        entry["mastery"] = st.session_state['ema_engine'].get_mastery(student_id, chosen_topic_id)
-        # save progress file
-        with open(PROGRESS_FILE, "w", encoding="utf-8") as f:
-            json.dump(progress, f, indent=2)
-        # append to CSV for logs (train_ml uses this)
-        df = pd.DataFrame([{
-            "student_id": student_id,
-            "topic_id": chosen_topic_id,
-            "timestamp": datetime.utcnow().isoformat(),
-            "correct": int(is_correct)
-        }])
-        df.to_csv(LOG_CSV, mode="a", header=False, index=False)
+        # update progress json and mastery engine and append to CSV log, all with the same time
+        answered_at = datetime.utcnow()
+        if shared_mastery:
+            # the shared engine updates the stored entry itself, under the student's lock
+            entry = st.session_state['ema_engine'].update(student_id, chosen_topic_id, int(is_correct),
+                                                          timestamp=answered_at)
+            progress.setdefault(student_id, {})[chosen_topic_id] = entry
+        else:
+            # initialize student entry if missing
+            if student_id not in progress:
+                progress[student_id] = {}
+            student_dict = progress[student_id]
+            if chosen_topic_id not in student_dict:
+                student_dict[chosen_topic_id] = new_entry()
+            entry = student_dict[chosen_topic_id]
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            entry["corrects"] = entry.get("corrects", 0) + (1 if is_correct else 0)
+            entry["last_review"] = answered_at.isoformat()
+            # update mastery via EMA engine
+            st.session_state['ema_engine'].update(student_id, chosen_topic_id, int(is_correct),
+                                                  timestamp=answered_at)
+            # store current mastery back
+            entry["mastery"] = st.session_state['ema_engine'].get_mastery(student_id, chosen_topic_id)
+            # save this entry only
+            progress_store.upsert(student_id, chosen_topic_id, entry)
+        # features of this answer for online learning: taken before it is logged
+        answer_features = interaction_log.features.features_matrix(student_id, [chosen_topic_id], answered_at)[0]
+        # log the answer (train_ml uses this): the cached log and ML features update now, the CSV on the next flush
+        interaction_log.append(student_id, chosen_topic_id, int(is_correct), timestamp=answered_at)
+        if online_trainer.running:
+            online_trainer.observe(answer_features, is_correct)
         # advance to next question (or wrap)
-        st.session_state[sess_key] = (st.session_state[sess_key] + 1) % len(questions)
+        st.session_state[sess_key] = (st.session_state[sess_key] + 1) % n_questions
 
 with colB:
     if st.button("Skip question"):
         st.info("Skipped. Moving to next question.")
-        st.session_state[sess_key] = (st.session_state[sess_key] + 1) % len(questions)
+        st.session_state[sess_key] = (st.session_state[sess_key] + 1) % n_questions
 
 st.markdown("---")
 # Quick controls: view progress, reset topic mastery
@@ -215,14 +251,13 @@ if st.button("Reset mastery for this topic"):
     # reset in progress and EMA engine
     if student_id in progress and chosen_topic_id in progress[student_id]:
         del progress[student_id][chosen_topic_id]
-        with open(PROGRESS_FILE, "w", encoding="utf-8") as f:
-            json.dump(progress, f, indent=2)
-    # remove from EMA maps
-    key = f"{student_id}||{chosen_topic_id}"
-    if key in st.session_state['ema_engine'].mastery:
-        del st.session_state['ema_engine'].mastery[key]
-    if key in st.session_state['ema_engine'].last_review:
-        del st.session_state['ema_engine'].last_review[key]
+        progress_store.delete(student_id, chosen_topic_id)
+    # remove from the mastery engine
+    st.session_state['ema_engine'].reset(student_id, chosen_topic_id)
     st.success("Reset completed.")
 
-st.caption("Progress is saved locally in data/progress.json and logged to data/students.csv for model training.")
+st.caption(f"Progress is saved locally in {PROGRESS_STORE} and logged to data/students.csv for model training.")
+
+# Admin: stage latencies (off unless switched on here or with STUDY_PLANNER_METRICS=1)
+with st.sidebar.expander("Performance (admin)"):
+    instrumentation.streamlit_panel(st)
@@ -0,0 +1,95 @@
+# benchmarks/bench_build_features.py
+"""
+Checks train_ml.build_features against the original per-row implementation and
+shows how its runtime scales with log size.
+
+    python benchmarks/bench_build_features.py --sizes 10000 100000 1000000 10000000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from train_ml import build_features
+
+def build_features_reference(df, window=5):
+    """The original iterrows implementation (O(n^2) per student), kept as the oracle."""
+    rows = []
+    for sid, g in df.groupby('student_id'):
+        g = g.sort_values('timestamp', kind='mergesort').reset_index(drop=True)
+        topic_total = {}
+        topic_correct = {}
+        for idx, r in g.iterrows():
+            topic = r['topic_id']
+            correct = r['correct']
+            total = topic_total.get(topic, 0)
+            corrects = topic_correct.get(topic, 0)
+            acc = corrects / total if total > 0 else 0.5
+            prevs = g.loc[:idx-1]
+            last_topic_attempts = prevs[prevs['topic_id'] == topic].tail(window)
+            rec_corrects = int(last_topic_attempts['correct'].sum()) if not last_topic_attempts.empty else 0
+            if not prevs.empty:
+                last_time = (pd.to_datetime(r['timestamp']) - pd.to_datetime(prevs.iloc[-1]['timestamp'])).total_seconds() / 3600.0
+            else:
+                last_time = 9999.0
+            rows.append({
+                "student_id": sid,
+                "topic_id": topic,
+                "total_attempts_on_topic": total,
+                "accuracy_on_topic": acc,
+                "recent_corrects_on_topic": rec_corrects,
+                "hours_since_last_activity": last_time,
+                "label": correct
+            })
+            topic_total[topic] = total + 1
+            topic_correct[topic] = corrects + int(correct)
+    return pd.DataFrame(rows)
+
+def synthetic_log(n_rows, events_per_student=100, num_topics=50, seed=0):
+    """Random interaction log with `n_rows` events (categorical ids, sorted per student)."""
+    rng = np.random.default_rng(seed)
+    n_students = max(1, n_rows // events_per_student)
+    students = np.repeat(np.arange(n_students), events_per_student)[:n_rows]
+    gaps = rng.exponential(scale=8 * 3600, size=n_rows).astype('timedelta64[s]')
+    timestamps = np.datetime64('2025-01-01') + np.cumsum(gaps)
+    return pd.DataFrame({
+        "student_id": pd.Categorical.from_codes(students, [f"student_{i+1}" for i in range(n_students)]),
+        "topic_id": pd.Categorical.from_codes(rng.integers(0, num_topics, n_rows), [f"topic_{i+1}" for i in range(num_topics)]),
+        "timestamp": timestamps,
+        "correct": (rng.random(n_rows) < 0.6).astype(np.int8),
+    })
+
+def check_equivalence(csv_path):
+    df = pd.read_csv(csv_path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    expected = build_features_reference(df)
+    got = build_features(df)
+    pd.testing.assert_frame_equal(expected, got, check_dtype=False)
+    print(f"build_features matches the reference on {csv_path} ({len(df)} rows)")
+
+def run(sizes, reference_max):
+    print(f"{'rows':>10} {'build_features (s)':>20} {'rows/s':>12} {'reference (s)':>15}")
+    for n in sizes:
+        df = synthetic_log(n)
+        start = time.perf_counter()
+        build_features(df)
+        fast = time.perf_counter() - start
+        ref = ""
+        if n <= reference_max:
+            start = time.perf_counter()
+            build_features_reference(df)
+            ref = f"{time.perf_counter() - start:.2f}"
+        print(f"{n:>10} {fast:>20.3f} {n / fast:>12.0f} {ref:>15}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="data/students.csv", help="log used for the equivalence check")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--reference-max", type=int, default=10_000, help="largest size also timed with the reference")
+    args = parser.parse_args()
+    if os.path.exists(args.csv):
+        check_equivalence(args.csv)
+    run(args.sizes, args.reference_max)
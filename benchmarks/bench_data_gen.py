@@ -0,0 +1,83 @@
+# benchmarks/bench_data_gen.py
+"""
+Compares data_gen's block simulation with the original per-interaction loop: the
+two draw different random numbers, so the check is on the dynamics (accuracy,
+gaps, topic mix, learning over time), plus rows/s of each and of generate_logs.
+
+    python benchmarks/bench_data_gen.py --students 2000 --interactions 60
+    python benchmarks/bench_data_gen.py --out /tmp/big.parquet --rows 10000000 --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_gen import generate_logs, generate_simulated_logs
+
+def generate_reference(num_students, num_topics, interactions_per_student, start_date):
+    """The original loop (one rng.choice and one dict per interaction), kept as the oracle."""
+    rng = np.random.default_rng(42)
+    rows = []
+    topic_difficulty = rng.uniform(0.2, 0.9, size=num_topics)
+    for s in range(1, num_students + 1):
+        mastery = rng.uniform(0.0, 0.6, size=num_topics)
+        last_time = start_date
+        for i in range(interactions_per_student):
+            weights = (1 - mastery) + 0.1
+            topic = int(rng.choice(np.arange(num_topics), p=weights/weights.sum()))
+            last_time += timedelta(minutes=int(rng.exponential(scale=24*60/3)))
+            prob_correct = 0.2 * (1 - topic_difficulty[topic]) + 0.8 * mastery[topic]
+            correct = int(rng.random() < prob_correct)
+            mastery[topic] = mastery[topic] * 0.85 + 0.15 * correct
+            rows.append({"student_id": f"student_{s}", "topic_id": f"topic_{topic+1}",
+                         "timestamp": last_time.isoformat(), "correct": correct})
+    return pd.DataFrame(rows)
+
+def dynamics(df):
+    ts = pd.to_datetime(df['timestamp'])
+    by_student = df.groupby('student_id', sort=False)
+    step = by_student.cumcount()
+    # share of a student's attempts on their most practised topic: the weak-topic bias
+    top_share = df.groupby(['student_id', 'topic_id']).size().groupby(level=0).max() / by_student.size()
+    return {
+        "accuracy": df['correct'].mean(),
+        "acc_first_quarter": df['correct'][step < step.max() / 4].mean(),
+        "acc_last_quarter": df['correct'][step >= 3 * step.max() / 4].mean(),
+        "mean_gap_min": ts.groupby(df['student_id'], sort=False).diff().dt.total_seconds().mean() / 60,
+        "top_topic_share": top_share.mean(),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=12)
+    parser.add_argument("--interactions", type=int, default=60)
+    parser.add_argument("--out", help="also time generate_logs writing this file (.csv or .parquet)")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="rows for the --out run")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    start = datetime(2025, 1, 1)
+    n = args.students * args.interactions
+    t0 = time.perf_counter()
+    ref = generate_reference(args.students, args.topics, args.interactions, start)
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = generate_simulated_logs(args.students, args.topics, args.interactions, start_date=start, out_path=None)
+    t_new = time.perf_counter() - t0
+    print(f"{n} rows: loop {t_ref:.2f}s ({n / t_ref:,.0f} rows/s), blocks {t_new:.3f}s ({n / t_new:,.0f} rows/s)")
+    ref_stats, new_stats = dynamics(ref), dynamics(new)
+    print(f"{'':<20} {'loop':>10} {'blocks':>10}")
+    for key in ref_stats:
+        print(f"{key:<20} {ref_stats[key]:>10.4f} {new_stats[key]:>10.4f}")
+    if args.out:
+        students = max(1, args.rows // args.interactions)
+        t0 = time.perf_counter()
+        rows = generate_logs(args.out, students, args.topics, args.interactions, start_date=start,
+                             workers=args.workers)
+        t_out = time.perf_counter() - t0
+        print(f"generate_logs -> {args.out}: {rows} rows in {t_out:.1f}s ({rows / t_out:,.0f} rows/s, "
+              f"{os.path.getsize(args.out) / 2**20:.0f} MB, {args.workers} worker(s))")
@@ -0,0 +1,58 @@
+# benchmarks/bench_log_load.py
+"""
+Load time and memory of the interaction log: the original CSV parse (object ids,
+string timestamps parsed with pd.to_datetime) vs read_log on the CSV and on the
+compacted columnar file (needs pyarrow).
+
+    python benchmarks/bench_log_load.py --rows 1000000 5000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_build_features import synthetic_log
+from interaction_log import compact_log, format_row, read_log
+
+def write_csv(df, path):
+    """Write a log the way app.py does (ISO timestamps with microseconds)."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("student_id,topic_id,timestamp,correct\n")
+        for r in df.itertuples(index=False):
+            f.write(format_row(r.student_id, r.topic_id, r.correct, r.timestamp.to_pydatetime()))
+
+def read_csv_original(path):
+    df = pd.read_csv(path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    df = fn(*args)
+    return time.perf_counter() - start, df.memory_usage(deep=True).sum() / 2**20
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    print(f"{'rows':>10} {'loader':>18} {'seconds':>9} {'MB':>9}")
+    for n in args.rows:
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "students.csv")
+            write_csv(synthetic_log(n), path)
+            results = [("csv original", *timed(read_csv_original, path)),
+                       ("read_log csv", *timed(read_log, path))]
+            try:
+                compact_log(path)
+                results.append(("read_log columnar", *timed(read_log, path)))
+            except ImportError as e:
+                print("Skipping columnar:", e)
+            for name, seconds, mb in results:
+                print(f"{n:>10} {name:>18} {seconds:>9.3f} {mb:>9.1f}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,82 @@
+# benchmarks/bench_mastery.py
+"""
+Memory and throughput of the dict-based mastery engines (mastery.py) against the
+array-backed ones (compact_mastery.py).
+
+    python benchmarks/bench_mastery.py --students 20000 --topics 50
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mastery import EMAMastery, SM2Mastery
+from compact_mastery import CompactEMAMastery, CompactSM2Mastery
+
+def make_events(n_students, n_topics, seed=0):
+    """One answer per (student, topic) pair, in random order."""
+    rng = np.random.default_rng(seed)
+    n = n_students * n_topics
+    order = rng.permutation(n)
+    students = np.array([f"student_{i}" for i in range(n_students)], dtype=object)[order // n_topics]
+    topics = np.array([f"topic_{i}" for i in range(n_topics)], dtype=object)[order % n_topics]
+    corrects = (rng.random(n) < 0.6).astype(np.int8)
+    start = datetime(2025, 1, 1)
+    stamps = [start + timedelta(minutes=int(m)) for m in rng.integers(0, 60 * 24 * 90, n)]
+    return students, topics, corrects, stamps
+
+def build(cls, students, topics, corrects, stamps):
+    engine = cls()
+    for s, t, c, ts in zip(students, topics, corrects, stamps):
+        engine.update(s, t, c, ts)
+    return engine
+
+def retained_bytes(fn):
+    """Memory still allocated by the object `fn` returns (tracemalloc, measured separately from timings)."""
+    tracemalloc.start()
+    obj = fn()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return current
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def run(n_students, n_topics):
+    students, topics, corrects, stamps = make_events(n_students, n_topics)
+    stamps64 = np.array(stamps, dtype="datetime64[us]")
+    n = len(students)
+    topic_ids = [f"topic_{i}" for i in range(n_topics)]
+    probe = [f"student_{i}" for i in range(min(n_students, 1000))]
+    gets = len(probe) * n_topics
+    print(f"{n} (student, topic) pairs ({n_students} students x {n_topics} topics)\n")
+    print(f"{'engine':<22} {'bytes/pair':>10} {'update/s':>12} {'update_many/s':>14} {'get/s':>12} {'get_many/s':>12}")
+    for name, cls in [("EMAMastery", EMAMastery), ("CompactEMAMastery", CompactEMAMastery),
+                      ("SM2Mastery", SM2Mastery), ("CompactSM2Mastery", CompactSM2Mastery)]:
+        engine, t_update = timed(lambda: build(cls, students, topics, corrects, stamps))
+        rate_many = "-"
+        if hasattr(cls, "update_many"):
+            _, t_many = timed(lambda: cls().update_many(students, topics, corrects, stamps64))
+            rate_many = f"{n / t_many:.0f}"
+            nbytes = retained_bytes(lambda: (lambda e: (e.update_many(students, topics, corrects, stamps64), e)[1])(cls()))
+        else:
+            nbytes = retained_bytes(lambda: build(cls, students, topics, corrects, stamps))
+        get = engine.get_mastery if hasattr(engine, "get_mastery") else engine.get_mastery_score_estimate
+        _, t_get = timed(lambda: [get(s, t) for s in probe for t in topic_ids])
+        _, t_get_many = timed(lambda: [engine.get_mastery_many(s, topic_ids) for s in probe])
+        print(f"{name:<22} {nbytes / n:>10.0f} {n / t_update:>12.0f} {rate_many:>14} "
+              f"{gets / t_get:>12.0f} {gets / t_get_many:>12.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=50)
+    args = parser.parse_args()
+    run(args.students, args.topics)
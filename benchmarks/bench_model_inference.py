@@ -0,0 +1,78 @@
+# benchmarks/bench_model_inference.py
+"""
+sklearn RandomForestClassifier vs its compiled form (compiled_forest.py): agreement
+of predict_proba, load time, size on disk, and single-row / batch latency.
+
+    python benchmarks/bench_model_inference.py --rows 20000 --batch 1 50 1000
+    python benchmarks/bench_model_inference.py --model models/rf_study_recommender.pkl
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_build_features import synthetic_log
+from compiled_forest import CompiledForest, can_compile, export_forest
+from train_ml import FEATURE_COLUMNS, build_features
+
+def train_synthetic(n_rows):
+    feats = build_features(synthetic_log(n_rows))
+    clf = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
+    clf.fit(feats[FEATURE_COLUMNS].to_numpy(), feats['label'].to_numpy())
+    return clf, feats[FEATURE_COLUMNS].to_numpy()
+
+def latency_ms(fn, X, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return np.percentile(times, 50) * 1000, np.percentile(times, 99) * 1000
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", help="pickled forest to compile (default: train one on a synthetic log)")
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic log size when training")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 50, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    if args.model:
+        clf = joblib.load(args.model)
+        if not can_compile(clf):
+            raise SystemExit(f"{args.model} is not a tree ensemble; nothing to compile")
+        X = build_features(synthetic_log(max(args.batch) * 2))[FEATURE_COLUMNS].to_numpy()
+    else:
+        clf, X = train_synthetic(args.rows)
+    tmp = tempfile.mkdtemp()
+    try:
+        pkl = os.path.join(tmp, "model.pkl")
+        joblib.dump(clf, pkl)
+        forest_dir = os.path.join(tmp, "model.forest")
+        export_forest(clf, forest_dir)
+        start = time.perf_counter()
+        joblib.load(pkl)
+        t_pickle = time.perf_counter() - start
+        start = time.perf_counter()
+        forest = CompiledForest(forest_dir)
+        t_forest = time.perf_counter() - start
+        print(f"load: pickle {t_pickle * 1000:.1f} ms ({os.path.getsize(pkl) / 2**20:.1f} MB), "
+              f"compiled {t_forest * 1000:.2f} ms ({dir_size(forest_dir) / 2**20:.1f} MB)")
+        diff = np.abs(forest.predict_proba(X) - clf.predict_proba(X)).max()
+        print(f"max |p_compiled - p_sklearn| over {len(X)} rows: {diff:.2e}")
+        print(f"{'batch':>6} {'sklearn p50/p99 ms':>20} {'compiled p50/p99 ms':>21}")
+        for n in args.batch:
+            batch = X[:n]
+            s50, s99 = latency_ms(clf.predict_proba, batch, args.repeat)
+            c50, c99 = latency_ms(forest.predict_proba, batch, args.repeat)
+            print(f"{n:>6} {s50:>11.2f} / {s99:<7.2f} {c50:>11.2f} / {c99:<7.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
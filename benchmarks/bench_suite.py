@@ -0,0 +1,211 @@
+# benchmarks/bench_suite.py
+"""
+Microbenchmarks of the hot paths on simulated logs (data_gen.generate_simulated_logs)
+at several scales, with a JSON record of the results and a regression check.
+
+Cases, per scale:
+- mastery.ema.update / mastery.ema.get_mastery / mastery.sm2.update
+- recommend.mastery (no model) / recommend.model (small RandomForest trained in memory)
+- features.student_topic (Recommender._build_student_topic_features)
+- train_ml.build_features (whole log)
+
+Every case reports pytest-benchmark style per-call stats (min, max, mean, stddev,
+median, iqr, ops) over `--rounds` timed rounds after one warm-up round.
+
+    python benchmarks/bench_suite.py run --scales small medium --out before.json
+    python benchmarks/bench_suite.py run --scales small medium --out after.json
+    python benchmarks/bench_suite.py compare before.json after.json --threshold 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from data_gen import generate_simulated_logs
+from mastery import EMAMastery, SM2Mastery
+from recommender import Recommender
+from train_ml import FEATURE_COLUMNS, build_features
+
+# name -> (students, topics, interactions per student)
+SCALES = {
+    "small": (50, 12, 60),
+    "medium": (300, 30, 100),
+    "large": (1000, 50, 200),
+}
+
+def stats(per_call):
+    """pytest-benchmark style summary of per-call seconds."""
+    t = np.asarray(per_call)
+    q1, median, q3 = np.percentile(t, [25, 50, 75])
+    return {
+        "min": float(t.min()),
+        "max": float(t.max()),
+        "mean": float(t.mean()),
+        "stddev": float(t.std(ddof=1)) if len(t) > 1 else 0.0,
+        "median": float(median),
+        "iqr": float(q3 - q1),
+        "ops": float(1.0 / t.mean()) if t.mean() > 0 else 0.0,
+        "rounds": len(t),
+    }
+
+def measure(fn, calls, rounds):
+    """Time `fn` (which makes `calls` calls of the benchmarked function) and return per-call stats."""
+    fn()  # warm-up
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        per_call.append((time.perf_counter() - start) / calls)
+    result = stats(per_call)
+    result["iterations"] = calls
+    return result
+
+def replay(cls, events):
+    engine = cls()
+    for s, t, c, ts in events:
+        engine.update(s, t, c, ts)
+    return engine
+
+def train_small_model(df):
+    from sklearn.ensemble import RandomForestClassifier
+    feats = build_features(df)
+    clf = RandomForestClassifier(n_estimators=50, max_depth=8, random_state=42, n_jobs=1)
+    clf.fit(feats[FEATURE_COLUMNS].to_numpy(), feats['label'].to_numpy())
+    return clf
+
+def run_scale(scale, rounds, sample, tmp):
+    n_students, n_topics, per_student = SCALES[scale]
+    start_date = datetime(2025, 1, 1)
+    df = generate_simulated_logs(n_students, n_topics, per_student, start_date=start_date, out_path=None)
+    csv_path = os.path.join(tmp, f"{scale}.csv")
+    df.to_csv(csv_path, index=False)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    events = list(zip(df['student_id'], df['topic_id'], df['correct'].astype(int),
+                      df['timestamp'].dt.to_pydatetime()))
+    topics = sorted(df['topic_id'].unique())
+    students = sorted(df['student_id'].unique())[:sample]
+    pairs = [(s, t) for s in students for t in topics]
+    now = df['timestamp'].max().to_pydatetime()
+    params = {"students": n_students, "topics": n_topics, "interactions_per_student": per_student,
+              "rows": len(df)}
+
+    results = {}
+    results["mastery.ema.update"] = measure(lambda: replay(EMAMastery, events), len(events), rounds)
+    ema = replay(EMAMastery, events)
+    results["mastery.ema.get_mastery"] = measure(
+        lambda: [ema.get_mastery(s, t) for s, t in pairs], len(pairs), rounds)
+    results["mastery.sm2.update"] = measure(lambda: replay(SM2Mastery, events), len(events), rounds)
+
+    rec = Recommender(topics, mastery_engine=ema, data_csv=csv_path)
+    rec.model = None  # the constructor falls back to the saved model; benchmark the mastery path
+    results["features.student_topic"] = measure(
+        lambda: [rec._build_student_topic_features(s, t, now) for s, t in pairs], len(pairs), rounds)
+    results["recommend.mastery"] = measure(
+        lambda: [rec.recommend(s, n=3, now=now) for s in students], len(students), rounds)
+    rec.model = train_small_model(df)
+    results["recommend.model"] = measure(
+        lambda: [rec.recommend(s, n=3, now=now) for s in students], len(students), rounds)
+    results["train_ml.build_features"] = measure(lambda: build_features(df), 1, rounds)
+    return params, results
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def machine_info():
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+def run(scales, rounds, sample, out):
+    tmp = tempfile.mkdtemp()
+    benchmarks = []
+    try:
+        for scale in scales:
+            params, results = run_scale(scale, rounds, sample, tmp)
+            for case, s in results.items():
+                benchmarks.append({"name": f"{case}[{scale}]", "group": case, "scale": scale,
+                                   "params": params, "stats": s})
+                print(f"{case + '[' + scale + ']':<40} median {s['median'] * 1e6:>12.2f} us"
+                      f"  stddev {s['stddev'] * 1e6:>10.2f} us  ops {s['ops']:>12.1f}/s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    report = {
+        "machine_info": machine_info(),
+        "commit_info": {"id": git_commit()},
+        "datetime": datetime.utcnow().isoformat(),
+        "benchmarks": benchmarks,
+    }
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Saved", out)
+
+def compare(baseline_path, new_path, threshold, stat):
+    """Print per-benchmark change of `stat`; return the names slower than baseline by more than threshold."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {b["name"]: b for b in json.load(f)["benchmarks"]}
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = {b["name"]: b for b in json.load(f)["benchmarks"]}
+    regressions = []
+    print(f"{'benchmark':<40} {'baseline us':>12} {'new us':>12} {'change':>9}")
+    for name in sorted(set(baseline) | set(new)):
+        if name not in new or name not in baseline:
+            print(f"{name:<40} {'only in ' + ('baseline' if name in baseline else 'new'):>35}")
+            continue
+        old_t = baseline[name]["stats"][stat]
+        new_t = new[name]["stats"][stat]
+        change = new_t / old_t - 1 if old_t > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<40} {old_t * 1e6:>12.2f} {new_t * 1e6:>12.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mastery / recommender / feature microbenchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_p = sub.add_parser("run", help="run the suite and save the results as JSON")
+    run_p.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    run_p.add_argument("--rounds", type=int, default=5)
+    run_p.add_argument("--sample", type=int, default=50, help="students probed by the per-student cases")
+    run_p.add_argument("--out", default=None, help="default: benchmarks/results/<timestamp>.json")
+    cmp_p = sub.add_parser("compare", help="compare two result files; exit 1 on regressions")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("new")
+    cmp_p.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown (0.10 = 10%%)")
+    cmp_p.add_argument("--stat", default="median", choices=["min", "mean", "median"])
+    args = parser.parse_args()
+    if args.command == "run":
+        out = args.out or os.path.join(ROOT, "benchmarks", "results",
+                                       datetime.utcnow().strftime("%Y%m%d-%H%M%S") + ".json")
+        run(args.scales, args.rounds, args.sample, out)
+    else:
+        regressions = compare(args.baseline, args.new, args.threshold, args.stat)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions.")
@@ -0,0 +1,110 @@
+# benchmarks/load_test.py
+"""
+Load test for service.py: `--concurrency` client processes, each on one keep-alive
+connection, send a mix of answer / recommend / mastery / bulk recommend requests for
+`--duration` seconds. Reports requests/sec and p50 / p99 latency per endpoint.
+
+    python service.py --port 8000 --workers 4 --progress /tmp/progress.db --log /tmp/students.csv &
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 8 --duration 10
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import random
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+# endpoint -> share of requests
+DEFAULT_MIX = {"answer": 0.4, "recommend": 0.4, "mastery": 0.15, "bulk": 0.05}
+
+def _request(conn, method, path, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    headers = {"Content-Type": "application/json"} if data is not None else {}
+    conn.request(method, path, body=data, headers=headers)
+    resp = conn.getresponse()
+    payload = resp.read()
+    if resp.status != 200:
+        raise RuntimeError(f"{method} {path}: {resp.status} {payload[:200]!r}")
+    return json.loads(payload) if resp.getheader("Content-Type", "").startswith("application/json") else payload
+
+def _client(args):
+    url, seed, duration, mix, n_students, bulk_size, topics = args
+    rng = random.Random(seed)
+    host = urlsplit(url)
+    conn = http.client.HTTPConnection(host.hostname, host.port, timeout=30)
+    names, weights = list(mix), list(mix.values())
+    latencies = {name: [] for name in names}
+    errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        sid = f"student_{rng.randint(1, n_students)}"
+        start = time.perf_counter()
+        try:
+            if name == "answer":
+                _request(conn, "POST", "/answer", {"student_id": sid, "topic_id": rng.choice(topics),
+                                                   "correct": int(rng.random() < 0.6)})
+            elif name == "recommend":
+                _request(conn, "GET", f"/recommend?student_id={sid}&n=3")
+            elif name == "mastery":
+                _request(conn, "GET", f"/mastery?student_id={sid}")
+            else:
+                sids = [f"student_{rng.randint(1, n_students)}" for _ in range(bulk_size)]
+                _request(conn, "POST", "/recommend/bulk", {"student_ids": sids, "n": 3})
+        except (OSError, http.client.HTTPException, RuntimeError) as e:
+            errors += 1
+            if errors <= 3:
+                print("Request failed:", e)
+            conn.close()
+            conn = http.client.HTTPConnection(host.hostname, host.port, timeout=30)
+            continue
+        latencies[name].append(time.perf_counter() - start)
+    conn.close()
+    return latencies, errors
+
+def run(url, concurrency, duration, mix, n_students, bulk_size):
+    host = urlsplit(url)
+    conn = http.client.HTTPConnection(host.hostname, host.port, timeout=30)
+    topics = _request(conn, "GET", "/topics")["topics"]
+    conn.close()
+    tasks = [(url, seed, duration, mix, n_students, bulk_size, topics) for seed in range(concurrency)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(concurrency) as pool:
+        results = pool.map(_client, tasks)
+    elapsed = time.perf_counter() - start
+    merged = {name: [] for name in mix}
+    errors = 0
+    for latencies, errs in results:
+        errors += errs
+        for name, values in latencies.items():
+            merged[name].extend(values)
+    total = sum(len(v) for v in merged.values())
+    print(f"{total} requests in {elapsed:.1f}s with {concurrency} clients: {total / elapsed:,.0f} req/s, "
+          f"{errors} errors")
+    print(f"{'endpoint':<12} {'count':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    every = []
+    for name, values in merged.items():
+        if not values:
+            continue
+        every.extend(values)
+        ms = np.array(values) * 1000
+        print(f"{name:<12} {len(ms):>8} {len(ms) / elapsed:>9.0f} {np.percentile(ms, 50):>9.2f} "
+              f"{np.percentile(ms, 99):>9.2f} {ms.max():>9.2f}")
+    if every:
+        ms = np.array(every) * 1000
+        print(f"{'all':<12} {len(ms):>8} {len(ms) / elapsed:>9.0f} {np.percentile(ms, 50):>9.2f} "
+              f"{np.percentile(ms, 99):>9.2f} {ms.max():>9.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8, help="client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--students", type=int, default=1000, help="student ids used: student_1..N")
+    parser.add_argument("--bulk-size", type=int, default=50, help="students per bulk recommend")
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX,
+                        help='endpoint shares as JSON, e.g. \'{"recommend": 1}\'')
+    args = parser.parse_args()
+    run(args.url, args.concurrency, args.duration, args.mix, args.students, args.bulk_size)
@@ -0,0 +1,167 @@
+# benchmarks/stress_shared_mastery.py
+"""
+Stress test for shared_mastery.SharedEMAMastery: `--writers` processes x `--threads`
+threads apply a generated answer stream to one progress.db at the same time, then the
+stored state is checked against a serial replay through EMAMastery. Modes (default: all):
+
+- disjoint: each (student, topic) pair belongs to one writer thread, which applies its
+  answers in stream order, while every student's topics are spread over all writers.
+  Mastery, last review, attempts and corrects of every pair must equal the replay.
+- overlap: every thread takes a round-robin share of the stream, so pairs are written
+  concurrently; the order per pair is up to the scheduler, so only attempts / corrects
+  (no lost updates) are checked.
+- contended: every answer goes to `--hot-pairs` pairs of one student, and half of the
+  threads write as service.py does (store.update_entry, no stripe lock); attempts must
+  equal the number of answers per pair.
+
+    python benchmarks/stress_shared_mastery.py --writers 4 --threads 4 --answers 20000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mastery import EMAMastery
+from progress_store import SQLiteProgressStore, entry_state
+from shared_mastery import SharedEMAMastery
+
+MODES = ("disjoint", "overlap", "contended")
+
+def answer_stream(n_answers, n_students, n_topics, seed=0):
+    """(student ids, topic ids, corrects, timestamps) in time order."""
+    rng = np.random.default_rng(seed)
+    students = rng.integers(0, n_students, n_answers)
+    topics = rng.integers(0, n_topics, n_answers)
+    corrects = (rng.random(n_answers) < 0.6).astype(int)
+    start = datetime(2025, 1, 1)
+    stamps = [start + timedelta(seconds=int(s)) for s in np.cumsum(rng.integers(1, 600, n_answers))]
+    return ([f"student_{s}" for s in students], [f"topic_{t}" for t in topics], corrects.tolist(), stamps)
+
+def assignment(stream, n_topics, n_slots, mode):
+    """Writer slot of every answer: by pair (each pair in one slot) when disjoint, else round-robin."""
+    students, topics = stream[0], stream[1]
+    if mode != "disjoint":
+        return [i % n_slots for i in range(len(students))]
+    pair = [int(s.split("_")[1]) * n_topics + int(t.split("_")[1]) for s, t in zip(students, topics)]
+    return [p % n_slots for p in pair]
+
+def _service_update(store, student_id, topic_id, correct, timestamp, alpha=0.3):
+    """An answer written the way service.py's StudyService.answer writes it."""
+    def apply(entry):
+        mastery = entry_state(entry)[0]
+        entry["attempts"] = entry.get("attempts", 0) + 1
+        entry["corrects"] = entry.get("corrects", 0) + correct
+        entry["last_review"] = timestamp.isoformat()
+        entry["mastery"] = alpha * correct + (1 - alpha) * mastery
+        return entry
+
+    store.update_entry(student_id, topic_id, apply)
+
+def _writer(task):
+    """One process: `threads` threads, each applying its slot's answers in stream order."""
+    db, stream, slots, first_slot, threads, stripes, mixed = task
+    engine = SharedEMAMastery(db, stripes=stripes)
+    errors = []
+
+    def run(slot):
+        try:
+            for i, s in enumerate(slots):
+                if s != slot:
+                    continue
+                if mixed and slot % 2:
+                    _service_update(engine.store, stream[0][i], stream[1][i], stream[2][i], stream[3][i])
+                else:
+                    engine.update(stream[0][i], stream[1][i], stream[2][i], stream[3][i])
+        except Exception as e:
+            errors.append(repr(e))
+
+    pool = [threading.Thread(target=run, args=(first_slot + k,)) for k in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start, errors
+
+def serial_replay(stream, alpha=0.3):
+    """EMAMastery state plus attempts / corrects per pair, applying the stream in order."""
+    engine = EMAMastery(alpha=alpha)
+    counts = {}
+    for sid, tid, correct, ts in zip(*stream):
+        engine.update(sid, tid, correct, ts)
+        attempts, corrects = counts.get((sid, tid), (0, 0))
+        counts[(sid, tid)] = (attempts + 1, corrects + correct)
+    return engine, counts
+
+def check(db, stream, exact, alpha=0.3):
+    """Number of pairs whose stored state differs from the serial replay."""
+    engine, counts = serial_replay(stream, alpha)
+    stored = SQLiteProgressStore(db).load_all()
+    n_stored = sum(len(topics) for topics in stored.values())
+    bad = 0
+    if n_stored != len(counts):
+        print(f"stored pairs: {n_stored}, expected {len(counts)}")
+        bad += abs(n_stored - len(counts))
+    for (sid, tid), (attempts, corrects) in counts.items():
+        entry = stored.get(sid, {}).get(tid)
+        if entry is None or (entry["attempts"], entry["corrects"]) != (attempts, corrects):
+            bad += 1
+            continue
+        if exact:
+            mastery, last = entry_state(entry)
+            if abs(mastery - engine.get_mastery(sid, tid)) > 1e-12 or last != engine.get_last_review(sid, tid):
+                bad += 1
+    return bad
+
+def run(mode, writers, threads, n_answers, n_students, n_topics, stripes, hot_pairs=1, seed=0, db=None):
+    """One stress run on a fresh store; returns the number of failures (writer errors + bad pairs)."""
+    with tempfile.TemporaryDirectory(prefix="shared-mastery-") as tmp:
+        db = db or os.path.join(tmp, "progress.db")
+        if os.path.exists(db):
+            sys.exit(f"{db} exists; the check needs an empty store")
+        SQLiteProgressStore(db)  # create the table (and WAL) once, before the writers race
+        if mode == "contended":
+            stream = answer_stream(n_answers, 1, hot_pairs, seed)
+        else:
+            stream = answer_stream(n_answers, n_students, n_topics, seed)
+        n_slots = writers * threads
+        slots = assignment(stream, n_topics, n_slots, mode)
+        tasks = [(db, stream, slots, w * threads, threads, stripes, mode == "contended") for w in range(writers)]
+        start = time.perf_counter()
+        with multiprocessing.Pool(writers) as pool:
+            results = pool.map(_writer, tasks)
+        elapsed = time.perf_counter() - start
+        errors = [e for _, errs in results for e in errs]
+        print(f"[{mode}] {n_answers} updates by {writers} processes x {threads} threads in {elapsed:.2f}s "
+              f"({n_answers / elapsed:,.0f} updates/s), {len(errors)} errors")
+        for e in errors[:3]:
+            print("Writer failed:", e)
+        exact = mode == "disjoint"
+        bad = check(db, stream, exact)
+        what = "mastery, last review, attempts and corrects" if exact else "attempts / corrects"
+        print(f"[{mode}] {what} vs serial replay: {'OK' if bad == 0 else f'{bad} pairs differ'}")
+    return bad + len(errors)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+    parser.add_argument("--db", help="progress store to write (default: a fresh temporary file; single mode only)")
+    parser.add_argument("--writers", type=int, default=4, help="processes")
+    parser.add_argument("--threads", type=int, default=4, help="threads per process")
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--topics", type=int, default=12)
+    parser.add_argument("--hot-pairs", type=int, default=1, help="pairs every writer hits in contended mode")
+    parser.add_argument("--answers", type=int, default=20000)
+    parser.add_argument("--stripes", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    modes = MODES if args.mode == "all" else (args.mode,)
+    failures = sum(run(mode, args.writers, args.threads, args.answers, args.students, args.topics, args.stripes,
+                       args.hot_pairs, args.seed, args.db if len(modes) == 1 else None) for mode in modes)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,241 @@
+# cohort.py
+"""
+Cohort reports: students x topics mastery and priority matrices, and every
+student's top-n topics, for a whole class at once.
+
+CohortReport aggregates the interaction log once (per-(student, topic) counts,
+recent corrects and last times, per-student last activity, all with sorted array
+passes) and then works through the cohort one chunk of students at a time:
+engine state is gathered into chunk x topics arrays, the model (if any) scores
+the whole chunk in one predict_proba call, and the priorities are the same as
+Recommender.score_topics gives. Memory is bounded by the chunk size, not by the cohort.
+
+    python cohort.py --progress data/progress.json --top data/cohort_top.csv --heatmap data/mastery_heatmap.csv
+"""
+import argparse
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from compact_mastery import CompactEMAMastery, CompactSM2Mastery, NAT, decayed
+from mastery import EMAMastery, SM2Mastery
+
+class CohortChunk:
+    """One chunk of students: ids, mastery / priority matrices (students x topics) and top-n topic ids."""
+    __slots__ = ("students", "topics", "mastery", "priority", "top")
+
+    def __init__(self, students, topics, mastery, priority, top):
+        self.students = students
+        self.topics = topics
+        self.mastery = mastery
+        self.priority = priority
+        self.top = top
+
+def _positions(values, index):
+    """Position of each value in `index` (-1 if absent); categorical columns are mapped once per category."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        cat_pos = index.get_indexer(values.cat.categories)
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, cat_pos[codes], -1)
+    return index.get_indexer(values)
+
+def _whole_days(delta):
+    """timedelta64 array -> whole days, floored like timedelta.days."""
+    with np.errstate(invalid="ignore"):  # NaT entries; callers mask them
+        return (delta // np.timedelta64(1, "D")).astype(float)
+
+class CohortReport:
+    """
+    Bulk counterpart of Recommender.recommend / score_topics and the engine's
+    get_mastery for a list of students (default: every student in the log).
+    """
+    def __init__(self, recommender, students=None, chunk_size=2048):
+        self.recommender = recommender
+        self.topics = list(recommender.topics)
+        df = recommender.df
+        if students is None:
+            students = sorted(df['student_id'].unique().tolist()) if len(df) else []
+        self.students = list(students)
+        self.chunk_size = chunk_size
+        self._aggregate_log(df)
+
+    def _aggregate_log(self, df):
+        n_topics = len(self.topics)
+        window = self.recommender.window
+        student_index = pd.Index(self.students)
+        rows = _positions(df['student_id'], student_index) if len(df) else np.empty(0, dtype=np.int64)
+        cols = _positions(df['topic_id'], pd.Index(self.topics)) if len(df) else np.empty(0, dtype=np.int64)
+        times = df['timestamp'].to_numpy(dtype="datetime64[us]") if len(df) else np.empty(0, "datetime64[us]")
+        correct = df['correct'].to_numpy(dtype=np.int64) if len(df) else np.empty(0, dtype=np.int64)
+        # last activity counts answers on any topic (NaT is the smallest datetime64)
+        known = rows >= 0
+        self.last_activity = np.full(len(self.students), NAT)
+        np.maximum.at(self.last_activity.view(np.int64), rows[known], times[known].view(np.int64))
+        # per pair, events in time order (ties in log order, as FeatureStore.from_dataframe)
+        keep = known & (cols >= 0)
+        pair = rows[keep].astype(np.int64) * n_topics + cols[keep]
+        times, correct = times[keep], correct[keep]
+        order = np.lexsort((times, pair))
+        pair, times, correct = pair[order], times[order], correct[order]
+        starts = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]]) if len(pair) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(pair)]
+        group = np.repeat(np.arange(len(starts)), ends - starts)
+        from_end = ends[group] - 1 - np.arange(len(pair))
+        self.pairs = pair[starts]  # sorted, so each chunk of students is one slice
+        self.total = ends - starts
+        self.corrects = np.add.reduceat(correct, starts) if len(starts) else np.empty(0, dtype=np.int64)
+        self.recent = np.bincount(group, weights=np.where(from_end < window, correct, 0), minlength=len(starts))
+        self.last_time = times[ends - 1] if len(starts) else np.empty(0, "datetime64[us]")
+
+    def _log_features(self, a, b, now):
+        """Feature tensor (chunk, topics, 4) in FEATURE_COLUMNS order, as FeatureStore.features_matrix."""
+        n_topics = len(self.topics)
+        X = np.zeros((b - a, n_topics, 4))
+        X[:, :, 1] = 0.5
+        lo, hi = np.searchsorted(self.pairs, [a * n_topics, b * n_topics])
+        r, c = np.divmod(self.pairs[lo:hi] - a * n_topics, n_topics)
+        X[r, c, 0] = self.total[lo:hi]
+        X[r, c, 1] = self.corrects[lo:hi] / self.total[lo:hi]
+        X[r, c, 2] = self.recent[lo:hi]
+        last = self.last_activity[a:b]
+        hours = (np.datetime64(now, "us") - last) / np.timedelta64(3600, "s")
+        X[:, :, 3] = np.where(np.isnat(last), 9999.0, hours)[:, None]
+        return X
+
+    def _log_last_times(self, a, b):
+        n_topics = len(self.topics)
+        out = np.full((b - a, n_topics), NAT)
+        lo, hi = np.searchsorted(self.pairs, [a * n_topics, b * n_topics])
+        r, c = np.divmod(self.pairs[lo:hi] - a * n_topics, n_topics)
+        out[r, c] = self.last_time[lo:hi]
+        return out
+
+    def _engine_state(self, a, b, now):
+        """
+        (mastery, review times) matrices of the chunk: last review for EMA, next review for SM2.
+        Decaying engines give their mastery as of `now`.
+        """
+        engine = self.recommender.mastery
+        students = self.students[a:b]
+        if hasattr(engine, "load_student"):  # SnapshotEMAMastery
+            for sid in students:
+                engine.load_student(sid)
+        if isinstance(engine, (CompactEMAMastery, CompactSM2Mastery)):
+            pairs = engine.pairs
+            rows = np.array([pairs.student_index.get(s, -1) for s in students], dtype=np.int64)
+            cols = pairs.columns(self.topics)
+            known = (rows[:, None] >= 0) & (cols[None, :] >= 0)
+            r, c = np.broadcast_to(rows[:, None], known.shape)[known], np.broadcast_to(cols, known.shape)[known]
+
+            def gather(name):
+                dtype, fill = pairs.fields[name]
+                out = np.full(known.shape, fill, dtype=dtype)
+                out[known] = pairs.arrays[name][r, c]
+                return out
+
+            if hasattr(engine, "mastery_as_of"):  # DecayEMAMastery
+                last = gather("last_review")
+                return decayed(gather("mastery"), last, now, engine.initial, engine.half_life_days), last
+            if isinstance(engine, CompactEMAMastery):
+                return gather("mastery"), gather("last_review")
+            score = np.minimum(0.99, 0.2 + 0.2 * gather("repetitions") + 0.2 * (gather("ef") - 1.3))
+            return np.where(gather("seen"), score, 0.2), gather("next_review")
+        if isinstance(engine, EMAMastery):
+            keys = [engine._key(s, t) for s in students for t in self.topics]
+            mastery = np.array([engine.mastery.get(k, engine.initial) for k in keys], dtype=float)
+            times = np.array([engine.last_review.get(k) for k in keys], dtype="datetime64[us]")
+        elif isinstance(engine, SM2Mastery):
+            keys = [engine._key(s, t) for s in students for t in self.topics]
+            mastery = np.array([engine.get_mastery_score_estimate(s, t) for s in students for t in self.topics])
+            items = [engine.store.get(k) for k in keys]
+            times = np.array([i.next_review if i is not None else None for i in items], dtype="datetime64[us]")
+        else:
+            return None, self._log_last_times(a, b)
+        shape = (len(students), len(self.topics))
+        return mastery.reshape(shape), times.reshape(shape)
+
+    def _chunk(self, a, b, now, n):
+        rec = self.recommender
+        mastery, times = self._engine_state(a, b, now)
+        now64 = np.datetime64(now, "us")
+        model = rec.model
+        if model is not None:
+            X = self._log_features(a, b, now).reshape(-1, 4)
+            try:
+                p = model.predict_proba(X)[:, 1]
+            except Exception:
+                p = np.asarray(model.predict(X), dtype=float)
+            days_since = np.where(np.isnat(times), 999.0, _whole_days(now64 - times))
+            priority = (1.0 - p).reshape(times.shape) * (1 + rec.recency_weight * np.minimum(days_since / 30.0, 2.0))
+        elif hasattr(rec.mastery, "mastery_as_of"):
+            priority = 1 - mastery
+        elif isinstance(rec.mastery, EMAMastery):
+            days_since = np.where(np.isnat(times), 999.0, _whole_days(now64 - times))
+            priority = (1 - mastery) * (1 + rec.recency_weight * np.minimum(days_since / 30.0, 2.0))
+        else:
+            due = np.isnat(times) | (times <= now64)
+            due_penalty = np.where(due, 1.0, np.maximum(0.0, 1 - _whole_days(times - now64) / 30.0))
+            priority = (1 - mastery) * (1 + rec.recency_weight * due_penalty)
+        # highest first, ties by topic position (as top_n_indices)
+        order = np.argsort(-priority, axis=1, kind="stable")[:, :n]
+        topics = np.array(self.topics, dtype=object)
+        return CohortChunk(self.students[a:b], self.topics, mastery, priority, topics[order])
+
+    def iter_chunks(self, now=None, n=3):
+        """Yield a CohortChunk per `chunk_size` students, in cohort order."""
+        now = now or datetime.utcnow()
+        for a in range(0, len(self.students), self.chunk_size):
+            yield self._chunk(a, min(a + self.chunk_size, len(self.students)), now, n)
+
+    def matrices(self, now=None, n=3):
+        """(mastery, priority, top) for the whole cohort; use iter_chunks for large ones."""
+        chunks = list(self.iter_chunks(now, n))
+        if not chunks:
+            empty = np.empty((0, len(self.topics)))
+            return empty, empty, np.empty((0, n), dtype=object)
+        return tuple(np.concatenate([getattr(c, name) for c in chunks])
+                     for name in ("mastery", "priority", "top"))
+
+def write_report(report, top_path=None, heatmap_path=None, now=None, n=3):
+    """Stream the top-n topics (student_id, rank_1..rank_n) and the mastery heatmap to CSV files."""
+    paths = [p for p in (top_path, heatmap_path) if p]
+    for path in paths:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    header = True
+    for chunk in report.iter_chunks(now, n):
+        if top_path:
+            top = pd.DataFrame(chunk.top, columns=[f"rank_{i + 1}" for i in range(chunk.top.shape[1])])
+            top.insert(0, "student_id", chunk.students)
+            top.to_csv(top_path, mode="w" if header else "a", header=header, index=False)
+        if heatmap_path:
+            heat = pd.DataFrame(np.round(chunk.mastery, 4), columns=chunk.topics)
+            heat.insert(0, "student_id", chunk.students)
+            heat.to_csv(heatmap_path, mode="w" if header else "a", header=header, index=False)
+        header = False
+
+if __name__ == "__main__":
+    from mastery_snapshot import engine_from_progress
+    from progress_store import open_progress_store
+    from recommender import Recommender, extract_topics_from_csv
+    from resources import get_question_bank
+
+    parser = argparse.ArgumentParser(description="Cohort mastery heatmap and top-n recommendations.")
+    parser.add_argument("--progress", default=os.environ.get("PROGRESS_STORE", "data/progress.json"))
+    parser.add_argument("--log", default="data/students.csv")
+    parser.add_argument("--subjects", default="data/subjects.json")
+    parser.add_argument("--n", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=2048)
+    parser.add_argument("--half-life-days", type=float, default=None,
+                        help="decay mastery between reviews with this half-life (DecayEMAMastery)")
+    parser.add_argument("--top", default="data/cohort_top.csv")
+    parser.add_argument("--heatmap", default="data/mastery_heatmap.csv")
+    args = parser.parse_args()
+    store = open_progress_store(args.progress)
+    bank = get_question_bank(args.subjects)
+    topics = bank["topics_flat"] if bank is not None else extract_topics_from_csv(args.log)
+    rec = Recommender(topics, mastery_engine=engine_from_progress(store.load_all(), half_life_days=args.half_life_days), data_csv=args.log)
+    log_students = rec.df['student_id'].unique().tolist() if len(rec.df) else []
+    report = CohortReport(rec, sorted(set(store.students()) | set(log_students)), chunk_size=args.chunk_size)
+    write_report(report, args.top, args.heatmap, n=args.n)
+    print(f"Wrote reports for {len(report.students)} students x {len(topics)} topics to {args.top}, {args.heatmap}")
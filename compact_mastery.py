@@ -0,0 +1,438 @@
+# compact_mastery.py
+"""
+Array-backed mastery engines for millions of (student, topic) pairs.
+
+Student and topic ids are interned to integers once; per-pair state lives in dense
+student x topic NumPy arrays (8 bytes per field per pair) instead of one dict entry
+keyed by an f-string per pair. The classes keep the EMAMastery / SM2Mastery
+interface and add vectorized `update_many` and `get_mastery_many`.
+DecayEMAMastery adds forgetting between reviews, evaluated in closed form at read time.
+
+Tradeoff (benchmarks/bench_mastery.py, 4000 students x 50 topics): ~8x less memory
+per pair, and reads and batch updates (`update_many`, ~2.5M answers/s) are several times
+faster than the dict engines, but a single `update` still goes through NumPy scalar
+indexing and is ~1.5x slower than EMAMastery / SM2Mastery. Use them for bulk work (replays,
+cohorts, snapshots, large populations); for a few answers per request the dict
+engines in mastery.py are as good or better.
+Memory follows the full students x topics product, not the pairs actually seen: every
+field costs 8 bytes for each student x topic cell (and capacity doubles), so the
+~8x holds when students touch most topics. With many topics and each student on a few
+of them (e.g. 100k students, 5k topics, ~20 topics each: ~4 GB per field against
+~2M dict entries), the dict engines use less.
+"""
+from datetime import datetime, timedelta, timezone
+import heapq
+import numpy as np
+import pandas as pd
+
+from mastery import DueIndex, EMAMastery, SM2Mastery
+
+NAT = np.datetime64("NaT", "us")
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+_NAT_US = int(NAT.view(np.int64))  # NaT as int64 microseconds
+
+def to_datetime64(timestamps):
+    """datetime / pandas Timestamp / ISO string (or an array of them) -> datetime64[us]; None -> NaT."""
+    if timestamps is None:
+        return NAT
+    if isinstance(timestamps, datetime):
+        if timestamps.tzinfo is not None:
+            # naive UTC, as service.py stores times
+            timestamps = timestamps.astimezone(timezone.utc).replace(tzinfo=None)
+        # integer microseconds: several times cheaper than np.datetime64(datetime, "us")
+        return np.datetime64((timestamps - _EPOCH) // _US, "us")
+    if hasattr(timestamps, "to_numpy"):  # pandas Series / Index
+        timestamps = timestamps.to_numpy()
+    if np.ndim(timestamps) == 0:
+        return np.datetime64(timestamps, "us")
+    return np.asarray(timestamps).astype("datetime64[us]")
+
+def to_datetime(value):
+    """datetime64 scalar -> datetime, NaT -> None."""
+    if np.isnat(value):
+        return None
+    return value.astype("datetime64[us]").astype(datetime)
+
+class PairArrays:
+    """
+    Dense per-(student, topic) arrays with interned ids.
+    fields: name -> (dtype, fill value for pairs never seen). Capacity doubles as needed.
+    """
+    def __init__(self, fields, capacity=(1024, 64)):
+        self.fields = fields
+        self.student_index = {}  # student_id -> row
+        self.student_ids = []
+        self.topic_index = {}  # topic_id -> column
+        self.topic_ids = []
+        self.arrays = {name: np.full(capacity, fill, dtype=dtype) for name, (dtype, fill) in fields.items()}
+
+    @property
+    def shape(self):
+        return len(self.student_ids), len(self.topic_ids)
+
+    def _grow(self):
+        rows, cols = next(iter(self.arrays.values())).shape
+        need_rows, need_cols = self.shape
+        if need_rows <= rows and need_cols <= cols:
+            return
+        while rows < need_rows:
+            rows *= 2
+        while cols < need_cols:
+            cols *= 2
+        for name, (dtype, fill) in self.fields.items():
+            old = self.arrays[name]
+            new = np.full((rows, cols), fill, dtype=dtype)
+            new[:old.shape[0], :old.shape[1]] = old
+            self.arrays[name] = new
+
+    def lookup(self, student_id, topic_id):
+        """(row, col) of a pair, None if either id was never seen."""
+        s = self.student_index.get(student_id)
+        t = self.topic_index.get(topic_id)
+        if s is None or t is None:
+            return None
+        return s, t
+
+    def intern(self, student_id, topic_id):
+        """(row, col) of a pair, adding unseen ids."""
+        s = self.student_index.get(student_id)
+        t = self.topic_index.get(topic_id)
+        if s is None or t is None:
+            if s is None:
+                s = self.student_index[student_id] = len(self.student_ids)
+                self.student_ids.append(student_id)
+            if t is None:
+                t = self.topic_index[topic_id] = len(self.topic_ids)
+                self.topic_ids.append(topic_id)
+            self._grow()
+        return s, t
+
+    def _intern_many(self, ids, index, names):
+        # hash-based factorize: np.unique would sort the object array
+        inverse, uniq = pd.factorize(np.asarray(ids, dtype=object), use_na_sentinel=False)
+        codes = np.empty(len(uniq), dtype=np.int64)
+        for i, name in enumerate(uniq):
+            code = index.get(name)
+            if code is None:
+                code = index[name] = len(names)
+                names.append(name)
+            codes[i] = code
+        return codes[inverse]
+
+    def intern_many(self, student_ids, topic_ids):
+        rows = self._intern_many(student_ids, self.student_index, self.student_ids)
+        cols = self._intern_many(topic_ids, self.topic_index, self.topic_ids)
+        self._grow()
+        return rows, cols
+
+    def columns(self, topic_ids):
+        """Column per topic id, -1 where unseen."""
+        return np.array([self.topic_index.get(t, -1) for t in topic_ids], dtype=np.int64)
+
+    def row_values(self, name, student_id, topic_ids):
+        """Field values of one student for a list of topics (fill value where unseen)."""
+        dtype, fill = self.fields[name]
+        out = np.full(len(topic_ids), fill, dtype=dtype)
+        s = self.student_index.get(student_id)
+        if s is None:
+            return out
+        cols = self.columns(topic_ids)
+        known = cols >= 0
+        out[known] = self.arrays[name][s, cols[known]]
+        return out
+
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays.values())
+
+def update_rounds(rows, cols):
+    """
+    Split a batch of pair updates into rounds in which every pair appears at most once,
+    keeping the batch order of repeated pairs. Yields index arrays into the batch.
+    """
+    key = rows * (int(cols.max()) + 1 if len(cols) else 1) + cols
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    starts = np.r_[0, np.flatnonzero(sorted_key[1:] != sorted_key[:-1]) + 1]
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(key)]))
+    rank = np.empty(len(key), dtype=np.int64)
+    rank[order] = np.arange(len(key)) - group_start
+    for r in range(int(rank.max()) + 1 if len(rank) else 0):
+        yield np.flatnonzero(rank == r)
+
+def _notify_rows(engine, rows):
+    """Run the engine's listeners once per student touched by a batch."""
+    if engine.listeners:
+        for r in np.unique(rows):
+            for fn in engine.listeners:
+                fn(engine.pairs.student_ids[r])
+
+class CompactEMAMastery(EMAMastery):
+    """EMAMastery with interned ids and float64 / datetime64 arrays."""
+    def __init__(self, alpha=0.3, initial=0.2, capacity=(1024, 64)):
+        self.alpha = alpha
+        self.initial = initial
+        self.listeners = []
+        self.pairs = PairArrays({
+            "mastery": (np.float64, initial),
+            "last_review": ("datetime64[us]", NAT),
+        }, capacity)
+
+    def get_mastery(self, student_id, topic_id):
+        pos = self.pairs.lookup(student_id, topic_id)
+        return self.initial if pos is None else float(self.pairs.arrays["mastery"][pos])
+
+    def get_mastery_many(self, student_id, topic_ids):
+        return self.pairs.row_values("mastery", student_id, topic_ids)
+
+    def get_last_review(self, student_id, topic_id):
+        pos = self.pairs.lookup(student_id, topic_id)
+        return None if pos is None else to_datetime(self.pairs.arrays["last_review"][pos])
+
+    def get_last_review_many(self, student_id, topic_ids):
+        """datetime64[us] array, NaT where never reviewed."""
+        return self.pairs.row_values("last_review", student_id, topic_ids)
+
+    def set_state(self, student_id, topic_id, mastery, last_review=None):
+        pos = self.pairs.intern(student_id, topic_id)
+        self.pairs.arrays["mastery"][pos] = mastery
+        if last_review is not None:
+            self.pairs.arrays["last_review"][pos] = to_datetime64(last_review)
+        for fn in self.listeners:
+            fn(student_id)
+
+    def reset(self, student_id, topic_id):
+        pos = self.pairs.lookup(student_id, topic_id)
+        if pos is not None:
+            self.pairs.arrays["mastery"][pos] = self.initial
+            self.pairs.arrays["last_review"][pos] = NAT
+        for fn in self.listeners:
+            fn(student_id)
+
+    def update(self, student_id, topic_id, correct, timestamp=None):
+        pos = self.pairs.intern(student_id, topic_id)
+        m = self.pairs.arrays["mastery"]
+        m[pos] = self.alpha * (1.0 if correct else 0.0) + (1 - self.alpha) * m.item(pos)
+        self.pairs.arrays["last_review"][pos] = to_datetime64(timestamp)
+        for fn in self.listeners:
+            fn(student_id)
+
+    def update_many(self, student_ids, topic_ids, corrects, timestamps=None):
+        """Apply a batch of answers; repeated pairs are applied in batch order."""
+        rows, cols = self.pairs.intern_many(student_ids, topic_ids)
+        outcome = (np.asarray(corrects) != 0).astype(np.float64)
+        stamps = np.broadcast_to(to_datetime64(timestamps), rows.shape)
+        m = self.pairs.arrays["mastery"]
+        last = self.pairs.arrays["last_review"]
+        for idx in update_rounds(rows, cols):
+            r, c = rows[idx], cols[idx]
+            m[r, c] = self.alpha * outcome[idx] + (1 - self.alpha) * m[r, c]
+            last[r, c] = stamps[idx]
+        _notify_rows(self, rows)
+
+def decayed(mastery, last_review, when, initial, half_life_days):
+    """
+    Closed-form forgetting curve: mastery relaxes toward `initial`, halving the gap every
+    `half_life_days` from the last review to `when`. Arrays broadcast; no decay where
+    either time is NaT or `when` is before the last review.
+    """
+    elapsed = (to_datetime64(when) - last_review) / np.timedelta64(1, "D")
+    elapsed = np.where(np.isnan(elapsed), 0.0, np.maximum(elapsed, 0.0))
+    return initial + (mastery - initial) * np.exp2(-elapsed / half_life_days)
+
+class DecayEMAMastery(CompactEMAMastery):
+    """
+    CompactEMAMastery with forgetting between reviews (see `decayed`). The arrays keep
+    the mastery right after the last review: decay is evaluated lazily, before each
+    update and by mastery_as_of, so no pair is ever rewritten just because time passed.
+    get_mastery / get_mastery_many return that stored value (what the progress store
+    saves next to last_review); use mastery_as_of for the value at a given time.
+    """
+    def __init__(self, alpha=0.3, initial=0.2, half_life_days=14.0, capacity=(1024, 64)):
+        super().__init__(alpha, initial, capacity)
+        self.half_life_days = half_life_days
+
+    def mastery_as_of(self, student_id, topic_ids, when=None):
+        """Decayed mastery of one student on several topics at `when` (default: now), as a NumPy array."""
+        mastery = self.pairs.row_values("mastery", student_id, topic_ids)
+        last = self.pairs.row_values("last_review", student_id, topic_ids)
+        return decayed(mastery, last, when or datetime.utcnow(), self.initial, self.half_life_days)
+
+    def update(self, student_id, topic_id, correct, timestamp=None):
+        pos = self.pairs.intern(student_id, topic_id)
+        m = self.pairs.arrays["mastery"]
+        m[pos] = decayed(m[pos], self.pairs.arrays["last_review"][pos], timestamp, self.initial, self.half_life_days)
+        super().update(student_id, topic_id, correct, timestamp)
+
+    def update_many(self, student_ids, topic_ids, corrects, timestamps=None):
+        """Apply a batch of answers; repeated pairs are applied in batch order, each decayed to its answer time."""
+        rows, cols = self.pairs.intern_many(student_ids, topic_ids)
+        outcome = (np.asarray(corrects) != 0).astype(np.float64)
+        stamps = np.broadcast_to(to_datetime64(timestamps), rows.shape)
+        m = self.pairs.arrays["mastery"]
+        last = self.pairs.arrays["last_review"]
+        for idx in update_rounds(rows, cols):
+            r, c = rows[idx], cols[idx]
+            before = decayed(m[r, c], last[r, c], stamps[idx], self.initial, self.half_life_days)
+            m[r, c] = self.alpha * outcome[idx] + (1 - self.alpha) * before
+            last[r, c] = stamps[idx]
+        _notify_rows(self, rows)
+
+class ArrayDueIndex(DueIndex):
+    """
+    DueIndex over a PairArrays datetime64 field, with times as int64 microseconds. A single
+    update pushes the pair's new time; a batch (mark_rows) only marks its students, whose
+    heaps are rebuilt from their row on the next query (ties then in topic column order).
+    NaT times are not scheduled.
+    """
+    def __init__(self, pairs, field="next_review"):
+        super().__init__()
+        self.pairs = pairs
+        self.field = field
+        self._dirty = set()
+
+    def schedule(self, student_id, topic_id, when=None):
+        if student_id in self._dirty:
+            return  # rebuilt from the arrays on the next query anyway
+        when = self.pairs.arrays[self.field].view(np.int64).item(self.pairs.lookup(student_id, topic_id))
+        if when == _NAT_US:
+            self.remove(student_id, topic_id)
+        else:
+            super().schedule(student_id, topic_id, when)
+
+    def remove(self, student_id, topic_id):
+        if student_id not in self._dirty:
+            super().remove(student_id, topic_id)
+
+    def mark_rows(self, rows):
+        """Mark the students of a batch of row indices."""
+        ids = self.pairs.student_ids
+        self._dirty.update(ids[r] for r in np.unique(rows).tolist())
+
+    def rebuild(self, student_id):
+        """Heap of one student from their row of the arrays."""
+        self._dirty.discard(student_id)
+        r = self.pairs.student_index.get(student_id)
+        live = {}
+        if r is not None:
+            times = self.pairs.arrays[self.field][r, :len(self.pairs.topic_ids)]
+            cols = np.flatnonzero(~np.isnat(times))
+            for c, when in zip(cols.tolist(), times[cols].astype(np.int64).tolist()):
+                topic_id = self.pairs.topic_ids[c]
+                live[topic_id] = (when, next(self._seq), topic_id)
+        self.scheduled[student_id] = live
+        self.heaps[student_id] = list(live.values())
+        heapq.heapify(self.heaps[student_id])
+
+    def _in_order(self, student_id):
+        if student_id in self._dirty:
+            self.rebuild(student_id)
+        return super()._in_order(student_id)
+
+    def due(self, student_id, now, limit=None):
+        return super().due(student_id, int(to_datetime64(now).astype(np.int64)), limit)
+
+class CompactSM2Mastery(SM2Mastery):
+    """
+    SM2Mastery with interned ids and per-field arrays instead of one SM2Item per pair.
+    The due index (ArrayDueIndex) follows single updates and is rebuilt per student from
+    the next_review row after a batch; pass track_due=False to keep only the arrays
+    (due_topics / top_due then scan the student's row).
+    """
+    def __init__(self, capacity=(1024, 64), track_due=True):
+        self.listeners = []
+        self.pairs = PairArrays({
+            "seen": (np.bool_, False),
+            "ef": (np.float64, 2.5),
+            "interval": (np.int64, 0),
+            "repetitions": (np.int64, 0),
+            "next_review": ("datetime64[us]", NAT),
+        }, capacity)
+        self.due_index = ArrayDueIndex(self.pairs) if track_due else None
+
+    def update(self, student_id, topic_id, correct, timestamp):
+        pos = self.pairs.intern(student_id, topic_id)
+        a = self.pairs.arrays
+        if correct:
+            reps = a["repetitions"].item(pos) + 1
+            ef = a["ef"].item(pos)
+            if reps == 1:
+                interval = 1
+            elif reps == 2:
+                interval = 6
+            else:
+                interval = round(a["interval"].item(pos) * ef)
+            a["ef"][pos] = max(1.3, ef + 0.1)
+        else:
+            reps = 0
+            interval = 1
+        a["repetitions"][pos] = reps
+        a["interval"][pos] = interval
+        a["next_review"][pos] = to_datetime64(timestamp) + np.timedelta64(interval, "D")
+        a["seen"][pos] = True
+        if self.due_index is not None:
+            self.due_index.schedule(student_id, topic_id)
+        for fn in self.listeners:
+            fn(student_id)
+
+    def update_many(self, student_ids, topic_ids, corrects, timestamps):
+        """Apply a batch of answers; repeated pairs are applied in batch order."""
+        rows, cols = self.pairs.intern_many(student_ids, topic_ids)
+        correct = np.asarray(corrects) != 0
+        stamps = np.broadcast_to(to_datetime64(timestamps), rows.shape)
+        a = self.pairs.arrays
+        for idx in update_rounds(rows, cols):
+            r, c, ok = rows[idx], cols[idx], correct[idx]
+            reps = np.where(ok, a["repetitions"][r, c] + 1, 0)
+            interval = np.where(reps == 1, 1, np.where(reps == 2, 6, np.round(a["interval"][r, c] * a["ef"][r, c])))
+            interval = np.where(ok, interval, 1).astype(np.int64)
+            # q = 5 for a correct answer: EF moves by 0.1 - 0 * (...) and is only updated when correct
+            a["ef"][r, c] = np.where(ok, np.maximum(1.3, a["ef"][r, c] + 0.1), a["ef"][r, c])
+            a["repetitions"][r, c] = reps
+            a["interval"][r, c] = interval
+            a["next_review"][r, c] = stamps[idx] + interval.astype("timedelta64[D]")
+            a["seen"][r, c] = True
+        if self.due_index is not None and len(rows):
+            self.due_index.mark_rows(rows)
+        _notify_rows(self, rows)
+
+    def get_next_review(self, student_id, topic_id):
+        pos = self.pairs.lookup(student_id, topic_id)
+        return None if pos is None else to_datetime(self.pairs.arrays["next_review"][pos])
+
+    def get_next_review_many(self, student_id, topic_ids):
+        """datetime64[us] array, NaT where never reviewed."""
+        return self.pairs.row_values("next_review", student_id, topic_ids)
+
+    def _scan_due(self, student_id):
+        index = ArrayDueIndex(self.pairs)
+        index.mark_rows([self.pairs.student_index[student_id]] if student_id in self.pairs.student_index else [])
+        return index
+
+    def due_topics(self, student_id, now=None, limit=None):
+        index = self.due_index if self.due_index is not None else self._scan_due(student_id)
+        return index.due(student_id, to_datetime64(now or datetime.utcnow()), limit)
+
+    def reset(self, student_id, topic_id):
+        pos = self.pairs.lookup(student_id, topic_id)
+        if pos is not None:
+            for name, (_, fill) in self.pairs.fields.items():
+                self.pairs.arrays[name][pos] = fill
+        if self.due_index is not None:
+            self.due_index.remove(student_id, topic_id)
+        for fn in self.listeners:
+            fn(student_id)
+
+    def get_mastery_score_estimate(self, student_id, topic_id):
+        pos = self.pairs.lookup(student_id, topic_id)
+        a = self.pairs.arrays
+        if pos is None or not a["seen"][pos]:
+            return 0.2
+        return min(0.99, 0.2 + 0.2 * int(a["repetitions"][pos]) + 0.2 * (float(a["ef"][pos]) - 1.3))
+
+    def get_mastery_many(self, student_id, topic_ids):
+        seen = self.pairs.row_values("seen", student_id, topic_ids)
+        reps = self.pairs.row_values("repetitions", student_id, topic_ids)
+        ef = self.pairs.row_values("ef", student_id, topic_ids)
+        score = np.minimum(0.99, 0.2 + 0.2 * reps + 0.2 * (ef - 1.3))
+        return np.where(seen, score, 0.2)
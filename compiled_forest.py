@@ -0,0 +1,145 @@
+# compiled_forest.py
+"""
+A trained RandomForestClassifier flattened into contiguous NumPy node arrays.
+
+Every tree's nodes are concatenated into one set of arrays (feature, threshold,
+left, right, per-class leaf probabilities), saved as .npy files and opened with
+mmap, so loading costs no unpickling and worker processes share the pages.
+CompiledForest.predict_proba walks all trees for a batch of rows at once with
+array indexing (no sklearn dispatch); results match sklearn's predict_proba.
+
+Child links to a leaf are stored as -(leaf + 1), so a walk knows it has arrived
+without another lookup. Thresholds are stored as the largest float32 not above
+sklearn's float64 threshold: for float32 features (which sklearn trees use)
+`x <= t32` is then exactly `x <= t64`.
+
+    python compiled_forest.py export --model models/rf_study_recommender.pkl
+"""
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+
+FOREST_VERSION = 1
+_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+def compiled_path(model_path):
+    """Directory the compiled form of a pickled model lives in: models/x.pkl -> models/x.forest."""
+    return os.path.splitext(model_path)[0] + ".forest"
+
+def can_compile(model):
+    """True for fitted tree ensembles that export_forest understands."""
+    return hasattr(model, "estimators_") and all(hasattr(t, "tree_") for t in model.estimators_)
+
+def export_forest(model, path):
+    """Write a fitted RandomForestClassifier (or any ensemble of sklearn decision trees) to `path`."""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for est in model.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        leaf = tree.children_left == -1
+
+        def link(child):
+            child = np.where(leaf, 0, child)
+            return np.where(leaf[child], -(child + offset) - 1, child + offset).astype(np.int32)
+
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        t32 = tree.threshold.astype(np.float32)
+        thresholds.append(np.where(t32 > tree.threshold, np.nextafter(t32, np.float32(-np.inf)), t32))
+        lefts.append(link(tree.children_left))
+        rights.append(link(tree.children_right))
+        value = tree.value[:, 0, :].astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        values.append(value / np.where(totals > 0, totals, 1.0))
+        roots.append(-offset - 1 if leaf[0] else offset)
+        max_depth = max(max_depth, tree.max_depth)
+        offset += n
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.ascontiguousarray(np.concatenate(values)),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": FOREST_VERSION,
+            "classes": np.asarray(model.classes_).tolist(),
+            "n_features": int(model.n_features_in_),
+            "max_depth": int(max_depth),
+        }, f)
+    # swap directories so readers never see a half-written model
+    old = path + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+class CompiledForest:
+    """Forest loaded from export_forest's arrays (mmap'd); a drop-in for predict_proba / predict."""
+    def __init__(self, path, mmap=True):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.path = path
+        self.classes_ = np.array(meta["classes"])
+        self.n_features_in_ = meta["n_features"]
+        self.max_depth = meta["max_depth"]
+        mode = "r" if mmap else None
+        for name in _ARRAYS:
+            # plain ndarray views of the maps: indexing np.memmap objects is slower
+            setattr(self, name, np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)))
+
+    def predict_proba(self, X):
+        """Mean of the trees' leaf class probabilities, shape (n_rows, n_classes)."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_trees = len(X), len(self.roots)
+        flat = X.ravel()
+        # one walker per (row, tree); only walkers that have not reached a leaf move on
+        node = np.tile(self.roots, n_rows)
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.int64) * X.shape[1], n_trees)
+        active = np.flatnonzero(node >= 0)
+        while len(active):
+            at = node[active]
+            go_left = flat[row_offset[active] + self.feature[at]] <= self.threshold[at]
+            nxt = np.where(go_left, self.left[at], self.right[at])
+            node[active] = nxt
+            active = active[nxt >= 0]
+        return self.value[-node - 1].reshape(n_rows, n_trees, -1).mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def load_forest(path):
+    """CompiledForest at `path`, or None if it is missing or fails to load."""
+    try:
+        return CompiledForest(path)
+    except Exception as e:
+        print("Warning: failed to load compiled model:", e)
+        return None
+
+if __name__ == "__main__":
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Compiled forest tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="compile a pickled RandomForest next to it")
+    export.add_argument("--model", default="models/rf_study_recommender.pkl")
+    args = parser.parse_args()
+    if args.command == "export":
+        model = joblib.load(args.model)
+        if not can_compile(model):
+            raise SystemExit(f"{args.model} is not a tree ensemble; nothing to compile")
+        export_forest(model, compiled_path(args.model))
+        print("Wrote", compiled_path(args.model))
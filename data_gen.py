@@ -1,43 +1,199 @@
 # data_gen.py
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+"""
+Simulated interaction logs.
+
+Each student has a hidden mastery per topic (initially uniform in [0, 0.6]). Every
+interaction picks a topic with weights (1 - mastery) + 0.1, waits an exponential
+gap (mean 8 h), answers correctly with probability 0.2 * (1 - difficulty) + 0.8 * mastery,
+and moves that mastery 15% of the way to the outcome.
+
+Students are simulated in blocks: all students of a block advance one interaction at
+a time as NumPy arrays. Block k draws from SeedSequence(seed, spawn_key=(k,)), so the
+output depends only on the seed and block size, not on how many workers ran. Rows
+come out grouped by student and in time order, in CSV or (with pyarrow) Parquet:
+
+    python data_gen.py --students 1000000 --interactions 100 --out data/big.parquet --workers 4
+"""
+import argparse
+import glob
+import multiprocessing
 import os
+import shutil
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # optional: Parquet output and faster CSV writing
+    pa = pa_csv = pq = None
+
+MEAN_GAP_MINUTES = 24 * 60 / 3  # avg few interactions/day
 
-os.makedirs("data", exist_ok=True)
+def topic_difficulty(num_topics, seed=42):
+    """Per-topic difficulty in [0.2, 0.9] (higher = harder), shared by every block."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(2**32 - 1,)))
+    return rng.uniform(0.2, 0.9, size=num_topics)
 
-def generate_simulated_logs(num_students=50, num_topics=12, interactions_per_student=60, start_date=None):
-    rng = np.random.default_rng(42)
+def simulate_block(n_students, num_topics, interactions, difficulty, rng):
+    """
+    Interactions of `n_students` students, advanced together one step at a time.
+    Returns (topic, correct, minutes) arrays of shape (n_students, interactions);
+    minutes are offsets from the start date.
+    """
+    mastery = rng.uniform(0.0, 0.6, size=(n_students, num_topics))
+    topics = np.empty((n_students, interactions), dtype=np.int32)
+    correct = np.empty((n_students, interactions), dtype=np.int8)
+    gaps = np.empty((n_students, interactions), dtype=np.int64)
+    rows = np.arange(n_students)
+    for i in range(interactions):
+        # pick a topic with some bias toward weaker mastery (inverse CDF, as rng.choice does)
+        cum = np.cumsum((1 - mastery) + 0.1, axis=1)
+        u = rng.random(n_students) * cum[:, -1]
+        topic = np.minimum((cum <= u[:, None]).sum(axis=1), num_topics - 1)
+        gaps[:, i] = rng.exponential(scale=MEAN_GAP_MINUTES, size=n_students)  # whole minutes
+        held = mastery[rows, topic]
+        c = rng.random(n_students) < 0.2 * (1 - difficulty[topic]) + 0.8 * held
+        mastery[rows, topic] = held * 0.85 + 0.15 * c
+        topics[:, i] = topic
+        correct[:, i] = c
+    return topics, correct, np.cumsum(gaps, axis=1)
+
+def _blocks(num_students, block_students):
+    return [(k, k * block_students, min(block_students, num_students - k * block_students))
+            for k in range((num_students + block_students - 1) // block_students)]
+
+def _block_frame(first, num_topics, topics, correct, minutes, start, timestamps_as_text):
+    n_students, interactions = topics.shape
+    student_ids = pd.Categorical.from_codes(
+        np.repeat(np.arange(n_students), interactions),
+        [f"student_{s}" for s in range(first + 1, first + n_students + 1)])
+    topic_ids = pd.Categorical.from_codes(topics.ravel(), [f"topic_{t + 1}" for t in range(num_topics)])
+    start64 = np.datetime64(start, "us")
+    stamps = start64 + minutes.ravel().astype("timedelta64[m]")
+    if timestamps_as_text:
+        stamps = np.datetime_as_string(stamps, unit="us" if start.microsecond else "s")
+    return pd.DataFrame({"student_id": student_ids, "topic_id": topic_ids,
+                         "timestamp": stamps, "correct": correct.ravel()})
+
+def iter_simulated_chunks(num_students, num_topics=12, interactions_per_student=60, start_date=None,
+                          seed=42, chunk_rows=1_000_000, timestamps_as_text=True, blocks=None):
+    """Yield the log one block of students (about chunk_rows rows) at a time, as frames."""
     if start_date is None:
         start_date = datetime.utcnow() - timedelta(days=60)
-    rows = []
-    topic_difficulty = rng.uniform(0.2, 0.9, size=num_topics)  # higher = harder
-
-    for s in range(1, num_students + 1):
-        mastery = rng.uniform(0.0, 0.6, size=num_topics)  # hidden initial mastery per student
-        last_time = start_date
-        for i in range(interactions_per_student):
-            # pick a topic with some bias toward weaker mastery
-            weights = (1 - mastery) + 0.1
-            topic = int(rng.choice(np.arange(num_topics), p=weights/weights.sum()))
-            # simulate time gap (in minutes) between interactions
-            last_time += timedelta(minutes=int(rng.exponential(scale=24*60/3)))  # avg few interactions/day
-            # probability of correct depends on mastery and topic difficulty
-            prob_correct = 0.2 * (1 - topic_difficulty[topic]) + 0.8 * mastery[topic]
-            correct = int(rng.random() < prob_correct)
-            # update hidden mastery (simulated learning)
-            mastery[topic] = mastery[topic] * 0.85 + 0.15 * correct
-            rows.append({
-                "student_id": f"student_{s}",
-                "topic_id": f"topic_{topic+1}",
-                "timestamp": last_time.isoformat(),
-                "correct": correct
-            })
-
-    df = pd.DataFrame(rows)
-    df.to_csv("data/students.csv", index=False)
-    print("Generated data/students.csv with", len(df), "rows")
+    difficulty = topic_difficulty(num_topics, seed)
+    block_students = max(1, chunk_rows // max(1, interactions_per_student))
+    for k, first, n in blocks if blocks is not None else _blocks(num_students, block_students):
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(k,)))
+        topics, correct, minutes = simulate_block(n, num_topics, interactions_per_student, difficulty, rng)
+        yield _block_frame(first, num_topics, topics, correct, minutes, start_date, timestamps_as_text)
+
+def _is_parquet(path):
+    return path.endswith(".parquet")
+
+def _write_frame(df, sink):
+    """Append one block to a CSV (`sink` is its path) or to an open ParquetWriter, as one row group."""
+    if isinstance(sink, str) and pa_csv is not None:
+        # ids and ISO timestamps never need quoting
+        with open(sink, "ab") as f:
+            pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), f,
+                             pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+    elif isinstance(sink, str):
+        df.to_csv(sink, mode="a", header=False, index=False)
+    else:
+        sink.write_table(pa.Table.from_pandas(df, preserve_index=False).cast(sink.schema))
+
+def _parquet_writer(path):
+    schema = pa.schema([("student_id", pa.string()), ("topic_id", pa.string()),
+                        ("timestamp", pa.timestamp("us")), ("correct", pa.int8())])
+    return pq.ParquetWriter(path, schema)
+
+def _write_part(task):
+    """Worker: simulate some blocks into a part file of their own; returns its path."""
+    part, kwargs = task
+    sink = _parquet_writer(part) if _is_parquet(part) else part
+    try:
+        for df in iter_simulated_chunks(**kwargs):
+            _write_frame(df, sink)
+    finally:
+        if not isinstance(sink, str):
+            sink.close()
+    return part
+
+def generate_logs(out_path, num_students, num_topics=12, interactions_per_student=60, start_date=None,
+                  seed=42, chunk_rows=1_000_000, workers=1):
+    """
+    Write a simulated log of num_students * interactions_per_student rows to out_path
+    (.csv, or .parquet with pyarrow) without holding more than one block per process
+    in memory. workers > 1 simulates blocks in parallel; the file is the same either way.
+    Returns the number of rows.
+    """
+    parquet = _is_parquet(out_path)
+    if parquet and pq is None:
+        raise ImportError("Parquet output needs pyarrow (pip install -r requirements-optional.txt)")
+    if start_date is None:
+        start_date = datetime.utcnow() - timedelta(days=60)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    kwargs = dict(num_students=num_students, num_topics=num_topics,
+                  interactions_per_student=interactions_per_student, start_date=start_date, seed=seed,
+                  chunk_rows=chunk_rows, timestamps_as_text=not parquet)
+    blocks = _blocks(num_students, max(1, chunk_rows // max(1, interactions_per_student)))
+    tmp = f"{out_path}.tmp.{os.getpid()}"
+    sink = _parquet_writer(tmp) if parquet else tmp
+    try:
+        if not parquet:
+            pd.DataFrame(columns=["student_id", "topic_id", "timestamp", "correct"]).to_csv(tmp, index=False)
+        if workers <= 1:
+            for df in iter_simulated_chunks(**kwargs):
+                _write_frame(df, sink)
+        else:
+            ext = os.path.splitext(out_path)[1]
+            tasks = [(f"{tmp}.part{k:05d}{ext}", dict(kwargs, blocks=[(k, first, n)])) for k, first, n in blocks]
+            with multiprocessing.get_context("spawn").Pool(workers) as pool:
+                # parts arrive in block order; append each as soon as it is done
+                for part in pool.imap(_write_part, tasks):
+                    if parquet:
+                        sink.write_table(pq.read_table(part).cast(sink.schema))
+                    else:
+                        with open(part, "rb") as src, open(tmp, "ab") as dst:
+                            shutil.copyfileobj(src, dst, 16 * 2**20)
+                    os.remove(part)
+    except BaseException:
+        for leftover in glob.glob(glob.escape(tmp) + "*"):
+            os.remove(leftover)
+        raise
+    finally:
+        if parquet:
+            sink.close()
+    os.replace(tmp, out_path)
+    return num_students * interactions_per_student
+
+def generate_simulated_logs(num_students=50, num_topics=12, interactions_per_student=60, start_date=None,
+                            out_path="data/students.csv", seed=42):
+    """Simulated interaction log as one frame; written to out_path unless it is None."""
+    df = pd.concat(list(iter_simulated_chunks(num_students, num_topics, interactions_per_student, start_date,
+                                              seed=seed)), ignore_index=True)
+    for col in ("student_id", "topic_id"):
+        df[col] = df[col].astype(str)
+    df["correct"] = df["correct"].astype(int)
+    if out_path is not None:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        df.to_csv(out_path, index=False)
+        print("Generated", out_path, "with", len(df), "rows")
     return df
 
 if __name__ == "__main__":
-    generate_simulated_logs()
+    parser = argparse.ArgumentParser(description="Generate a simulated interaction log.")
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--topics", type=int, default=12)
+    parser.add_argument("--interactions", type=int, default=60, help="interactions per student")
+    parser.add_argument("--out", default="data/students.csv", help=".csv or .parquet")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="rows simulated per block")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    n = generate_logs(args.out, args.students, args.topics, args.interactions, seed=args.seed,
+                      chunk_rows=args.chunk_rows, workers=args.workers)
+    print("Generated", args.out, "with", n, "rows")
@@ -1,13 +1,23 @@
 # evaluator.py
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from datetime import datetime
-from mastery import EMAMastery
-from recommender import Recommender, extract_topics_from_csv
+from sklearn.metrics import roc_auc_score
+from mastery import EMAMastery, SM2Mastery
+from compact_mastery import CompactEMAMastery, CompactSM2Mastery, DecayEMAMastery
+from feature_store import FeatureStore
+from interaction_log import LOG_COLUMNS, read_log
+from recommender import MODEL_PATH, Recommender, extract_topics_from_csv
+from resources import get_model
 import numpy as np
 
 def simulate_with_ema(data_csv="data/students.csv", alpha=0.3, steps=5000):
-    df = pd.read_csv(data_csv)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = read_log(data_csv)
     topics = sorted(df['topic_id'].unique().tolist())
     students = sorted(df['student_id'].unique().tolist())
 
@@ -31,5 +41,226 @@ def simulate_with_ema(data_csv="data/students.csv", alpha=0.3, steps=5000):
     mm.sort(key=lambda x: x[1])
     print(mm[:5])
 
+# ---------- Replay evaluation ----------
+# mastery engine per config; "ml" ranks with the trained model on top of EMA recency
+ENGINES = {
+    "ema": lambda alpha: EMAMastery(alpha=alpha),
+    "ema-compact": lambda alpha: CompactEMAMastery(alpha=alpha),
+    "ema-decay": lambda alpha: DecayEMAMastery(alpha=alpha),
+    "sm2": lambda alpha: SM2Mastery(),
+    "sm2-compact": lambda alpha: CompactSM2Mastery(),
+    "ml": lambda alpha: EMAMastery(alpha=alpha),
+}
+
+class _ReplayLog:
+    """Stand-in for InteractionLog: the feature store only knows events replayed so far."""
+    def __init__(self, window):
+        self.features = FeatureStore(window=window)
+        self.df = pd.DataFrame(columns=LOG_COLUMNS)
+
+def _mastery_of(engine, student_id, topic_id, when):
+    if hasattr(engine, "mastery_as_of"):
+        return engine.mastery_as_of(student_id, [topic_id], when)[0]
+    if hasattr(engine, "get_mastery"):
+        return engine.get_mastery(student_id, topic_id)
+    return engine.get_mastery_score_estimate(student_id, topic_id)
+
+def replay(df, topics, config="ema", alpha=0.3, recency_weight=0.5, window=5, k=3, eval_every=1, model=None):
+    """
+    Replay a log in time order through one engine/recommender configuration.
+    Before each evaluated event the student's ranking (at the event's time) is scored
+    against the topic they actually practised, and the engine's mastery for that topic
+    is recorded as a prediction of the answer; then the event is applied.
+    Returns raw accumulators (combine several with `summarize`).
+    Note: a model trained on the same log will look better than it would on new data.
+    """
+    df = df.sort_values('timestamp', kind='mergesort')
+    engine = ENGINES[config](alpha)
+    rec = Recommender(topics, mastery_engine=engine, recency_weight=recency_weight,
+                      model=model, log=_ReplayLog(window))
+    if config != "ml":
+        rec.model = None
+    features = rec.features
+    students = df['student_id'].to_numpy()
+    topic_ids = df['topic_id'].to_numpy()
+    corrects = df['correct'].to_numpy().astype(int)
+    stamps = list(df['timestamp'].dt.to_pydatetime())
+    hits, ndcg, latencies, preds, model_preds = [], [], [], [], []
+    start = time.perf_counter()
+    for i in range(len(students)):
+        sid, tid, correct, ts = students[i], topic_ids[i], corrects[i], stamps[i]
+        if i % eval_every == 0:
+            t0 = time.perf_counter()
+            ranked = rec.recommend(sid, n=k, now=ts)
+            latencies.append(time.perf_counter() - t0)
+            rank = ranked.index(tid) if tid in ranked else None
+            hits.append(rank is not None)
+            ndcg.append(1.0 / np.log2(rank + 2) if rank is not None else 0.0)
+            preds.append(_mastery_of(engine, sid, tid, ts))
+            if rec.model is not None:
+                model_preds.append(1.0 - rec.ml_scores(sid, [tid], ts)[0])
+        engine.update(sid, tid, correct, ts)
+        features.update(sid, tid, correct, ts)
+    elapsed = time.perf_counter() - start
+    evaluated = corrects[::eval_every]
+    return {
+        "events": len(students),
+        "seconds": elapsed,
+        "hits": np.array(hits, dtype=bool),
+        "ndcg": np.array(ndcg, dtype=float),
+        "latencies": np.array(latencies, dtype=float),
+        "mastery_pred": np.array(preds, dtype=float),
+        "model_pred": np.array(model_preds, dtype=float),
+        "labels": evaluated,
+    }
+
+def _auc(labels, preds):
+    if len(preds) == 0 or len(np.unique(labels)) < 2:
+        return float("nan")
+    return float(roc_auc_score(labels, preds))
+
+def summarize(parts, k=3):
+    """Metrics from one or more `replay` results (e.g. one per student partition)."""
+    cat = lambda key: np.concatenate([p[key] for p in parts]) if parts else np.array([])
+    labels = cat("labels")
+    latencies = cat("latencies") * 1000.0
+    events = sum(p["events"] for p in parts)
+    seconds = sum(p["seconds"] for p in parts)
+    model_pred = cat("model_pred")
+    pct = lambda q: float(np.percentile(latencies, q)) if len(latencies) else float("nan")
+    return {
+        "events": events,
+        f"hit@{k}": float(cat("hits").mean()) if len(labels) else float("nan"),
+        f"ndcg@{k}": float(cat("ndcg").mean()) if len(labels) else float("nan"),
+        "auc_mastery": _auc(labels, cat("mastery_pred")),
+        "auc_model": _auc(labels, model_pred) if len(model_pred) else float("nan"),
+        "events_per_sec": events / seconds if seconds > 0 else float("nan"),
+        "rec_p50_ms": pct(50),
+        "rec_p95_ms": pct(95),
+        "rec_p99_ms": pct(99),
+    }
+
+def evaluate(data_csv="data/students.csv", configs=("ema", "sm2", "ml"), k=3, eval_every=1, max_events=None,
+             alpha=0.3, recency_weight=0.5, window=5):
+    """Replay the log through each configuration and return one metrics row per config."""
+    df = read_log(data_csv)
+    df = df.sort_values('timestamp', kind='mergesort')
+    if max_events:
+        df = df.head(max_events)
+    topics = sorted(df['topic_id'].unique().tolist())
+    model = get_model(MODEL_PATH)
+    rows = []
+    for config in configs:
+        if config == "ml" and model is None:
+            print("Skipping 'ml': no trained model at", MODEL_PATH)
+            continue
+        part = replay(df, topics, config, alpha=alpha, recency_weight=recency_weight, window=window,
+                      k=k, eval_every=eval_every, model=model)
+        rows.append({"config": config, **summarize([part], k=k)})
+    return pd.DataFrame(rows)
+
+# ---------- Parallel parameter sweep ----------
+# Students are independent, so each (config, student partition) pair is a separate task.
+# The encoded log is written once as .npy files and memory-mapped by every worker
+# (the OS page cache shares it) instead of being pickled into each task.
+_shared = {}  # per worker process: memory-mapped log arrays and id tables
+
+def _write_shared_log(df, directory, n_partitions):
+    """Encode the log (ids -> int codes) sorted by partition then time; returns partition bounds."""
+    student_codes, student_names = pd.factorize(df['student_id'])
+    topic_codes, topic_names = pd.factorize(df['topic_id'])
+    partition = student_codes % n_partitions
+    order = np.lexsort((df['timestamp'].to_numpy(), partition))
+    arrays = {
+        "student": student_codes[order].astype(np.int32),
+        "topic": topic_codes[order].astype(np.int32),
+        "timestamp": df['timestamp'].to_numpy().astype("datetime64[ns]").view(np.int64)[order],
+        "correct": df['correct'].to_numpy()[order].astype(np.int8),
+    }
+    for name, arr in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), arr)
+    np.save(os.path.join(directory, "student_names.npy"), np.asarray(student_names, dtype=str))
+    np.save(os.path.join(directory, "topic_names.npy"), np.asarray(topic_names, dtype=str))
+    bounds = np.searchsorted(partition[order], np.arange(n_partitions + 1))
+    return bounds
+
+def _attach_shared_log(directory):
+    for name in ("student", "topic", "timestamp", "correct", "student_names", "topic_names"):
+        _shared[name] = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+def _replay_partition(task):
+    """Worker: replay one student partition under one parameter set."""
+    params, start, end, topics, k, eval_every = task
+    part = pd.DataFrame({
+        "student_id": _shared["student_names"][_shared["student"][start:end]],
+        "topic_id": _shared["topic_names"][_shared["topic"][start:end]],
+        "timestamp": np.asarray(_shared["timestamp"][start:end]).view("datetime64[ns]"),
+        "correct": np.asarray(_shared["correct"][start:end]),
+    })
+    model = get_model(MODEL_PATH) if params["config"] == "ml" else None
+    result = replay(part, topics, params["config"], alpha=params["alpha"], recency_weight=params["recency_weight"],
+                    window=params["window"], k=k, eval_every=eval_every, model=model)
+    return params, result
+
+def param_grid(configs=("ema",), alphas=(0.3,), recency_weights=(0.5,), windows=(5,)):
+    return [{"config": c, "alpha": a, "recency_weight": r, "window": w}
+            for c, a, r, w in itertools.product(configs, alphas, recency_weights, windows)]
+
+def sweep(data_csv="data/students.csv", grid=None, workers=None, partitions_per_worker=4, k=3, eval_every=1,
+          max_events=None):
+    """
+    Evaluate every parameter set in `grid` (see param_grid) with the replay split by student
+    across a process pool. Returns one metrics row per parameter set.
+    """
+    grid = grid or param_grid()
+    workers = workers or os.cpu_count() or 1
+    df = read_log(data_csv)
+    df = df.sort_values('timestamp', kind='mergesort')
+    if max_events:
+        df = df.head(max_events)
+    topics = sorted(df['topic_id'].unique().tolist())
+    if any(p["config"] == "ml" for p in grid) and get_model(MODEL_PATH) is None:
+        print("Skipping 'ml': no trained model at", MODEL_PATH)
+        grid = [p for p in grid if p["config"] != "ml"]
+    n_partitions = max(1, min(workers * partitions_per_worker, df['student_id'].nunique()))
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="sweep-") as directory:
+        bounds = _write_shared_log(df, directory, n_partitions)
+        del df
+        tasks = [(params, int(bounds[i]), int(bounds[i + 1]), topics, k, eval_every)
+                 for params in grid for i in range(n_partitions) if bounds[i + 1] > bounds[i]]
+        parts = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_log, initargs=(directory,)) as pool:
+            for params, result in pool.map(_replay_partition, tasks, chunksize=1):
+                parts.setdefault(tuple(params.items()), []).append(result)
+    wall = time.perf_counter() - start
+    rows = [{**dict(key), **summarize(results, k=k)} for key, results in parts.items()]
+    table = pd.DataFrame(rows)
+    print(f"Swept {len(grid)} parameter sets on {workers} workers in {wall:.1f}s "
+          f"({table['events'].sum() / wall:.0f} replayed events/s overall)")
+    return table
+
 if __name__ == "__main__":
-    simulate_with_ema()
+    parser = argparse.ArgumentParser(description="Offline replay evaluation of mastery engines and recommenders.")
+    parser.add_argument("--csv", default="data/students.csv")
+    parser.add_argument("--configs", nargs="+", default=["ema", "sm2", "ml"], choices=sorted(ENGINES))
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--eval-every", type=int, default=1, help="score the ranking on every n-th event")
+    parser.add_argument("--max-events", type=int, default=None)
+    parser.add_argument("--alpha", type=float, nargs="+", default=[0.3])
+    parser.add_argument("--recency-weight", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--window", type=int, nargs="+", default=[5])
+    parser.add_argument("--workers", type=int, default=1, help="processes for a sweep (several values per parameter)")
+    parser.add_argument("--demo", action="store_true", help="run the original simulate_with_ema demo instead")
+    args = parser.parse_args()
+    if args.demo:
+        simulate_with_ema(args.csv, alpha=args.alpha[0])
+    else:
+        grid = param_grid(args.configs, args.alpha, args.recency_weight, args.window)
+        if len(grid) > len(args.configs) or args.workers > 1:
+            table = sweep(args.csv, grid, workers=args.workers, k=args.k, eval_every=args.eval_every,
+                          max_events=args.max_events)
+        else:
+            table = evaluate(args.csv, args.configs, k=args.k, eval_every=args.eval_every, max_events=args.max_events,
+                             alpha=args.alpha[0], recency_weight=args.recency_weight[0], window=args.window[0])
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
@@ -0,0 +1,117 @@
+# feature_store.py
+from collections import deque
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+FEATURE_COLUMNS = [
+    "total_attempts_on_topic",
+    "accuracy_on_topic",
+    "recent_corrects_on_topic",
+    "hours_since_last_activity",
+]
+
+class _PairStats:
+    __slots__ = ("total", "corrects", "recent", "last_time")
+
+    def __init__(self, window):
+        self.total = 0
+        self.corrects = 0
+        self.recent = deque(maxlen=window)  # last `window` outcomes on this topic
+        self.last_time = None
+
+class FeatureStore:
+    """
+    Incremental per-(student, topic) feature store.
+    Keeps running attempt/correct counts, a ring buffer of the last `window`
+    outcomes and each student's last activity time, so the features the ML model
+    expects cost O(1) per (student, topic) whatever the size of the log.
+    Features match train_ml.build_features: querying with `now` set to the time of
+    the next event gives the row build_features produces for that event.
+    """
+    def __init__(self, window=5):
+        self.window = window
+        self.pairs = {}  # key: (student_id, topic_id) -> _PairStats
+        self.last_activity = {}  # key: student_id -> timestamp of last event
+
+    @classmethod
+    def from_dataframe(cls, df, window=5):
+        """Build the store from an interaction log (student_id, topic_id, timestamp, correct)."""
+        store = cls(window=window)
+        if df.empty:
+            return store
+        df = df.sort_values('timestamp', kind='mergesort')
+        keys = ['student_id', 'topic_id']
+        grouped = df.groupby(keys, sort=False, observed=True)
+        totals = grouped.size()
+        corrects = grouped['correct'].sum()
+        last_times = grouped['timestamp'].max()
+        recents = df.groupby(keys, sort=False, observed=True).tail(window).groupby(
+            keys, sort=False, observed=True)['correct'].agg(list)
+        for key, total in totals.items():
+            stats = _PairStats(window)
+            stats.total = int(total)
+            stats.corrects = int(corrects[key])
+            stats.recent.extend(int(c) for c in recents[key])
+            stats.last_time = last_times[key]
+            store.pairs[key] = stats
+        store.last_activity = df.groupby('student_id', observed=True)['timestamp'].max().to_dict()
+        return store
+
+    @classmethod
+    def from_csv(cls, csv_path="data/students.csv", window=5):
+        from interaction_log import read_log  # interaction_log imports this module
+        return cls.from_dataframe(read_log(csv_path), window=window)
+
+    def update(self, student_id, topic_id, correct, timestamp):
+        """Record one answer (O(1))."""
+        key = (student_id, topic_id)
+        stats = self.pairs.get(key)
+        if stats is None:
+            stats = _PairStats(self.window)
+            self.pairs[key] = stats
+        correct = int(correct)
+        stats.total += 1
+        stats.corrects += correct
+        stats.recent.append(correct)
+        if stats.last_time is None or timestamp >= stats.last_time:
+            stats.last_time = timestamp
+        last = self.last_activity.get(student_id)
+        if last is None or timestamp >= last:
+            self.last_activity[student_id] = timestamp
+
+    def last_time(self, student_id, topic_id):
+        """Time of the student's last answer on this topic, None if never answered."""
+        stats = self.pairs.get((student_id, topic_id))
+        return stats.last_time if stats is not None else None
+
+    def hours_since_last_activity(self, student_id, now=None):
+        last = self.last_activity.get(student_id)
+        if last is None:
+            return 9999.0
+        now = now or datetime.utcnow()
+        return (now - pd.to_datetime(last)).total_seconds() / 3600.0
+
+    def features(self, student_id, topic_id, now=None):
+        """Feature dict for one (student, topic), keyed like FEATURE_COLUMNS."""
+        row = self.features_matrix(student_id, [topic_id], now)[0]
+        return {
+            "total_attempts_on_topic": int(row[0]),
+            "accuracy_on_topic": float(row[1]),
+            "recent_corrects_on_topic": int(row[2]),
+            "hours_since_last_activity": float(row[3]),
+        }
+
+    def features_matrix(self, student_id, topics, now=None):
+        """Feature matrix of shape (len(topics), 4), columns in FEATURE_COLUMNS order."""
+        X = np.zeros((len(topics), 4), dtype=float)
+        X[:, 1] = 0.5
+        for i, t in enumerate(topics):
+            stats = self.pairs.get((student_id, t))
+            if stats is None or stats.total == 0:
+                continue
+            X[i, 0] = stats.total
+            X[i, 1] = stats.corrects / stats.total
+            X[i, 2] = sum(stats.recent)
+        X[:, 3] = self.hours_since_last_activity(student_id, now)
+        return X
@@ -0,0 +1,248 @@
+# instrumentation.py
+"""
+Latency instrumentation for the recommend / update hot paths (off by default).
+
+enable() wraps the methods listed in STAGES with timers that record call counts and
+latency histograms per stage; disable() puts the original methods back, so there
+is no cost at all while it is off. Turn it on with STUDY_PLANNER_METRICS=1 or from
+the app's admin panel. Stages nest (recommend includes recommend.score, which
+includes model.predict, ...); a stage re-entered on the same thread (a subclass method
+calling its wrapped super() method) is recorded once, for the outermost call.
+
+Read the numbers with snapshot() / dump() / prometheus_text(), or streamlit_panel(st).
+profile_next("recommend") runs the next call of a stage under cProfile.
+"""
+import bisect
+import cProfile
+import functools
+import importlib
+import io
+import os
+import pstats
+import threading
+import time
+
+# (module, class, method, stage)
+STAGES = [
+    ("interaction_log", "InteractionLog", "reload", "log.load"),
+    ("interaction_log", "InteractionLog", "append", "log.append"),
+    ("feature_store", "FeatureStore", "from_dataframe", "features.build"),
+    ("recommender", "Recommender", "_build_features_batch", "features.batch"),
+    ("recommender", "Recommender", "ml_scores", "model.predict"),
+    ("recommender", "Recommender", "score_topics", "recommend.score"),
+    ("recommender", "Recommender", "recommend", "recommend"),
+    ("cohort", "CohortReport", "_chunk", "cohort.chunk"),
+    ("progress_store", "JSONProgressStore", "upsert", "progress.save"),
+    ("progress_store", "SQLiteProgressStore", "upsert", "progress.save"),
+    ("mastery", "EMAMastery", "update", "mastery.update"),
+    ("mastery", "SM2Mastery", "update", "mastery.update"),
+    ("compact_mastery", "CompactEMAMastery", "update", "mastery.update"),
+    ("compact_mastery", "CompactSM2Mastery", "update", "mastery.update"),
+    ("compact_mastery", "CompactEMAMastery", "update_many", "mastery.update_many"),
+    ("compact_mastery", "CompactSM2Mastery", "update_many", "mastery.update_many"),
+    ("compact_mastery", "DecayEMAMastery", "update", "mastery.update"),
+    ("mastery_snapshot", "SnapshotEMAMastery", "update", "mastery.update"),
+    ("mastery_snapshot", "SnapshotEMAMastery", "update_many", "mastery.update_many"),
+]
+
+# histogram bucket upper bounds in seconds (plus +Inf)
+BUCKETS = [1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25,
+           0.5, 1.0, 2.5, 5.0, 10.0]
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """Estimate from the buckets (linear within a bucket, like Prometheus' histogram_quantile)."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+_lock = threading.Lock()
+_histograms = {}  # stage -> Histogram
+_originals = {}  # (class, method) -> original attribute from the class __dict__
+_profile = {"stage": None, "text": None}
+_active = threading.local()  # .stages: stages currently being timed on this thread
+
+def enabled():
+    return bool(_originals)
+
+def record(stage, seconds):
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = _histograms[stage] = Histogram()
+        hist.record(seconds)
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start)
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_TIMER = _NoTimer()
+
+def timed(stage):
+    """Context manager timing a block as `stage` (a no-op while instrumentation is off)."""
+    return _Timer(stage) if enabled() else _NO_TIMER
+
+def _profiled(stage, fn, args, kwargs):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(30)
+        _profile["text"] = f"cProfile of one '{stage}' call\n" + out.getvalue()
+
+def _wrap(fn, stage):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        active = _active.__dict__.setdefault("stages", set())
+        if stage in active:
+            # re-entered through super() (e.g. DecayEMAMastery.update -> CompactEMAMastery.update):
+            # only the outermost call is recorded
+            return fn(*args, **kwargs)
+        if _profile["stage"] == stage:
+            _profile["stage"] = None
+            run = lambda *a, **k: _profiled(stage, fn, a, k)
+        else:
+            run = fn
+        active.add(stage)
+        start = time.perf_counter()
+        try:
+            return run(*args, **kwargs)
+        finally:
+            record(stage, time.perf_counter() - start)
+            active.discard(stage)
+    return wrapper
+
+def enable():
+    """Start timing every stage in STAGES (idempotent)."""
+    with _lock:
+        for module, cls_name, method, stage in STAGES:
+            cls = getattr(importlib.import_module(module), cls_name)
+            if (cls, method) in _originals or method not in cls.__dict__:
+                continue
+            original = cls.__dict__[method]
+            if isinstance(original, classmethod):
+                wrapped = classmethod(_wrap(original.__func__, stage))
+            elif isinstance(original, staticmethod):
+                wrapped = staticmethod(_wrap(original.__func__, stage))
+            else:
+                wrapped = _wrap(original, stage)
+            _originals[(cls, method)] = original
+            setattr(cls, method, wrapped)
+
+def disable():
+    """Put the original methods back (recorded numbers are kept)."""
+    with _lock:
+        for (cls, method), original in _originals.items():
+            setattr(cls, method, original)
+        _originals.clear()
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _profile["text"] = None
+
+def profile_next(stage="recommend"):
+    """Run the next call of `stage` under cProfile (needs instrumentation enabled); see last_profile()."""
+    _profile["stage"] = stage
+
+def last_profile():
+    """pstats text of the last profiled call, or None."""
+    return _profile["text"]
+
+def snapshot():
+    """{stage: {count, total_s, mean_ms, p50_ms, p95_ms, p99_ms}}."""
+    with _lock:
+        return {
+            stage: {
+                "count": h.count,
+                "total_s": h.total,
+                "mean_ms": 1000 * h.total / h.count if h.count else 0.0,
+                "p50_ms": 1000 * h.quantile(0.50),
+                "p95_ms": 1000 * h.quantile(0.95),
+                "p99_ms": 1000 * h.quantile(0.99),
+            }
+            for stage, h in sorted(_histograms.items())
+        }
+
+def dump(file=None):
+    """Print a table of every stage."""
+    lines = [f"{'stage':<22} {'count':>8} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for stage, s in snapshot().items():
+        lines.append(f"{stage:<22} {s['count']:>8} {s['total_s']:>9.3f} {s['mean_ms']:>9.3f} "
+                     f"{s['p50_ms']:>9.3f} {s['p95_ms']:>9.3f} {s['p99_ms']:>9.3f}")
+    print("\n".join(lines), file=file)
+
+def prometheus_text(prefix="study_planner_stage"):
+    """Histograms in the Prometheus text exposition format."""
+    lines = [f"# HELP {prefix}_seconds Latency of instrumented stages.", f"# TYPE {prefix}_seconds histogram"]
+    with _lock:
+        for stage, h in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ["+Inf"], h.buckets):
+                cumulative += n
+                le = bound if isinstance(bound, str) else repr(bound)
+                lines.append(f'{prefix}_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_seconds_sum{{stage="{stage}"}} {h.total}')
+            lines.append(f'{prefix}_seconds_count{{stage="{stage}"}} {h.count}')
+    return "\n".join(lines) + "\n"
+
+def streamlit_panel(st):
+    """Admin panel: on/off switch, stage table, Prometheus text and single-request profiling."""
+    on = st.checkbox("Record stage latencies", value=enabled(), key="instrumentation_on")
+    if on and not enabled():
+        enable()
+    elif not on and enabled():
+        disable()
+    stats = snapshot()
+    if stats:
+        st.table([{"stage": stage, **{k: round(v, 3) for k, v in s.items()}} for stage, s in stats.items()])
+    else:
+        st.caption("No measurements yet.")
+    col1, col2 = st.columns(2)
+    if col1.button("Profile next recommendation", disabled=not on):
+        profile_next("recommend")
+    if col2.button("Reset measurements"):
+        reset()
+    if last_profile():
+        with st.expander("Last profile"):
+            st.code(last_profile())
+    with st.expander("Prometheus text"):
+        st.code(prometheus_text())
+
+if os.environ.get("STUDY_PLANNER_METRICS") == "1":
+    enable()
@@ -0,0 +1,398 @@
+# interaction_log.py
+"""
+The interaction log (student_id, topic_id, timestamp, correct).
+
+One logical log can span several files, read in this order as one log by read_log:
+- an optional columnar file (data/students.parquet) holding compacted history with
+  categorical ids, native timestamps and int8 `correct` (needs pyarrow):
+      python interaction_log.py compact --csv data/students.csv
+- the base CSV (data/students.csv), which new answers are appended to
+- date partitions written next to it when rotation is on (data/students-2025-10-17.csv)
+"""
+import argparse
+import atexit
+import contextlib
+import csv
+import glob
+import io
+import os
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+
+from feature_store import FeatureStore
+from utils.helpers import file_lock
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for the columnar log
+    pq = None
+
+LOG_COLUMNS = ["student_id", "topic_id", "timestamp", "correct"]
+LOG_DTYPES = {"student_id": "category", "topic_id": "category", "correct": "int8"}
+COLUMNAR_EXT = ".parquet"
+
+def columnar_path(csv_path):
+    """Columnar file of a log: data/students.csv -> data/students.parquet."""
+    return os.path.splitext(csv_path)[0] + COLUMNAR_EXT
+
+def typed_log(df):
+    """Log frame with categorical ids, datetime64 timestamps and int8 correct."""
+    for col, dtype in LOG_DTYPES.items():
+        if col in df.columns and df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    if 'timestamp' in df.columns and df['timestamp'].dtype.kind != 'M':
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+def _concat(frames):
+    if not frames:
+        return typed_log(pd.DataFrame(columns=LOG_COLUMNS))
+    if len(frames) == 1:
+        return frames[0]
+    # ids with different categories come back as object columns: re-categorize once
+    return typed_log(pd.concat(frames, ignore_index=True))
+
+def partition_path(csv_path, day):
+    """Date partition of a log: data/students.csv -> data/students-2025-10-17.csv."""
+    stem, ext = os.path.splitext(csv_path)
+    return f"{stem}-{day.isoformat()}{ext}"
+
+def log_files(csv_path="data/students.csv"):
+    """Files making up the logical log: columnar file, base file, then date partitions in date order."""
+    stem, ext = os.path.splitext(csv_path)
+    files = [p for p in (columnar_path(csv_path), csv_path) if os.path.exists(p)]
+    return files + sorted(glob.glob(f"{glob.escape(stem)}-[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]{ext}"))
+
+def read_log_file(path):
+    """One log file (CSV or columnar) as a typed frame."""
+    if path.endswith(COLUMNAR_EXT):
+        return typed_log(pd.read_parquet(path))
+    if os.path.getsize(path) == 0:  # base CSV right after compact_log
+        return typed_log(pd.DataFrame(columns=LOG_COLUMNS))
+    return typed_log(pd.read_csv(path, dtype=LOG_DTYPES))
+
+def read_log(csv_path="data/students.csv"):
+    """
+    The whole logical log as one typed frame (categorical ids, datetime64 timestamps,
+    int8 correct); empty frame if there is none. This is the loader every reader uses.
+    """
+    files = log_files(csv_path)
+    if files and files[0].endswith(COLUMNAR_EXT):
+        # compact_log rewrites the files under this lock; don't read halfway through
+        with file_lock(csv_path + ".lock"):
+            return _concat([read_log_file(p) for p in log_files(csv_path)])
+    return _concat([read_log_file(p) for p in files])
+
+def iter_log_chunks(csv_path="data/students.csv", chunksize=100_000):
+    """Typed frames of at most `chunksize` rows over the whole logical log, in log order."""
+    for path in log_files(csv_path):
+        if path.endswith(COLUMNAR_EXT):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+                yield typed_log(batch.to_pandas())
+        elif os.path.getsize(path) > 0:
+            for chunk in pd.read_csv(path, dtype=LOG_DTYPES, chunksize=chunksize):
+                yield typed_log(chunk)
+
+def log_positions(csv_path="data/students.csv"):
+    """Where each file of the logical log ends now ({path: (inode, size)}), for read_log_since."""
+    positions = {}
+    for path in log_files(csv_path):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            end = st.st_size
+            if not path.endswith(COLUMNAR_EXT) and end:
+                # back to the last complete line: a writer may be halfway through one
+                f.seek(max(0, end - 65536))
+                block = f.read(end - f.tell())
+                end -= len(block) - (block.rfind(b"\n") + 1)
+        positions[path] = (st.st_ino, end)
+    return positions
+
+def read_log_since(csv_path, positions):
+    """
+    Rows appended to the logical log after `positions` (from log_positions, or {} for
+    the whole log) as a list of typed frames in log order, and the positions after them.
+    Only the new bytes of CSV files that grew in place are read. After a compaction
+    (the columnar file is new) every file is read whole, so callers that must not see
+    a row twice filter by time as well.
+    """
+    files = log_files(csv_path)
+    columnar = [p for p in files if p.endswith(COLUMNAR_EXT)]
+    with file_lock(csv_path + ".lock") if columnar else contextlib.nullcontext():  # see read_log
+        if columnar and positions.get(columnar[0], (None,))[0] != os.stat(columnar[0]).st_ino:
+            positions = {}
+        frames, after = [], {}
+        for path in log_files(csv_path):
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                inode, offset = positions.get(path, (None, 0))
+                if inode != st.st_ino or st.st_size < offset:
+                    offset = 0
+                if path.endswith(COLUMNAR_EXT):
+                    if offset == 0:
+                        frames.append(read_log_file(path))
+                    after[path] = (st.st_ino, st.st_size)
+                    continue
+                f.seek(offset)
+                data = f.read()
+            end = data.rfind(b"\n") + 1  # a partially written last line is read next time
+            rows = _parse_rows(data[:end], header=(offset == 0))
+            if not rows.empty:
+                frames.append(rows)
+            after[path] = (st.st_ino, offset + end)
+    return frames, after
+
+def compact_log(csv_path="data/students.csv"):
+    """
+    Fold the CSV log and its date partitions into the columnar file and empty them,
+    so readers parse binary columns instead of text. Returns the number of rows.
+    """
+    if pq is None:
+        raise ImportError("the columnar log needs pyarrow (pip install -r requirements-optional.txt)")
+    out = columnar_path(csv_path)
+    with file_lock(csv_path + ".lock"):
+        files = log_files(csv_path)
+        df = _concat([read_log_file(p) for p in files])
+        tmp = f"{out}.tmp.{os.getpid()}"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, out)
+        for path in files:
+            if path == csv_path:
+                open(path, "w").close()  # the next append writes the header again
+            elif path != out:
+                os.remove(path)
+    return len(df)
+
+def format_row(student_id, topic_id, correct, timestamp):
+    """One CSV line (with newline) for an answer."""
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(
+        [student_id, topic_id, timestamp.isoformat(timespec="microseconds"), int(correct)])
+    return buf.getvalue()
+
+class LogWriter:
+    """
+    Buffered appender for the interaction log.
+    Rows are buffered and written when `batch_size` rows are pending or `flush_interval`
+    seconds have passed (a background thread flushes idle buffers), and at exit.
+    Each flush takes a lock file next to the log and writes every target file's batch
+    with a single O_APPEND write, so concurrent writers only ever append whole lines.
+    rotate=True sends each row to the date partition of its timestamp.
+    before_write(path) / after_write(path, end_offset) run under the lock around each file write.
+    """
+    def __init__(self, csv_path="data/students.csv", batch_size=64, flush_interval=1.0, rotate=False,
+                 lock=None, before_write=None, after_write=None):
+        self.path = csv_path
+        self.lock_path = csv_path + ".lock"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate = rotate
+        self.before_write = before_write
+        self.after_write = after_write
+        self._lock = lock or threading.RLock()
+        self._buffer = []  # (target path, line)
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        if batch_size > 1:  # something may sit in the buffer: flush it when idle and at exit
+            if flush_interval:
+                threading.Thread(target=self._flush_periodically, daemon=True).start()
+            atexit.register(self.close)
+
+    def _target(self, timestamp):
+        return partition_path(self.path, timestamp.date()) if self.rotate else self.path
+
+    def append(self, student_id, topic_id, correct, timestamp=None):
+        timestamp = timestamp or datetime.utcnow()
+        line = format_row(student_id, topic_id, correct, timestamp)
+        with self._lock:
+            self._buffer.append((self._target(timestamp), line))
+            if len(self._buffer) >= self.batch_size or (
+                    self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def flush(self):
+        """Write all buffered rows now."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            buffered, self._buffer = self._buffer, []
+            batches = {}
+            for path, line in buffered:
+                batches.setdefault(path, []).append(line)
+            try:
+                with file_lock(self.lock_path):
+                    while batches:
+                        path = next(iter(batches))
+                        self._write(path, "".join(batches[path]).encode("utf-8"))
+                        del batches[path]
+            except BaseException:
+                # keep what was not written for the next flush
+                self._buffer = [(p, l) for p, lines in batches.items() for l in lines] + self._buffer
+                raise
+
+    def _write(self, path, data):
+        if self.before_write is not None:
+            self.before_write(path)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size == 0:
+                data = (",".join(LOG_COLUMNS) + "\n").encode("utf-8") + data
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            end = os.lseek(fd, 0, os.SEEK_END)
+        finally:
+            os.close(fd)
+        if self.after_write is not None:
+            self.after_write(path, end)
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+def _parse_rows(data, header):
+    """Parse CSV bytes (complete lines only) into a log frame."""
+    if not data:
+        return pd.DataFrame(columns=LOG_COLUMNS)
+    if header:
+        df = pd.read_csv(io.BytesIO(data), dtype=LOG_DTYPES)
+    else:
+        df = pd.read_csv(io.BytesIO(data), header=None, names=LOG_COLUMNS, dtype=LOG_DTYPES)
+    return typed_log(df)
+
+class InteractionLog:
+    """
+    In-memory interaction log with its FeatureStore, meant to be shared across reruns.
+    - append() records an answer in memory at once and hands it to a LogWriter
+      (batch_size=1 writes through; larger batches are flushed by size or time)
+    - refresh() picks up rows other processes appended by reading only the new bytes
+    Offsets are tracked per file, so the rows this process writes are never read back twice.
+    """
+    def __init__(self, csv_path="data/students.csv", window=5, batch_size=1, flush_interval=None, rotate=False):
+        self.path = csv_path
+        self.window = window
+        self._lock = threading.RLock()
+        self._stale = False  # a file was replaced under us; reload on the next refresh()
+        self.writer = LogWriter(csv_path, batch_size=batch_size, flush_interval=flush_interval, rotate=rotate,
+                                lock=self._lock, before_write=self._before_write, after_write=self._mark_written)
+        self.reload()
+
+    def reload(self):
+        """Read the whole logical log again (also used when a file was truncated or replaced)."""
+        with self._lock:
+            self.writer.flush()  # buffered answers go to disk first so they are read back
+            self._stale = False
+            self._offsets = {}  # path -> bytes already read
+            self._inodes = {}
+            self._frames = []
+            self._pending = []
+            self._df = None
+            files = log_files(self.path)
+            if files and files[0].endswith(COLUMNAR_EXT):
+                with file_lock(self.path + ".lock"):  # see read_log
+                    for path in log_files(self.path):
+                        self._read_from(path, 0)
+            else:
+                for path in files:
+                    self._read_from(path, 0)
+            self.features = FeatureStore.from_dataframe(self.df, window=self.window)
+
+    def _read_from(self, path, offset):
+        """Parse complete lines of `path` from `offset` onwards; returns the new rows."""
+        if path.endswith(COLUMNAR_EXT):  # only rewritten whole, by compact_log
+            self._inodes[path] = os.stat(path).st_ino
+            self._offsets[path] = 0
+            self._frames.append(read_log_file(path))
+            self._df = None
+            return self._frames[-1]
+        with open(path, "rb") as f:
+            self._inodes[path] = os.fstat(f.fileno()).st_ino
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # leave a partially written last line for next time
+        rows = _parse_rows(data[:end], header=(offset == 0))
+        self._offsets[path] = offset + end
+        if not rows.empty:
+            self._frames.append(rows)
+            self._df = None
+        return rows
+
+    def _refresh_file(self, path):
+        """Read rows appended to one file by other writers. False if a full reload is needed."""
+        if not os.path.exists(path):
+            return True
+        st = os.stat(path)
+        if path.endswith(COLUMNAR_EXT):
+            return st.st_ino == self._inodes.get(path)
+        offset = self._offsets.get(path, 0)
+        if path in self._inodes and (st.st_ino != self._inodes[path] or st.st_size < offset):
+            return False
+        if st.st_size > offset:
+            rows = self._read_from(path, offset)
+            for r in rows.itertuples(index=False):
+                self.features.update(r.student_id, r.topic_id, r.correct, r.timestamp)
+        return True
+
+    def _before_write(self, path):
+        # runs under the log lock: catch up with other writers so our offset stays exact
+        if not self._refresh_file(path):
+            self._stale = True
+
+    def _mark_written(self, path, end):
+        self._offsets[path] = end
+        self._inodes[path] = os.stat(path).st_ino
+
+    def refresh(self):
+        """Load rows appended to the log since the last read (cheap when nothing changed)."""
+        with self._lock:
+            files = log_files(self.path)
+            if self._stale or set(self._offsets) - set(files) or not all(self._refresh_file(p) for p in files):
+                self.reload()
+
+    def append(self, student_id, topic_id, correct, timestamp=None):
+        """Log one answer: memory (and ML features) now, disk via the writer."""
+        timestamp = timestamp or datetime.utcnow()
+        with self._lock:
+            self._pending.append({"student_id": student_id, "topic_id": topic_id,
+                                  "timestamp": pd.Timestamp(timestamp), "correct": int(correct)})
+            self._df = None
+            self.features.update(student_id, topic_id, int(correct), timestamp)
+            self.writer.append(student_id, topic_id, correct, timestamp)
+            if self._stale:
+                self.reload()
+
+    def flush(self):
+        """Write buffered answers to disk now."""
+        self.writer.flush()
+
+    @property
+    def df(self):
+        """The whole log as one typed DataFrame (concatenated lazily)."""
+        with self._lock:
+            if self._df is None:
+                frames = list(self._frames)
+                if self._pending:
+                    frames.append(typed_log(pd.DataFrame(self._pending, columns=LOG_COLUMNS)))
+                self._df = _concat(frames)
+                self._frames = [self._df] if frames else []
+                self._pending = []
+            return self._df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interaction log tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact = sub.add_parser("compact", help="fold the CSV log into the columnar file next to it")
+    compact.add_argument("--csv", default="data/students.csv")
+    args = parser.parse_args()
+    if args.command == "compact":
+        n = compact_log(args.csv)
+        print(f"Compacted {n} rows into {columnar_path(args.csv)}")
@@ -1,5 +1,8 @@
 # mastery.py
+import heapq
+import itertools
 from datetime import datetime, timedelta
+import numpy as np
 
 # EMA Mastery Engine
 class EMAMastery:
@@ -12,6 +15,7 @@ class EMAMastery:
         self.mastery = {}  # key: (student_id, topic_id) -> mastery score
         self.last_review = {}  # key -> datetime
         self.initial = initial
+        self.listeners = []  # fn(student_id), called after that student's state changes
 
     def _key(self, student_id, topic_id):
         return f"{student_id}||{topic_id}"
@@ -19,12 +23,105 @@ class EMAMastery:
     def get_mastery(self, student_id, topic_id):
         return self.mastery.get(self._key(student_id, topic_id), self.initial)
 
+    def get_mastery_many(self, student_id, topic_ids):
+        """Mastery of one student on several topics, as a NumPy array."""
+        return np.array([self.get_mastery(student_id, t) for t in topic_ids], dtype=float)
+
+    def get_last_review(self, student_id, topic_id):
+        return self.last_review.get(self._key(student_id, topic_id))
+
+    def set_state(self, student_id, topic_id, mastery, last_review=None):
+        """Load a saved mastery (e.g. from the progress store) without an update step."""
+        k = self._key(student_id, topic_id)
+        self.mastery[k] = mastery
+        if last_review is not None:
+            self.last_review[k] = last_review
+        for fn in self.listeners:
+            fn(student_id)
+
+    def reset(self, student_id, topic_id):
+        k = self._key(student_id, topic_id)
+        self.mastery.pop(k, None)
+        self.last_review.pop(k, None)
+        for fn in self.listeners:
+            fn(student_id)
+
     def update(self, student_id, topic_id, correct, timestamp=None):
         k = self._key(student_id, topic_id)
         prev = self.mastery.get(k, self.initial)
         new = self.alpha * (1.0 if correct else 0.0) + (1 - self.alpha) * prev
         self.mastery[k] = new
         self.last_review[k] = timestamp
+        for fn in self.listeners:
+            fn(student_id)
+
+# Per-student index of topics by next review time
+class DueIndex:
+    """
+    Each student's scheduled topics in a heap keyed by (time, scheduling order):
+    schedule is O(log n), remove O(1), and "what is due now" / "the n most urgent" walk
+    the heap in order without popping it, O(k log k) for k results. A reschedule or
+    removal leaves the old entry in the heap; queries skip it and a student's heap is
+    rebuilt once such entries outnumber the live ones. Ties keep scheduling order.
+    Times only need to be comparable.
+    """
+    def __init__(self):
+        self.heaps = {}  # student_id -> [(time, seq, topic_id)], including replaced entries
+        self.scheduled = {}  # student_id -> {topic_id: live heap entry}
+        self._seq = itertools.count()
+
+    def schedule(self, student_id, topic_id, when):
+        """(Re)schedule a topic at `when`."""
+        entry = (when, next(self._seq), topic_id)
+        live = self.scheduled.get(student_id)
+        if live is None:
+            live = self.scheduled[student_id] = {}
+            self.heaps[student_id] = []
+        live[topic_id] = entry
+        heap = self.heaps[student_id]
+        heapq.heappush(heap, entry)
+        if len(heap) > 2 * len(live) + 8:
+            self._compact(heap, live)
+
+    def remove(self, student_id, topic_id):
+        live = self.scheduled.get(student_id)
+        if live and live.pop(topic_id, None) is not None:
+            heap = self.heaps[student_id]
+            if len(heap) > 2 * len(live) + 8:
+                self._compact(heap, live)
+
+    @staticmethod
+    def _compact(heap, live):
+        heap[:] = live.values()
+        heapq.heapify(heap)
+
+    def _in_order(self, student_id):
+        """Live entries, earliest first: a frontier heap over heap positions, so nothing is popped."""
+        heap = self.heaps.get(student_id)
+        if not heap:
+            return
+        live = self.scheduled[student_id]
+        frontier = [(heap[0], 0)]
+        while frontier:
+            entry, i = heapq.heappop(frontier)
+            if live.get(entry[2]) is entry:
+                yield entry
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def due(self, student_id, now, limit=None):
+        """Topics scheduled at or before `now`, most overdue first."""
+        out = []
+        for when, _, topic_id in self._in_order(student_id):
+            if when > now or len(out) == limit:
+                break
+            out.append(topic_id)
+        return out
+
+    def first(self, student_id, n):
+        """The `n` topics with the earliest times (overdue first, then soonest due)."""
+        return [topic_id for _, _, topic_id in itertools.islice(self._in_order(student_id), max(n, 0))]
 
 # SM-2 spaced repetition (simplified)
 class SM2Item:
@@ -39,9 +136,13 @@ class SM2Mastery:
     Implement simplified SM-2 (Ebbinghaus) algorithm.
     For each (student,topic) keep EF, repetitions, interval and compute next review date.
     Quality score q: 5 (perfect) to 0 (complete blackout). We map correct (1) -> q=5, incorrect (0) -> q=2
+    track_due: keep a DueIndex of next reviews for due_topics / top_due (without it they
+    scan every pair)
     """
-    def __init__(self):
+    def __init__(self, track_due=True):
         self.store = {}  # key -> SM2Item
+        self.due_index = DueIndex() if track_due else None
+        self.listeners = []  # fn(student_id), called after that student's state changes
 
     def _key(self, student_id, topic_id):
         return f"{student_id}||{topic_id}"
@@ -66,12 +167,50 @@ class SM2Mastery:
         # schedule next review
         item.next_review = timestamp + timedelta(days=item.interval)
         self.store[k] = item
+        if self.due_index is not None:
+            self.due_index.schedule(student_id, topic_id, item.next_review)
+        for fn in self.listeners:
+            fn(student_id)
 
     def get_next_review(self, student_id, topic_id):
         k = self._key(student_id, topic_id)
         item = self.store.get(k)
         return item.next_review if item else None
 
+    def get_next_review_many(self, student_id, topic_ids):
+        """datetime64[us] array of next reviews, NaT where never reviewed."""
+        return np.array([self.get_next_review(student_id, t) for t in topic_ids], dtype="datetime64[us]")
+
+    def _scan_due(self, student_id):
+        """DueIndex over one student's reviews, built by scanning every pair (for track_due=False)."""
+        index = DueIndex()
+        prefix = f"{student_id}||"
+        for k, item in self.store.items():
+            if k.startswith(prefix) and item.next_review is not None:
+                index.schedule(student_id, k[len(prefix):], item.next_review)
+        return index
+
+    def due_topics(self, student_id, now=None, limit=None):
+        """Topics whose next review is at or before `now`, most overdue first."""
+        index = self.due_index if self.due_index is not None else self._scan_due(student_id)
+        return index.due(student_id, now or datetime.utcnow(), limit)
+
+    def top_due(self, student_id, n=1):
+        """The `n` reviewed topics with the earliest next review (most urgent first)."""
+        index = self.due_index if self.due_index is not None else self._scan_due(student_id)
+        return index.first(student_id, n)
+
+    def reset(self, student_id, topic_id):
+        self.store.pop(self._key(student_id, topic_id), None)
+        if self.due_index is not None:
+            self.due_index.remove(student_id, topic_id)
+        for fn in self.listeners:
+            fn(student_id)
+
+    def get_mastery_many(self, student_id, topic_ids):
+        """`get_mastery_score_estimate` for several topics, as a NumPy array."""
+        return np.array([self.get_mastery_score_estimate(student_id, t) for t in topic_ids], dtype=float)
+
     def get_mastery_score_estimate(self, student_id, topic_id):
         """Return a pseudo-mastery from repetitions and EF in [0,1] for ranking."""
         k = self._key(student_id, topic_id)
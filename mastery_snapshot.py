@@ -0,0 +1,237 @@
+# mastery_snapshot.py
+"""
+Binary snapshots of EMA mastery state for fast cold starts.
+
+A snapshot is a directory of .npy files (opened with mmap, so nothing is parsed up front):
+- meta.json: alpha, initial, as_of, topic ids and where the interaction log ended
+- students.npy: sorted student ids
+- mastery.npy / last_review.npy: student x topic matrices in the same row order
+
+SnapshotEMAMastery serves one student at a time: the first time a student is touched
+their row is copied out of the snapshot and what changed since is applied on top,
+from the progress store if one is given (it also records resets), else by replaying
+the log rows appended after the snapshot. Build one from the progress store with:
+    python mastery_snapshot.py build --progress data/progress.json --log data/students.csv --out data/mastery_snapshot
+"""
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+
+from compact_mastery import CompactEMAMastery, DecayEMAMastery
+from interaction_log import log_positions, read_log_since
+from progress_store import entry_state
+
+SNAPSHOT_VERSION = 1
+
+def _engine_state(engine):
+    """(student ids, topic ids, mastery matrix, last_review matrix) of an EMA engine."""
+    if isinstance(engine, CompactEMAMastery):
+        n_students, n_topics = engine.pairs.shape
+        return (list(engine.pairs.student_ids), list(engine.pairs.topic_ids),
+                engine.pairs.arrays["mastery"][:n_students, :n_topics],
+                engine.pairs.arrays["last_review"][:n_students, :n_topics])
+    compact = CompactEMAMastery(alpha=engine.alpha, initial=engine.initial)
+    for key, m in engine.mastery.items():
+        sid, tid = key.split("||", 1)
+        compact.set_state(sid, tid, m, engine.last_review.get(key))
+    return _engine_state(compact)
+
+def save_snapshot(engine, path, as_of=None, log_at=None):
+    """
+    Write an EMAMastery / CompactEMAMastery to `path`. as_of: time up to which the state
+    reflects the interaction log (log events after it are replayed on load).
+    log_at: interaction_log.log_positions taken before the state was read; replay reads
+    the log from there instead of from the start.
+    """
+    as_of = as_of or datetime.utcnow()
+    students, topics, mastery, last_review = _engine_state(engine)
+    order = np.argsort(np.array(students, dtype=str), kind="stable")
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "students.npy"), np.array(students, dtype=str)[order])
+    np.save(os.path.join(tmp, "mastery.npy"), np.ascontiguousarray(mastery[order]))
+    np.save(os.path.join(tmp, "last_review.npy"), np.ascontiguousarray(last_review[order]))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": SNAPSHOT_VERSION,
+            "alpha": engine.alpha,
+            "initial": engine.initial,
+            "as_of": as_of.isoformat(),
+            "topics": topics,
+            "log_at": {p: list(at) for p, at in (log_at or {}).items()},
+        }, f)
+    # swap directories so readers never see a half-written snapshot
+    old = path + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+class SnapshotEMAMastery(CompactEMAMastery):
+    """
+    CompactEMAMastery that loads students lazily from a snapshot and brings them up to date.
+    progress: progress store; its entries newer than the snapshot replace the snapshot values
+    and topics no longer in it (reset) are dropped.
+    replay_log: path of the interaction log (or an InteractionLog) whose rows appended after
+    the snapshot and newer than as_of are replayed; only used without a progress store, so
+    resets made after the snapshot are not seen. Only those rows are read, once.
+    """
+    def __init__(self, path, replay_log=None, progress=None):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        super().__init__(alpha=meta["alpha"], initial=meta["initial"])
+        self.path = path
+        self.as_of = datetime.fromisoformat(meta["as_of"])
+        self.snapshot_topics = meta["topics"]
+        self._students = np.load(os.path.join(path, "students.npy"), mmap_mode="r")
+        self._mastery = np.load(os.path.join(path, "mastery.npy"), mmap_mode="r")
+        self._last_review = np.load(os.path.join(path, "last_review.npy"), mmap_mode="r")
+        self.replay_log = replay_log
+        self.progress = progress
+        self._loaded = set()
+        self._tail = {}  # student_id -> frames of log rows newer than the snapshot, in log order
+        self._log_at = {p: tuple(at) for p, at in meta.get("log_at", {}).items()}
+
+    def _snapshot_row(self, student_id):
+        i = int(np.searchsorted(self._students, student_id))
+        if i < len(self._students) and self._students[i] == student_id:
+            return i
+        return None
+
+    def _events_after_snapshot(self, student_id):
+        """The student's log rows newer than the snapshot (frames); reads only rows appended since the last call."""
+        if self.replay_log is None:
+            return []
+        if hasattr(self.replay_log, "flush"):  # InteractionLog: its buffered answers go to disk first
+            self.replay_log.flush()
+        frames, self._log_at = read_log_since(getattr(self.replay_log, "path", self.replay_log), self._log_at)
+        for rows in frames:
+            rows = rows[(rows['timestamp'] > self.as_of).to_numpy()]
+            for sid, g in rows.groupby('student_id', sort=False, observed=True):
+                # students loaded earlier get their answers through update()
+                if sid == student_id or sid not in self._loaded:
+                    self._tail.setdefault(sid, []).append(g)
+        return self._tail.pop(student_id, [])
+
+    def load_student(self, student_id, entries=None):
+        """
+        Materialize a student's state (snapshot row + what changed since). Idempotent.
+        entries: the student's progress entries if already read ({topic: entry}).
+        """
+        if student_id in self._loaded:
+            return
+        self._loaded.add(student_id)
+        if entries is None and self.progress is not None:
+            entries = self.progress.load_student(student_id)
+        i = self._snapshot_row(student_id)
+        if i is not None:
+            mastery = np.asarray(self._mastery[i])
+            last_review = np.asarray(self._last_review[i])
+            keep = ~np.isnat(last_review) | (mastery != self.initial)
+            if entries is not None:
+                keep &= np.isin(self.snapshot_topics, list(entries))
+            touched = np.flatnonzero(keep)
+            if len(touched):
+                topics = [self.snapshot_topics[j] for j in touched]
+                rows, cols = self.pairs.intern_many([student_id] * len(topics), topics)
+                self.pairs.arrays["mastery"][rows, cols] = mastery[touched]
+                self.pairs.arrays["last_review"][rows, cols] = last_review[touched]
+        if entries is not None:
+            # the store holds every answer (and reset) made since the snapshot
+            for topic_id, entry in entries.items():
+                mastery, last = entry_state(entry, self.initial)
+                if last is None or last > self.as_of or super().get_last_review(student_id, topic_id) is None:
+                    super().set_state(student_id, topic_id, mastery, last)
+            return
+        for events in self._events_after_snapshot(student_id):
+            super().update_many(events['student_id'].to_numpy(), events['topic_id'].to_numpy(),
+                                events['correct'].to_numpy(), events['timestamp'])
+
+    # every access goes through load_student first
+    def get_mastery(self, student_id, topic_id):
+        self.load_student(student_id)
+        return super().get_mastery(student_id, topic_id)
+
+    def get_mastery_many(self, student_id, topic_ids):
+        self.load_student(student_id)
+        return super().get_mastery_many(student_id, topic_ids)
+
+    def get_last_review(self, student_id, topic_id):
+        self.load_student(student_id)
+        return super().get_last_review(student_id, topic_id)
+
+    def get_last_review_many(self, student_id, topic_ids):
+        self.load_student(student_id)
+        return super().get_last_review_many(student_id, topic_ids)
+
+    def set_state(self, student_id, topic_id, mastery, last_review=None):
+        self.load_student(student_id)
+        super().set_state(student_id, topic_id, mastery, last_review)
+
+    def reset(self, student_id, topic_id):
+        self.load_student(student_id)
+        super().reset(student_id, topic_id)
+
+    def update(self, student_id, topic_id, correct, timestamp=None):
+        self.load_student(student_id)
+        super().update(student_id, topic_id, correct, timestamp)
+
+    def update_many(self, student_ids, topic_ids, corrects, timestamps=None):
+        for sid in set(student_ids):
+            self.load_student(sid)
+        super().update_many(student_ids, topic_ids, corrects, timestamps)
+
+def engine_from_progress(progress, alpha=0.3, initial=0.2, half_life_days=None):
+    """
+    CompactEMAMastery preloaded from a progress dict ({student: {topic: entry}}), as app.py does;
+    a DecayEMAMastery with that half-life if half_life_days is given.
+    """
+    if half_life_days:
+        engine = DecayEMAMastery(alpha=alpha, initial=initial, half_life_days=half_life_days)
+    else:
+        engine = CompactEMAMastery(alpha=alpha, initial=initial)
+    for sid, topics in progress.items():
+        for topic_id, stats in topics.items():
+            last = stats.get("last_review")
+            try:
+                last_dt = datetime.fromisoformat(last) if last else None
+            except ValueError:
+                last_dt = None
+            mastery = stats.get("mastery")
+            if mastery is None:
+                attempts = stats.get("attempts", 0)
+                mastery = stats.get("corrects", 0) / attempts if attempts > 0 else initial
+            engine.set_state(sid, topic_id, mastery, last_dt)
+    return engine
+
+def progress_as_of(progress):
+    """Latest last_review in a progress dict: the time a snapshot of it is current as of."""
+    times = [entry_state(e)[1] for topics in progress.values() for e in topics.values()]
+    times = [t for t in times if t is not None]
+    return max(times) if times else datetime.min
+
+if __name__ == "__main__":
+    from progress_store import open_progress_store
+
+    parser = argparse.ArgumentParser(description="Mastery snapshot tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="snapshot the mastery stored in the progress store")
+    build.add_argument("--progress", default=os.environ.get("PROGRESS_STORE", "data/progress.json"))
+    build.add_argument("--log", default="data/students.csv", help="interaction log replayed on load")
+    build.add_argument("--out", default="data/mastery_snapshot")
+    build.add_argument("--alpha", type=float, default=0.3)
+    args = parser.parse_args()
+    if args.command == "build":
+        # the log position first: rows after it are either newer than the progress read
+        # or, being stored before it, not newer than as_of and skipped by the replay
+        log_at = log_positions(args.log)
+        progress = open_progress_store(args.progress).load_all()
+        engine = engine_from_progress(progress, alpha=args.alpha)
+        # from the data read, not the clock: answers stored or logged after the read are newer
+        save_snapshot(engine, args.out, as_of=progress_as_of(progress), log_at=log_at)
+        print(f"Wrote snapshot of {engine.pairs.shape[0]} students to {args.out}")
@@ -0,0 +1,160 @@
+# online_learning.py
+"""
+Online model updates from the live answer stream.
+
+Each logged answer becomes one training row: the four recommender features of the
+(student, topic) pair just before the answer, labelled with its correctness.
+OnlineTrainer queues the rows and a background thread fits a logistic-regression
+SGD model on them in mini-batches with partial_fit. Every batch produces a new
+model object that is swapped in whole (readers never see a half-updated model),
+and the model is checkpointed to disk periodically and on stop.
+"""
+import copy
+import os
+import queue
+import threading
+import joblib
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+ONLINE_MODEL_PATH = "models/online_sgd.pkl"
+
+class OnlineModel:
+    """
+    SGD logistic regression behind a fixed feature transform (log-scaled counts and
+    hours), so no scaler has to be fit up front; predict_proba works like sklearn's.
+    """
+    def __init__(self, alpha=1e-4, eta0=0.01, seed=42):
+        self.clf = SGDClassifier(loss="log_loss", alpha=alpha, learning_rate="adaptive", eta0=eta0,
+                                 random_state=seed)
+        self.classes_ = np.array([0, 1])
+        self.n_seen = 0
+
+    @staticmethod
+    def transform(X):
+        """total_attempts, accuracy, recent_corrects, hours_since_last_activity -> model inputs."""
+        X = np.asarray(X, dtype=float)
+        return np.column_stack([
+            np.log1p(X[:, 0]),
+            X[:, 1] - 0.5,
+            X[:, 2] / 5.0,
+            np.log1p(np.minimum(X[:, 3], 9999.0)) / np.log1p(9999.0),
+        ])
+
+    def partial_fit(self, X, y):
+        self.clf.partial_fit(self.transform(X), np.asarray(y, dtype=int), classes=self.classes_)
+        self.n_seen += len(y)
+        return self
+
+    def predict_proba(self, X):
+        return self.clf.predict_proba(self.transform(X))
+
+    def predict(self, X):
+        return self.clf.predict(self.transform(X))
+
+def load_online_model(path=ONLINE_MODEL_PATH):
+    """Last checkpoint, or None if there is none (or it fails to load)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        print("Warning: failed to load online model checkpoint:", e)
+        return None
+
+class OnlineTrainer:
+    """
+    Background trainer fed one answer at a time via observe().
+    - `model` is the latest fitted OnlineModel (None until the first batch); it is replaced,
+      never modified in place, so it can be handed to a Recommender at any time
+    - `ready` once the model has seen `min_rows` answers (serve it only then)
+    - listeners: callables run with the new model after every swap
+    - a checkpoint is written every `checkpoint_every` rows and on stop()
+    """
+    def __init__(self, checkpoint_path=ONLINE_MODEL_PATH, batch_size=32, flush_interval=2.0,
+                 checkpoint_every=500, min_rows=200):
+        self.checkpoint_path = checkpoint_path
+        self.min_rows = min_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.checkpoint_every = checkpoint_every
+        self.model = load_online_model(checkpoint_path)
+        self.version = 0
+        self.listeners = []
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop = threading.Event()
+        self._since_checkpoint = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def ready(self):
+        return self.model is not None and self.model.n_seen >= self.min_rows
+
+    def start(self):
+        if not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Train on what is queued, checkpoint, and stop the worker."""
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+        rows = self._drain()
+        while rows:
+            self._train(rows)
+            rows = self._drain()
+        self.checkpoint()
+
+    def observe(self, features, correct):
+        """Queue one answer: its 4 features (before the answer) and the outcome. Never blocks."""
+        self._queue.put((np.asarray(features, dtype=float), int(correct)))
+
+    def _drain(self, first=None):
+        rows = [first] if first is not None else []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._train(self._drain(first))
+
+    def _train(self, rows):
+        if not rows:
+            return
+        X = np.vstack([x for x, _ in rows])
+        y = np.array([c for _, c in rows])
+        # fit a copy and swap it in, so readers only ever see complete models
+        model = copy.deepcopy(self.model) if self.model is not None else OnlineModel()
+        model.partial_fit(X, y)
+        self.model = model
+        self.version += 1
+        for listener in self.listeners:
+            listener(model)
+        self._since_checkpoint += len(rows)
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Write the current model to checkpoint_path (atomically)."""
+        model = self.model
+        if model is None:
+            return
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        tmp = f"{self.checkpoint_path}.tmp.{os.getpid()}"
+        joblib.dump(model, tmp)
+        os.replace(tmp, self.checkpoint_path)
+        self._since_checkpoint = 0
@@ -0,0 +1,209 @@
+# progress_store.py
+"""
+Pluggable storage for per-(student, topic) progress entries:
+{"attempts", "corrects", "last_review" (ISO string), "mastery"}.
+
+- JSONProgressStore: the original data/progress.json file (default)
+- SQLiteProgressStore: one row per (student, topic); upserts touch a single row,
+  reads fetch only one student's rows, and WAL mode lets concurrent sessions write safely
+
+Migrate an existing file with:
+    python progress_store.py migrate data/progress.json data/progress.db
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from utils.helpers import atomic_write_text, file_lock
+
+ENTRY_FIELDS = ("attempts", "corrects", "last_review", "mastery")
+
+def new_entry():
+    return {"attempts": 0, "corrects": 0, "last_review": None, "mastery": None}
+
+def entry_state(entry, initial=0.2):
+    """(mastery, last_review datetime) of an entry; mastery falls back to corrects / attempts, as app.py preloads it."""
+    last = entry.get("last_review")
+    try:
+        last = datetime.fromisoformat(last) if last else None
+    except ValueError:
+        last = None
+    mastery = entry.get("mastery")
+    if mastery is None:
+        attempts = entry.get("attempts", 0)
+        mastery = entry.get("corrects", 0) / attempts if attempts > 0 else initial
+    return mastery, last
+
+class JSONProgressStore:
+    """All progress in one JSON file. Writes re-read the file under a lock so concurrent sessions merge."""
+    def __init__(self, path="data/progress.json"):
+        self.path = path
+        self.lock_path = path + ".lock"
+        if not os.path.exists(path):
+            atomic_write_text(path, json.dumps({}))
+
+    def _read(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def load_all(self):
+        return self._read()
+
+    def load_student(self, student_id):
+        return self._read().get(student_id, {})
+
+    def load_entry(self, student_id, topic_id):
+        """One entry, None if missing."""
+        return self.load_student(student_id).get(topic_id)
+
+    def students(self):
+        return list(self._read().keys())
+
+    def upsert(self, student_id, topic_id, entry):
+        with file_lock(self.lock_path):
+            progress = self._read()
+            progress.setdefault(student_id, {})[topic_id] = dict(entry)
+            atomic_write_text(self.path, json.dumps(progress, indent=2))
+
+    def update_entry(self, student_id, topic_id, fn):
+        """Read-modify-write one entry atomically: stores and returns fn(current entry or a new one)."""
+        with file_lock(self.lock_path):
+            progress = self._read()
+            entry = fn(dict(progress.get(student_id, {}).get(topic_id) or new_entry()))
+            progress.setdefault(student_id, {})[topic_id] = dict(entry)
+            atomic_write_text(self.path, json.dumps(progress, indent=2))
+        return entry
+
+    def delete(self, student_id, topic_id):
+        with file_lock(self.lock_path):
+            progress = self._read()
+            if topic_id in progress.get(student_id, {}):
+                del progress[student_id][topic_id]
+                atomic_write_text(self.path, json.dumps(progress, indent=2))
+
+_UPSERT = (
+    "INSERT INTO progress (student_id, topic_id, attempts, corrects, last_review, mastery)"
+    " VALUES (?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (student_id, topic_id) DO UPDATE SET"
+    " attempts = excluded.attempts, corrects = excluded.corrects,"
+    " last_review = excluded.last_review, mastery = excluded.mastery")
+
+class SQLiteProgressStore:
+    """Progress rows in SQLite (WAL mode). One connection per thread."""
+    def __init__(self, path="data/progress.db", timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress ("
+            " student_id TEXT NOT NULL,"
+            " topic_id TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " corrects INTEGER NOT NULL DEFAULT 0,"
+            " last_review TEXT,"
+            " mastery REAL,"
+            " PRIMARY KEY (student_id, topic_id)"
+            ") WITHOUT ROWID"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _entry(row):
+        return dict(zip(ENTRY_FIELDS, row))
+
+    def load_all(self):
+        progress = {}
+        rows = self._conn().execute(
+            "SELECT student_id, topic_id, attempts, corrects, last_review, mastery FROM progress")
+        for row in rows:
+            progress.setdefault(row[0], {})[row[1]] = self._entry(row[2:])
+        return progress
+
+    def load_student(self, student_id):
+        rows = self._conn().execute(
+            "SELECT topic_id, attempts, corrects, last_review, mastery FROM progress WHERE student_id = ?",
+            (student_id,))
+        return {row[0]: self._entry(row[1:]) for row in rows}
+
+    def load_entry(self, student_id, topic_id):
+        """One entry, None if missing."""
+        row = self._conn().execute(
+            "SELECT attempts, corrects, last_review, mastery FROM progress WHERE student_id = ? AND topic_id = ?",
+            (student_id, topic_id)).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def students(self):
+        return [row[0] for row in self._conn().execute("SELECT DISTINCT student_id FROM progress")]
+
+    def upsert(self, student_id, topic_id, entry):
+        self.upsert_many([(student_id, topic_id, entry)])
+
+    @staticmethod
+    def _row(student_id, topic_id, e):
+        return (student_id, topic_id, e.get("attempts", 0), e.get("corrects", 0), e.get("last_review"),
+                e.get("mastery"))
+
+    def upsert_many(self, items):
+        """items: iterable of (student_id, topic_id, entry) written in one transaction."""
+        conn = self._conn()
+        with conn:
+            conn.executemany(_UPSERT, [self._row(sid, tid, e) for sid, tid, e in items])
+
+    def update_entry(self, student_id, topic_id, fn):
+        """
+        Read-modify-write one entry atomically: stores and returns fn(current entry or a new one).
+        BEGIN IMMEDIATE takes the write lock before the read, so concurrent updates serialize.
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            entry = fn(self.load_entry(student_id, topic_id) or new_entry())
+            conn.execute(_UPSERT, self._row(student_id, topic_id, entry))
+        return entry
+
+    def delete(self, student_id, topic_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM progress WHERE student_id = ? AND topic_id = ?", (student_id, topic_id))
+
+def open_progress_store(path):
+    """Pick the backend from the file extension: .db/.sqlite/.sqlite3 -> SQLite, anything else -> JSON."""
+    if os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3"):
+        return SQLiteProgressStore(path)
+    return JSONProgressStore(path)
+
+def migrate(src_path, dst_path):
+    """Copy every entry from one store to another (e.g. progress.json -> progress.db)."""
+    src = open_progress_store(src_path)
+    dst = open_progress_store(dst_path)
+    items = [(sid, tid, entry) for sid, topics in src.load_all().items() for tid, entry in topics.items()]
+    if hasattr(dst, "upsert_many"):
+        dst.upsert_many(items)
+    else:
+        for sid, tid, entry in items:
+            dst.upsert(sid, tid, entry)
+    return len(items)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Progress store tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mig = sub.add_parser("migrate", help="copy progress from one backend to another")
+    mig.add_argument("src", help="e.g. data/progress.json")
+    mig.add_argument("dst", help="e.g. data/progress.db")
+    args = parser.parse_args()
+    if args.command == "migrate":
+        n = migrate(args.src, args.dst)
+        print(f"Migrated {n} entries from {args.src} to {args.dst}")
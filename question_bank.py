@@ -0,0 +1,195 @@
+# question_bank.py
+"""
+subjects.json compiled into an indexed SQLite file (data/subjects.json -> data/subjects.db).
+
+- subjects / topics: small lookup tables, read into memory when the bank is opened
+- questions: one row per question keyed by (topic_id, idx), so question i of a topic
+  is a single primary-key lookup and question text is only read when asked for
+
+The compiled file records the size, mtime and SHA-256 of the subjects.json it came
+from; build() (and resources.get_question_index) rebuild it only when those changed:
+    python question_bank.py build --src data/subjects.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from utils.helpers import file_lock
+
+BANK_VERSION = 1
+
+def compiled_path(src_path):
+    """Compiled form of a question bank: data/subjects.json -> data/subjects.db."""
+    return os.path.splitext(src_path)[0] + ".db"
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _source_info(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _read_meta(conn):
+    return dict(conn.execute("SELECT key, value FROM meta"))
+
+def is_stale(src_path, path=None, meta=None):
+    """
+    True if the compiled bank is missing, from another format version, or built from
+    different contents. Size + mtime decide when they match; otherwise the hash does.
+    """
+    path = path or compiled_path(src_path)
+    if not os.path.exists(src_path):
+        return not os.path.exists(path)
+    if meta is None:
+        if not os.path.exists(path):
+            return True
+        try:
+            with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+                meta = _read_meta(conn)
+        except sqlite3.Error:
+            return True
+    if meta.get("version") != str(BANK_VERSION):
+        return True
+    info = _source_info(src_path)
+    if meta.get("size") == str(info["size"]) and meta.get("mtime_ns") == str(info["mtime_ns"]):
+        return False
+    return meta.get("sha256") != _file_sha256(src_path)
+
+def build(src_path="data/subjects.json", path=None, force=False):
+    """Compile src_path unless the output is up to date. Returns True if it was (re)built."""
+    path = path or compiled_path(src_path)
+    with file_lock(path + ".lock"):
+        if not force and not is_stale(src_path, path):
+            return False
+        with open(src_path, "rb") as f:
+            raw = f.read()
+        info = _source_info(src_path)
+        subjects = json.loads(raw)["subjects"]
+        tmp = f"{path}.tmp.{os.getpid()}"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.executescript(
+                "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);"
+                "CREATE TABLE subjects (position INTEGER PRIMARY KEY, subject_name TEXT UNIQUE NOT NULL,"
+                " data TEXT NOT NULL);"
+                "CREATE TABLE topics (topic_id TEXT PRIMARY KEY, subject_position INTEGER NOT NULL,"
+                " position INTEGER NOT NULL, title TEXT, n_questions INTEGER NOT NULL) WITHOUT ROWID;"
+                "CREATE TABLE questions (topic_id TEXT NOT NULL, idx INTEGER NOT NULL, data TEXT NOT NULL,"
+                " PRIMARY KEY (topic_id, idx)) WITHOUT ROWID;")
+            for s_pos, subject in enumerate(subjects):
+                # everything but the topics (slug and any other fields) is kept as JSON
+                extra = {k: v for k, v in subject.items() if k != "topics"}
+                conn.execute("INSERT INTO subjects VALUES (?, ?, ?)", (s_pos, subject["subject_name"], json.dumps(extra)))
+                for t_pos, topic in enumerate(subject["topics"]):
+                    questions = topic.get("questions", [])
+                    conn.execute("INSERT INTO topics VALUES (?, ?, ?, ?, ?)",
+                                 (topic["topic_id"], s_pos, t_pos, topic.get("title"), len(questions)))
+                    conn.executemany("INSERT INTO questions VALUES (?, ?, ?)",
+                                     [(topic["topic_id"], i, json.dumps(q)) for i, q in enumerate(questions)])
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("version", str(BANK_VERSION)),
+                ("source", os.path.abspath(src_path)),
+                ("size", str(info["size"])),
+                ("mtime_ns", str(info["mtime_ns"])),
+                ("sha256", hashlib.sha256(raw).hexdigest()),
+            ])
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, path)
+        return True
+
+class QuestionBank:
+    """
+    Read-only view of a compiled bank. Subjects and topic metadata are in memory
+    (dict lookups); question text is read per question. One connection per thread.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        self.meta = _read_meta(conn)
+        self.subject_names = []
+        self.subject_data = {}  # subject_name -> its fields other than topics (e.g. slug)
+        self._subject_topics = {}  # subject_name -> topic ids in file order
+        for position, name, data in conn.execute("SELECT position, subject_name, data FROM subjects ORDER BY position"):
+            self.subject_names.append(name)
+            self.subject_data[name] = json.loads(data)
+            self._subject_topics[name] = []
+        self._topics = {}  # topic_id -> {"subject", "title", "n_questions"}
+        self.topics_flat = []
+        rows = conn.execute("SELECT topic_id, subject_position, title, n_questions FROM topics"
+                            " ORDER BY subject_position, position")
+        for topic_id, s_pos, title, n in rows:
+            subject = self.subject_names[s_pos]
+            self._topics[topic_id] = {"subject": subject, "title": title, "n_questions": n}
+            self._subject_topics[subject].append(topic_id)
+            self.topics_flat.append(topic_id)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def is_stale(self, src_path):
+        stale = is_stale(src_path, self.path, meta=self.meta)
+        if not stale and os.path.exists(src_path):
+            # touched but unchanged: remember the new size / mtime so the hash is not redone
+            info = _source_info(src_path)
+            self.meta.update(size=str(info["size"]), mtime_ns=str(info["mtime_ns"]))
+        return stale
+
+    def subjects(self):
+        return list(self.subject_names)
+
+    def topic_ids(self, subject_name):
+        """Topic ids of a subject, in file order."""
+        return list(self._subject_topics[subject_name])
+
+    def topic(self, topic_id):
+        """{"subject", "title", "n_questions"} of a topic (no question text)."""
+        return self._topics[topic_id]
+
+    def n_questions(self, topic_id):
+        return self._topics[topic_id]["n_questions"]
+
+    def question(self, topic_id, i):
+        """Question i of a topic ({"q", "options", "answer", ...}); IndexError if out of range."""
+        row = self._conn().execute("SELECT data FROM questions WHERE topic_id = ? AND idx = ?",
+                                   (topic_id, i)).fetchone()
+        if row is None:
+            raise IndexError(f"{topic_id} has no question {i}")
+        return json.loads(row[0])
+
+    def questions(self, topic_id):
+        """All questions of a topic, in order."""
+        rows = self._conn().execute("SELECT data FROM questions WHERE topic_id = ? ORDER BY idx", (topic_id,))
+        return [json.loads(data) for (data,) in rows]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Question bank tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="compile subjects.json (skipped when the output is up to date)")
+    b.add_argument("--src", default="data/subjects.json")
+    b.add_argument("--out", default=None, help="default: next to --src with a .db extension")
+    b.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    if args.command == "build":
+        out = args.out or compiled_path(args.src)
+        if build(args.src, out, force=args.force):
+            bank = QuestionBank(out)
+            n = sum(bank.n_questions(t) for t in bank.topics_flat)
+            print(f"Built {out}: {len(bank.subject_names)} subjects, {len(bank.topics_flat)} topics, {n} questions")
+        else:
+            print(f"{out} is up to date")
@@ -0,0 +1,93 @@
+# recommendation_cache.py
+"""
+Per-student cache of ranked topic lists for Recommender.recommend.
+
+A student's ranking only changes when
+- the student's mastery changes (the cache listens to the mastery engine),
+- a new answer of theirs reaches the interaction log (e.g. from another process),
+- the model changes (entries remember which model ranked them), or
+- time moves a whole-day difference (`days_since` / `days_until`) to one of the
+  student's review times across a boundary: each entry expires at the first such instant.
+The ML feature hours_since_last_activity moves continuously; the cache treats it at
+the same day granularity (pass max_age_seconds to bound that). Mastery from an engine
+with mastery_as_of (DecayEMAMastery) moves continuously too: Recommender caps those
+entries at decay_cache_seconds.
+"""
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+class _Entry:
+    __slots__ = ("ranked", "topics", "model", "activity", "computed_at", "expires_at")
+
+    def __init__(self, ranked, topics, model, activity, computed_at, expires_at):
+        self.ranked = ranked
+        self.topics = topics
+        self.model = model
+        self.activity = activity
+        self.computed_at = computed_at
+        self.expires_at = expires_at
+
+class RecommendationCache:
+    """LRU of up to `max_students` full rankings, with hit / miss / eviction counters."""
+    def __init__(self, max_students=1024, max_age_seconds=None):
+        self.max_students = max_students
+        self.max_age = timedelta(seconds=max_age_seconds) if max_age_seconds else None
+        self._entries = OrderedDict()  # student_id -> _Entry, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def watch(self, engine):
+        """Invalidate a student whenever `engine` changes their state."""
+        if self.invalidate not in engine.listeners:
+            engine.listeners.append(self.invalidate)
+
+    def invalidate(self, student_id):
+        with self._lock:
+            if self._entries.pop(student_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after a model swap)."""
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, student_id, now, topics, model, activity):
+        """Cached ranking if still valid for this time, topic list, model and last activity; else None."""
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None and (
+                    entry.model is model and entry.activity == activity
+                    and (entry.topics is topics or entry.topics == topics)
+                    and entry.computed_at <= now
+                    and (entry.expires_at is None or now < entry.expires_at)
+                    and (self.max_age is None or now - entry.computed_at < self.max_age)):
+                self._entries.move_to_end(student_id)
+                self.hits += 1
+                return entry.ranked
+            if entry is not None:
+                del self._entries[student_id]
+            self.misses += 1
+            return None
+
+    def put(self, student_id, ranked, now, topics, model, activity, expires_at):
+        with self._lock:
+            self._entries[student_id] = _Entry(ranked, topics, model, activity, now, expires_at)
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_students:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
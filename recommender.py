@@ -1,73 +1,63 @@
 # recommender.py
 import pandas as pd
-from datetime import datetime
-import os
-import joblib
+from datetime import datetime, timedelta
 import numpy as np
 
 from mastery import EMAMastery, SM2Mastery
+from interaction_log import InteractionLog, log_files, read_log
+from resources import get_model
 
 MODEL_PATH = "models/rf_study_recommender.pkl"
+# longest a cached ranking is served for an engine whose mastery moves with time (mastery_as_of)
+DECAY_CACHE_SECONDS = 60
 
 class Recommender:
-    def __init__(self, topics, mastery_engine=None, recency_weight=0.5, data_csv="data/students.csv"):
+    def __init__(self, topics, mastery_engine=None, recency_weight=0.5, data_csv="data/students.csv", window=5,
+                 model=None, log=None, cache=None, decay_cache_seconds=DECAY_CACHE_SECONDS):
         """
         topics: list of topic ids (e.g., ["topic_1", ...])
-        mastery_engine: instance of EMAMastery or SM2Mastery
+        mastery_engine: instance of EMAMastery or SM2Mastery (or their compact_mastery variants, e.g. DecayEMAMastery)
         recency_weight: how much recency (older reviews -> higher urgency)
         data_csv: path to interaction logs (used to build ML features)
+        window: number of recent attempts per topic used by the ML features
+        model: trained model to use; by default the (cached) model at MODEL_PATH, if any
+        log: shared InteractionLog (see resources.get_interaction_log); by default data_csv is read
+        cache: RecommendationCache kept across requests (see recommendation_cache.py); None = no caching
+        decay_cache_seconds: max age of a cached ranking when the engine's mastery decays with time
+            (it has mastery_as_of, e.g. DecayEMAMastery); 0 = don't serve those from the cache
         """
         self.topics = topics
         self.mastery = mastery_engine
         self.recency_weight = recency_weight
         self.data_csv = data_csv
-        self.model = None
-        if os.path.exists(MODEL_PATH):
-            try:
-                self.model = joblib.load(MODEL_PATH)
-                # model loaded
-            except Exception as e:
-                print("Warning: failed to load model:", e)
-                self.model = None
-
-        # preload dataset if exists
-        if os.path.exists(self.data_csv):
-            self.df = pd.read_csv(self.data_csv)
-            if 'timestamp' in self.df.columns:
-                self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
-        else:
-            self.df = pd.DataFrame(columns=['student_id','topic_id','timestamp','correct'])
+        self.model = model if model is not None else get_model(MODEL_PATH)
+        # interaction log with running per-(student, topic) features, so scoring never rescans it
+        self.log = log if log is not None else InteractionLog(data_csv, window=window)
+        self.features = self.log.features
+        self.window = self.features.window
+        self.cache = cache
+        self.decay_cache_seconds = decay_cache_seconds
+        if cache is not None and hasattr(mastery_engine, "listeners"):
+            cache.watch(mastery_engine)
+
+    @property
+    def df(self):
+        return self.log.df
 
     # ---------- Feature builder used by train_ml.py; reused here ----------
-    def _build_student_topic_features(self, student_id, topic_id, window=5):
+    def _build_student_topic_features(self, student_id, topic_id, now=None):
         """
-        Build the same features the ML model expects:
+        Build the same features the ML model expects (served by the feature store):
         - total_attempts_on_topic
         - accuracy_on_topic
         - recent_corrects_on_topic (last `window` attempts on that topic)
         - hours_since_last_activity (for the student overall; large number if none)
         """
-        df = self.df
-        student_df = df[df['student_id'] == student_id].sort_values('timestamp')
-        topic_df = student_df[student_df['topic_id'] == topic_id]
-        total = int(topic_df.shape[0])
-        corrects = int(topic_df['correct'].sum()) if total > 0 else 0
-        acc = corrects / total if total > 0 else 0.5
-        # recent corrects for last `window` attempts on that topic
-        last_k = topic_df.tail(window)
-        rec_corrects = int(last_k['correct'].sum()) if not last_k.empty else 0
-        # hours since last activity of the student
-        if not student_df.empty:
-            last_time = student_df['timestamp'].max()
-            hours_since = (datetime.utcnow() - pd.to_datetime(last_time)).total_seconds() / 3600.0
-        else:
-            hours_since = 9999.0
-        return {
-            "total_attempts_on_topic": total,
-            "accuracy_on_topic": acc,
-            "recent_corrects_on_topic": rec_corrects,
-            "hours_since_last_activity": hours_since
-        }
+        return self.features.features(student_id, topic_id, now)
+
+    def log_interaction(self, student_id, topic_id, correct, timestamp=None):
+        """Keep the ML features current after an answer is logged (O(1))."""
+        self.features.update(student_id, topic_id, correct, timestamp or datetime.utcnow())
 
     def ml_score(self, student_id, topic_id):
         """Return priority score based on ML model: higher => higher priority.
@@ -95,58 +85,152 @@ class Recommender:
         - If ML model present, use ML score (1 - p_correct) scaled by recency factor.
         - Else fallback to mastery engine logic (EMA or SM2).
         """
+        return float(self.score_topics(student_id, [topic_id], now)[0])
+
+    # ---------- Batch scoring (one pass per student instead of one per topic) ----------
+    def _build_features_batch(self, student_id, topics, now=None):
+        """
+        Same features as `_build_student_topic_features`, for every topic at once.
+        Returns an array of shape (len(topics), 4).
+        """
+        return self.features.features_matrix(student_id, topics, now)
+
+    def ml_scores(self, student_id, topics, now=None):
+        """Vectorized `ml_score`: one predict_proba call for all topics. None if no model."""
+        if self.model is None:
+            return None
+        X = self._build_features_batch(student_id, topics, now)
+        try:
+            p = self.model.predict_proba(X)[:, 1]
+        except Exception:
+            p = np.asarray(self.model.predict(X), dtype=float)
+        return 1.0 - p
+
+    def _last_times(self, student_id, topics):
+        """Last review time per topic (next review for SM2), None where unknown."""
+        if isinstance(self.mastery, EMAMastery):
+            if hasattr(self.mastery, "get_last_review_many"):
+                return self.mastery.get_last_review_many(student_id, topics)
+            return [self.mastery.get_last_review(student_id, t) for t in topics]
+        if isinstance(self.mastery, SM2Mastery):
+            if hasattr(self.mastery, "get_next_review_many"):
+                return self.mastery.get_next_review_many(student_id, topics)
+            return [self.mastery.get_next_review(student_id, t) for t in topics]
+        # fallback: use the logged interactions
+        return [self.features.last_time(student_id, t) for t in topics]
+
+    @staticmethod
+    def _days_since(now, times):
+        """Whole days from each time to `now` (like timedelta.days); 999 where missing."""
+        if isinstance(times, np.ndarray) and times.dtype.kind == 'M':
+            stamps = pd.DatetimeIndex(times)
+            return np.where(stamps.isna(), 999.0, (pd.Timestamp(now) - stamps).days.to_numpy(dtype=float))
+        days = np.full(len(times), 999.0)
+        known = [i for i, t in enumerate(times) if t is not None and not pd.isna(t)]
+        if known:
+            stamps = pd.to_datetime([times[i] for i in known])
+            days[known] = (pd.Timestamp(now) - stamps).days.to_numpy(dtype=float)
+        return days
+
+    @staticmethod
+    def _due_penalty(now, next_revs):
+        """1 where due (or never reviewed), else 1 - days_until / 30 floored at 0."""
+        if isinstance(next_revs, np.ndarray) and next_revs.dtype.kind == 'M':
+            stamps = pd.DatetimeIndex(next_revs)
+            now = pd.Timestamp(now)
+            days_until = (stamps - now).days.to_numpy(dtype=float)
+            return np.where(stamps.isna() | (stamps <= now), 1.0, np.maximum(0.0, 1 - days_until / 30.0))
+        due_penalty = np.ones(len(next_revs))
+        for i, next_rev in enumerate(next_revs):
+            if next_rev and next_rev > now:
+                days_until = (next_rev - now).days
+                due_penalty[i] = max(0.0, 1 - days_until / 30.0)
+        return due_penalty
+
+    def score_topics(self, student_id, topics, now=None):
+        """Scores for a list of topics as a NumPy array (same values as `score_topic`)."""
         now = now or datetime.utcnow()
-        ml = self.ml_score(student_id, topic_id)
+        topics = list(topics)
+        ml = self.ml_scores(student_id, topics, now)
         if ml is not None:
             # apply recency scaling: older last review => multiply slightly
-            # get student last review time for this topic
-            last = None
-            if isinstance(self.mastery, EMAMastery):
-                last = self.mastery.last_review.get(f"{student_id}||{topic_id}")
-            elif isinstance(self.mastery, SM2Mastery):
-                last = self.mastery.get_next_review(student_id, topic_id)
-            else:
-                # fallback: use df
-                sub = self.df[(self.df['student_id']==student_id)&(self.df['topic_id']==topic_id)]
-                if not sub.empty:
-                    last = sub['timestamp'].max()
-            if last is not None:
-                days_since = (now - pd.to_datetime(last)).days if last is not None else 999
-            else:
-                days_since = 999
-            rec_factor = 1 + self.recency_weight * min(days_since / 30.0, 2.0)
+            days_since = self._days_since(now, self._last_times(student_id, topics))
+            rec_factor = 1 + self.recency_weight * np.minimum(days_since / 30.0, 2.0)
             return ml * rec_factor
         # no ML -> fallback
+        if hasattr(self.mastery, "mastery_as_of"):
+            # forgetting is already in the decayed mastery, so no recency factor on top
+            return 1 - self.mastery.mastery_as_of(student_id, topics, now)
         if isinstance(self.mastery, EMAMastery):
-            m = self.mastery.get_mastery(student_id, topic_id)
-            last = self.mastery.last_review.get(f"{student_id}||{topic_id}")
-            days_since = (now - last).days if last else 999
-            rec_factor = 1 + self.recency_weight * min(days_since / 30.0, 2.0)
-            score = (1 - m) * rec_factor
-            return score
+            m = self.mastery.get_mastery_many(student_id, topics)
+            days_since = self._days_since(now, self._last_times(student_id, topics))
+            rec_factor = 1 + self.recency_weight * np.minimum(days_since / 30.0, 2.0)
+            return (1 - m) * rec_factor
+        # SM2 style
+        m = self.mastery.get_mastery_many(student_id, topics)
+        due_penalty = self._due_penalty(now, self._last_times(student_id, topics))
+        return (1 - m) * (1 + self.recency_weight * due_penalty)
+
+    def due_topics(self, student_id, n=None, now=None):
+        """SM2 only: topics due for review now, most overdue first (from the engine's due index)."""
+        return self.mastery.due_topics(student_id, now=now, limit=n)
+
+    @staticmethod
+    def _next_day_boundary(now, times):
+        """First instant after `now` at which the whole days between `now` and any of `times` change."""
+        if isinstance(times, np.ndarray) and times.dtype.kind == 'M':
+            stamps = times.astype("datetime64[us]")
         else:
-            # SM2 style
-            m = self.mastery.get_mastery_score_estimate(student_id, topic_id)
-            next_rev = self.mastery.get_next_review(student_id, topic_id)
-            if next_rev and next_rev > now:
-                days_until = (next_rev - now).days
-                due_penalty = max(0.0, 1 - days_until / 30.0)
-                score = (1 - m) * (1 + self.recency_weight * due_penalty)
-            else:
-                score = (1 - m) * (1 + self.recency_weight)
-            return score
+            stamps = np.array([pd.Timestamp(t).to_datetime64() for t in times if t is not None and not pd.isna(t)],
+                              dtype="datetime64[us]")
+        stamps = stamps[~np.isnat(stamps)]
+        if len(stamps) == 0:
+            return None
+        day = np.timedelta64(1, "D").astype("timedelta64[us]")
+        now64 = np.datetime64(now, "us")
+        boundaries = stamps + ((now64 - stamps) // day + 1) * day
+        return boundaries.min().astype(datetime)
 
     def recommend(self, student_id, n=1, now=None):
         now = now or datetime.utcnow()
-        scores = []
-        for t in self.topics:
-            scores.append((t, self.score_topic(student_id, t, now)))
-        scores.sort(key=lambda x: x[1], reverse=True)
-        return [t for t,_ in scores[:n]]
+        if self.cache is None:
+            scores = self.score_topics(student_id, self.topics, now)
+            return [self.topics[i] for i in top_n_indices(scores, n)]
+        # cached full ranking, valid until the student's state, the model or a day boundary changes
+        # (and for at most decay_cache_seconds with a decaying engine)
+        activity = self.features.last_activity.get(student_id)
+        ranked = self.cache.get(student_id, now, self.topics, self.model, activity)
+        if ranked is None:
+            scores = self.score_topics(student_id, self.topics, now)
+            ranked = [self.topics[i] for i in top_n_indices(scores, len(scores))]
+            expires_at = self._next_day_boundary(now, self._last_times(student_id, self.topics))
+            if hasattr(self.mastery, "mastery_as_of"):
+                # decayed mastery changes continuously, not just at day boundaries
+                max_age = now + timedelta(seconds=self.decay_cache_seconds)
+                expires_at = max_age if expires_at is None else min(expires_at, max_age)
+            self.cache.put(student_id, ranked, now, self.topics, self.model, activity, expires_at)
+        return ranked[:max(n, 0)]
+
+def top_n_indices(scores, n):
+    """
+    Indices of the `n` highest scores in descending order, ties broken by position
+    (same order as a stable descending sort), using a partial sort.
+    """
+    scores = np.asarray(scores, dtype=float)
+    k = len(scores)
+    if n <= 0 or k == 0:
+        return []
+    if n < k:
+        kth = scores[np.argpartition(scores, k - n)[k - n]]
+        cand = np.flatnonzero(scores >= kth)
+    else:
+        cand = np.arange(k)
+    order = np.lexsort((cand, -scores[cand]))
+    return cand[order[:n]].tolist()
 
 # utility to extract topics from csv if needed
 def extract_topics_from_csv(csv_path="data/students.csv"):
-    if not os.path.exists(csv_path):
+    if not log_files(csv_path):
         return []
-    df = pd.read_csv(csv_path)
+    df = read_log(csv_path)
     return sorted(df['topic_id'].unique().tolist())
@@ -0,0 +1,152 @@
+# resources.py
+"""
+Process-wide caches for the expensive things every request needs: the trained model,
+the question bank, the interaction log and the progress store. Entries are keyed by path and reloaded
+only when the file's mtime/size changes, so Streamlit reruns (and every thread
+serving a session) share one copy.
+"""
+import json
+import os
+import threading
+import joblib
+
+import question_bank
+from compiled_forest import compiled_path, load_forest
+from interaction_log import InteractionLog
+from online_learning import ONLINE_MODEL_PATH, OnlineTrainer
+from progress_store import open_progress_store
+from shared_mastery import SharedEMAMastery
+
+_cache = {}  # key: (kind, path) -> (file signature, value)
+_lock = threading.Lock()
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _cached(kind, path, loader):
+    sig = _signature(path)
+    with _lock:
+        hit = _cache.get((kind, path))
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        value = loader(path) if sig is not None else None
+        _cache[(kind, path)] = (sig, value)
+        return value
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+def _load_model(path):
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        print("Warning: failed to load model:", e)
+        return None
+
+def get_model(path="models/rf_study_recommender.pkl", compiled=True):
+    """
+    Trained model, or None if there is none (or it fails to load). With compiled=True
+    the compiled forest next to the pickle (see compiled_forest.py) is used instead
+    when it is at least as new as the pickle.
+    """
+    if compiled:
+        meta = os.path.join(compiled_path(path), "meta.json")
+        sig, pkl_sig = _signature(meta), _signature(path)
+        if sig is not None and (pkl_sig is None or sig[0] >= pkl_sig[0]):
+            forest = _cached("compiled_model", meta, lambda p: load_forest(os.path.dirname(p)))
+            if forest is not None:
+                return forest
+    return _cached("model", path, _load_model)
+
+def _load_question_bank(path):
+    with open(path, "r", encoding="utf-8") as f:
+        subjects = json.load(f)["subjects"]
+    topics_flat = []
+    topic_meta = {}  # topic_id -> metadata
+    for s in subjects:
+        for t in s["topics"]:
+            topics_flat.append(t["topic_id"])
+            topic_meta[t["topic_id"]] = {
+                "subject": s["subject_name"],
+                "title": t["title"],
+                "questions": t["questions"]
+            }
+    return {
+        "subjects": subjects,
+        "subject_map": {s["subject_name"]: s for s in subjects},
+        "topics_flat": topics_flat,
+        "topic_meta": topic_meta,
+    }
+
+def get_question_bank(path="data/subjects.json"):
+    """subjects.json plus the flattened topic list and topic metadata; None if missing."""
+    return _cached("question_bank", path, _load_question_bank)
+
+def get_question_index(src="data/subjects.json", path=None):
+    """
+    Compiled question bank (question_bank.QuestionBank) for `src`, rebuilt first when
+    subjects.json changed since it was compiled. None if neither file exists.
+    """
+    path = path or question_bank.compiled_path(src)
+    bank = _cached("question_index", path, question_bank.QuestionBank)
+    if bank is None or bank.is_stale(src):
+        if not os.path.exists(src):
+            return bank
+        question_bank.build(src, path)
+        bank = _cached("question_index", path, question_bank.QuestionBank)
+    return bank
+
+def get_interaction_log(path="data/students.csv", window=5, batch_size=1, flush_interval=None, rotate=False):
+    """
+    Shared InteractionLog for `path`. It is not reloaded on mtime changes: answers
+    logged through it are appended in memory, and rows written by other processes
+    are read incrementally by refresh(). batch_size / flush_interval / rotate
+    configure its LogWriter (see interaction_log.py).
+    """
+    with _lock:
+        hit = _cache.get(("log", path))
+        if hit is None or hit[1].window != window:
+            if hit is not None:
+                hit[1].flush()
+            hit = (None, InteractionLog(path, window=window, batch_size=batch_size,
+                                        flush_interval=flush_interval, rotate=rotate))
+            _cache[("log", path)] = hit
+    log = hit[1]
+    log.refresh()
+    return log
+
+def get_online_trainer(checkpoint_path=ONLINE_MODEL_PATH):
+    """Shared OnlineTrainer for `checkpoint_path` (one background worker per process, started on demand)."""
+    with _lock:
+        hit = _cache.get(("online", checkpoint_path))
+        if hit is None:
+            hit = (None, OnlineTrainer(checkpoint_path))
+            _cache[("online", checkpoint_path)] = hit
+    return hit[1]
+
+def get_progress_store(path="data/progress.json"):
+    """
+    Process-wide progress store for `path` (see progress_store.open_progress_store), so
+    reruns reuse its per-thread SQLite connections instead of reopening and re-creating the table.
+    """
+    with _lock:
+        hit = _cache.get(("progress", path))
+        if hit is None:
+            hit = (None, open_progress_store(path))
+            _cache[("progress", path)] = hit
+    return hit[1]
+
+def get_shared_mastery(progress_path="data/progress.db", alpha=0.3):
+    """Process-wide SharedEMAMastery over the SQLite progress store at `progress_path`."""
+    store = get_progress_store(progress_path)
+    with _lock:
+        hit = _cache.get(("shared_mastery", progress_path))
+        if hit is None or hit[1].alpha != alpha:
+            hit = (None, SharedEMAMastery(store, alpha=alpha))
+            _cache[("shared_mastery", progress_path)] = hit
+    return hit[1]
@@ -0,0 +1,324 @@
+# service.py
+"""
+HTTP API around the recommender and the EMA mastery engine (stdlib only).
+
+    POST /answer           {"student_id", "topic_id", "correct", "timestamp"?} -> updated progress entry
+    GET  /mastery          ?student_id=...[&topic_id=...] -> {"mastery": {topic_id: value}}
+    GET  /recommend        ?student_id=...[&n=3][&now=ISO] -> {"topics": [...]}
+    POST /recommend/bulk   {"student_ids": [...], "n"?, "now"?} -> {"results": {student_id: [...]}}
+    GET  /topics, /health, /metrics (Prometheus text; per worker, see instrumentation.py)
+
+The listening socket is opened once and `--workers` processes are forked to
+accept on it, each a ThreadingHTTPServer. Workers share state through the
+progress store and the interaction log: answers are read-modify-written with
+the store's update_entry (use a .db store with several workers), each request
+reloads the student's entries into the worker's engine, and log rows written by
+other workers are picked up by InteractionLog.refresh().
+
+    python service.py --port 8000 --workers 4 --progress data/progress.db
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --duration 10
+"""
+import argparse
+import json
+import os
+import signal
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import instrumentation
+from mastery import EMAMastery
+from progress_store import entry_state, open_progress_store
+from recommendation_cache import RecommendationCache
+from recommender import MODEL_PATH, Recommender, extract_topics_from_csv
+from resources import get_interaction_log, get_model, get_question_bank
+
+MAX_BULK = 1000
+
+class BadRequest(Exception):
+    pass
+
+def _parse_int(value, name, minimum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be an integer")
+    if minimum is not None and value < minimum:
+        raise BadRequest(f"{name} must be at least {minimum}")
+    return value
+
+def _parse_time(value):
+    """ISO timestamp -> naive UTC datetime (the log and the engines compare naive times)."""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"bad timestamp: {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _parse_correct(value):
+    """true / false or 1 / 0 -> 1 / 0; anything else (e.g. the string "false") is rejected."""
+    if isinstance(value, bool) or value in (0, 1):
+        return int(value)
+    raise BadRequest("correct must be true / false or 1 / 0")
+
+class StudyService:
+    """Per-worker state: mastery engine, recommender and its cache, over the shared store and log."""
+    def __init__(self, progress_path="data/progress.json", log_csv="data/students.csv",
+                 subjects_path="data/subjects.json", model_path=MODEL_PATH, alpha=0.3,
+                 log_batch_size=32, log_flush_seconds=2.0):
+        self.store = open_progress_store(progress_path)
+        self.model_path = model_path
+        bank = get_question_bank(subjects_path)
+        self.topics = bank["topics_flat"] if bank is not None else extract_topics_from_csv(log_csv)
+        self._topic_set = set(self.topics)
+        self.engine = EMAMastery(alpha=alpha)
+        self.log = get_interaction_log(log_csv, batch_size=log_batch_size, flush_interval=log_flush_seconds)
+        self.recommender = Recommender(self.topics, mastery_engine=self.engine, data_csv=log_csv, log=self.log,
+                                       model=get_model(model_path), cache=RecommendationCache(max_students=4096))
+        self._known = {}  # student_id -> topic ids loaded into the engine
+        # serializes writes to the engine, _known and the log; reads and scoring run concurrently
+        self._lock = threading.Lock()
+
+    def _sync_student(self, student_id):
+        """Load the student's stored entries into the engine (other workers may have written since)."""
+        entries = self.store.load_student(student_id)
+        with self._lock:
+            known = self._known.setdefault(student_id, set())
+            for topic_id in known - entries.keys():
+                self.engine.reset(student_id, topic_id)
+            for topic_id, entry in entries.items():
+                state = entry_state(entry, self.engine.initial)
+                # only real changes, so the recommendation cache keeps its entry otherwise
+                if (topic_id not in known or state != (self.engine.get_mastery(student_id, topic_id),
+                                                       self.engine.get_last_review(student_id, topic_id))):
+                    self.engine.set_state(student_id, topic_id, *state)
+            known.clear()
+            known.update(entries)
+
+    def answer(self, student_id, topic_id, correct, timestamp=None):
+        # validated before anything is stored or logged
+        if topic_id not in self._topic_set:
+            raise BadRequest(f"unknown topic_id {topic_id!r}")
+        correct = _parse_correct(correct)
+        if timestamp is not None and timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        timestamp = timestamp or datetime.utcnow()
+
+        def apply(entry):
+            scratch = EMAMastery(alpha=self.engine.alpha, initial=self.engine.initial)
+            scratch.set_state(student_id, topic_id, *entry_state(entry, self.engine.initial))
+            scratch.update(student_id, topic_id, correct, timestamp=timestamp)
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            entry["corrects"] = entry.get("corrects", 0) + correct
+            entry["last_review"] = timestamp.isoformat()
+            entry["mastery"] = scratch.get_mastery(student_id, topic_id)
+            return entry
+
+        entry = self.store.update_entry(student_id, topic_id, apply)
+        with self._lock:
+            self.log.append(student_id, topic_id, correct, timestamp=timestamp)
+        self._sync_student(student_id)
+        return entry
+
+    def mastery(self, student_id, topic_id=None):
+        self._sync_student(student_id)
+        topics = [topic_id] if topic_id else self.topics
+        return {t: float(self.engine.get_mastery(student_id, t)) for t in topics}
+
+    def recommend_many(self, student_ids, n=3, now=None):
+        with self._lock:
+            self.log.refresh()  # rows other workers appended
+        self.recommender.model = get_model(self.model_path)  # reloaded when retrained
+        results = {}
+        for student_id in student_ids:
+            self._sync_student(student_id)
+            results[student_id] = self.recommender.recommend(student_id, n=n, now=now)
+        return results
+
+    def close(self):
+        self.log.flush()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    server_version = "StudyPlanner/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise BadRequest("body is not valid JSON")
+        if not isinstance(body, dict):
+            raise BadRequest("body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _required(params, name):
+        value = params.get(name)
+        if value in (None, ""):
+            raise BadRequest(f"missing {name}")
+        return value
+
+    def _dispatch(self, routes):
+        url = urlsplit(self.path)
+        route = routes.get(url.path.rstrip("/") or "/")
+        if route is None:
+            self._send(404, {"error": f"no route {self.command} {url.path}"})
+            return
+        try:
+            with instrumentation.timed(f"http.{route.__name__}"):
+                route(self, {k: v[-1] for k, v in parse_qs(url.query).items()})
+        except BadRequest as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            print("Error handling", self.command, self.path, "-", repr(e))
+            self._send(500, {"error": "internal error"})
+
+    # ---------- GET ----------
+    def get_health(self, params):
+        self._send(200, {"status": "ok", "pid": os.getpid(), "topics": len(self.server.service.topics)})
+
+    def get_topics(self, params):
+        self._send(200, {"topics": self.server.service.topics})
+
+    def get_mastery(self, params):
+        sid = self._required(params, "student_id")
+        self._send(200, {"student_id": sid, "mastery": self.server.service.mastery(sid, params.get("topic_id"))})
+
+    def get_recommend(self, params):
+        sid = self._required(params, "student_id")
+        n = _parse_int(params.get("n", 3), "n", minimum=1)
+        topics = self.server.service.recommend_many([sid], n, _parse_time(params.get("now")))[sid]
+        self._send(200, {"student_id": sid, "topics": topics})
+
+    def get_metrics(self, params):
+        self._send(200, instrumentation.prometheus_text(), "text/plain; version=0.0.4")
+
+    # ---------- POST ----------
+    def post_answer(self, params):
+        body = self._json_body()
+        sid = self._required(body, "student_id")
+        tid = self._required(body, "topic_id")
+        if "correct" not in body:
+            raise BadRequest("missing correct")
+        entry = self.server.service.answer(sid, tid, body["correct"], _parse_time(body.get("timestamp")))
+        self._send(200, {"student_id": sid, "topic_id": tid, "entry": entry})
+
+    def post_recommend_bulk(self, params):
+        body = self._json_body()
+        sids = body.get("student_ids")
+        if not isinstance(sids, list) or not sids:
+            raise BadRequest("student_ids must be a non-empty list")
+        if len(sids) > MAX_BULK:
+            raise BadRequest(f"at most {MAX_BULK} students per request")
+        results = self.server.service.recommend_many([str(s) for s in sids], _parse_int(body.get("n", 3), "n", minimum=1),
+                                                     _parse_time(body.get("now")))
+        self._send(200, {"results": results})
+
+    GET_ROUTES = {"/health": get_health, "/topics": get_topics, "/mastery": get_mastery,
+                  "/recommend": get_recommend, "/metrics": get_metrics}
+    POST_ROUTES = {"/answer": post_answer, "/recommend/bulk": post_recommend_bulk}
+
+    def do_GET(self):
+        self._dispatch(self.GET_ROUTES)
+
+    def do_POST(self):
+        self._dispatch(self.POST_ROUTES)
+
+class StudyServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    service = None
+
+def _run_worker(server, config):
+    """Serve until SIGTERM / SIGINT, then flush the log."""
+    server.service = StudyService(**config)
+    stop = lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.service.close()
+
+def serve(host="127.0.0.1", port=8000, workers=1, **config):
+    """Bind once, then run `workers` forked processes on the socket (restarting any that die)."""
+    server = StudyServer((host, port), Handler)
+    print(f"Serving on http://{host}:{server.server_address[1]} with {workers} worker(s)")
+    if workers <= 1 or not hasattr(os, "fork"):
+        _run_worker(server, config)
+        return
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(server, config)
+            except BaseException as e:
+                print("Worker failed:", repr(e))
+                code = 1
+            finally:
+                os._exit(code)
+        return pid
+
+    children = {spawn() for _ in range(workers)}
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited (status {status}); starting a new one")
+            children.add(spawn())
+    server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Study planner HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--progress", default=os.environ.get("PROGRESS_STORE", "data/progress.db"),
+                        help=".db/.sqlite (recommended with several workers) or .json")
+    parser.add_argument("--log", default="data/students.csv")
+    parser.add_argument("--subjects", default="data/subjects.json")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--log-batch-size", type=int, default=32)
+    parser.add_argument("--log-flush-seconds", type=float, default=2.0)
+    parser.add_argument("--metrics", action="store_true", help="record stage latencies for /metrics")
+    args = parser.parse_args()
+    if args.metrics:
+        instrumentation.enable()
+    serve(args.host, args.port, args.workers, progress_path=args.progress, log_csv=args.log,
+          subjects_path=args.subjects, model_path=args.model, log_batch_size=args.log_batch_size,
+          log_flush_seconds=args.log_flush_seconds)
@@ -0,0 +1,98 @@
+# shared_mastery.py
+"""
+EMA mastery shared by every session and server process on a host.
+
+SharedEMAMastery keeps no state of its own: each (student, topic) mastery is the
+`mastery` / `last_review` of the student's row in the SQLite progress store (WAL, so
+reads never block). Updates are the store's update_entry (a BEGIN IMMEDIATE
+read-modify-write, so they also serialize with service.py and any other writer of the
+same progress.db), taken under the student's stripe of a StripedLock (utils/helpers.py):
+a student's answers queue on their stripe instead of all piling onto SQLite's write
+lock, which each update then holds only for one short transaction.
+The entries it writes are the ones app.py and service.py write (attempts, corrects,
+last_review, mastery), so it works on an existing progress.db.
+
+    engine = SharedEMAMastery("data/progress.db")
+    python benchmarks/stress_shared_mastery.py --writers 4 --threads 4
+"""
+import numpy as np
+
+from mastery import EMAMastery
+from progress_store import SQLiteProgressStore, entry_state
+from utils.helpers import StripedLock
+
+def _iso(timestamp):
+    if timestamp is None or isinstance(timestamp, str):
+        return timestamp
+    return timestamp.isoformat()
+
+class SharedEMAMastery(EMAMastery):
+    """
+    EMAMastery over a SQLiteProgressStore (or its path). Listeners only hear about
+    updates made through this instance; other processes' updates are seen on the next read.
+    """
+    def __init__(self, store="data/progress.db", alpha=0.3, initial=0.2, stripes=64):
+        self.alpha = alpha
+        self.initial = initial
+        self.listeners = []
+        self.store = SQLiteProgressStore(store) if isinstance(store, str) else store
+        self.locks = StripedLock(self.store.path + ".locks", stripes)
+
+    def _state(self, student_id, topic_id):
+        entry = self.store.load_entry(student_id, topic_id)
+        return entry_state(entry, self.initial) if entry is not None else (self.initial, None)
+
+    def _notify(self, student_id):
+        for fn in self.listeners:
+            fn(student_id)
+
+    def get_mastery(self, student_id, topic_id):
+        return self._state(student_id, topic_id)[0]
+
+    def get_last_review(self, student_id, topic_id):
+        return self._state(student_id, topic_id)[1]
+
+    def get_mastery_many(self, student_id, topic_ids):
+        """One query for the student, as a NumPy array."""
+        entries = self.store.load_student(student_id)
+        return np.array([entry_state(entries[t], self.initial)[0] if t in entries else self.initial
+                         for t in topic_ids], dtype=float)
+
+    def get_last_review_many(self, student_id, topic_ids):
+        """datetime64[us] array, NaT where never reviewed."""
+        entries = self.store.load_student(student_id)
+        return np.array([entry_state(entries[t])[1] if t in entries else None for t in topic_ids],
+                        dtype="datetime64[us]")
+
+    def set_state(self, student_id, topic_id, mastery, last_review=None):
+        def apply(entry):
+            entry["mastery"] = mastery
+            if last_review is not None:
+                entry["last_review"] = _iso(last_review)
+            return entry
+
+        with self.locks.hold(student_id):
+            self.store.update_entry(student_id, topic_id, apply)
+        self._notify(student_id)
+
+    def reset(self, student_id, topic_id):
+        with self.locks.hold(student_id):
+            self.store.delete(student_id, topic_id)
+        self._notify(student_id)
+
+    def update(self, student_id, topic_id, correct, timestamp=None):
+        """Apply one answer; returns the stored entry (attempts / corrects are counted too)."""
+        correct = 1 if correct else 0
+
+        def apply(entry):
+            prev = entry_state(entry, self.initial)[0]
+            entry["attempts"] = (entry.get("attempts") or 0) + 1
+            entry["corrects"] = (entry.get("corrects") or 0) + correct
+            entry["last_review"] = _iso(timestamp)
+            entry["mastery"] = self.alpha * correct + (1 - self.alpha) * prev
+            return entry
+
+        with self.locks.hold(student_id):
+            entry = self.store.update_entry(student_id, topic_id, apply)
+        self._notify(student_id)
+        return entry
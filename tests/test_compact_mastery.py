@@ -0,0 +1,16 @@
+# tests/test_compact_mastery.py
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from compact_mastery import CompactEMAMastery, to_datetime64
+
+def test_aware_timestamps_become_naive_utc():
+    aware = datetime(2025, 1, 1, 10, tzinfo=timezone(timedelta(hours=5)))
+    assert to_datetime64(aware) == np.datetime64("2025-01-01T05:00:00", "us")
+    assert to_datetime64(datetime(2025, 1, 1, 10)) == np.datetime64("2025-01-01T10:00:00", "us")
+
+def test_update_stores_aware_times_in_utc():
+    engine = CompactEMAMastery()
+    engine.update("s1", "t1", 1, datetime(2025, 1, 1, 10, tzinfo=timezone(timedelta(hours=5))))
+    assert engine.get_last_review("s1", "t1") == datetime(2025, 1, 1, 5)
@@ -0,0 +1,40 @@
+# tests/test_feature_store.py
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from feature_store import FeatureStore
+from recommender import Recommender
+
+T0 = datetime(2025, 3, 1, 12, 0)
+
+class _Log:
+    """Just the parts of InteractionLog a Recommender reads."""
+    def __init__(self, features):
+        self.features = features
+        self.df = None
+
+class _RecordingModel:
+    def __init__(self):
+        self.X = None
+
+    def predict_proba(self, X):
+        self.X = np.array(X)
+        return np.column_stack([1 - X[:, 1], X[:, 1]])
+
+def test_hours_since_last_activity_counts_to_now():
+    store = FeatureStore()
+    store.update("s1", "t1", 1, T0)
+    X = store.features_matrix("s1", ["t1", "t2"], now=T0 + timedelta(hours=30))
+    assert X[:, 3].tolist() == [30.0, 30.0]
+    assert store.features_matrix("nobody", ["t1"], now=T0)[0, 3] == 9999.0
+
+def test_recommend_uses_its_now_for_ml_features():
+    # the ML features are taken at the `now` passed to recommend, not at the wall clock,
+    # so a ranking for a given time does not depend on when it is computed
+    store = FeatureStore()
+    store.update("s1", "t1", 1, T0)
+    model = _RecordingModel()
+    rec = Recommender(["t1", "t2"], model=model, log=_Log(store))
+    rec.recommend("s1", n=2, now=T0 + timedelta(hours=5))
+    assert model.X[:, 3].tolist() == [5.0, 5.0]
@@ -0,0 +1,36 @@
+# tests/test_instrumentation.py
+import threading
+from datetime import datetime
+
+import pytest
+
+import instrumentation
+from compact_mastery import CompactEMAMastery, DecayEMAMastery
+
+@pytest.fixture
+def metrics():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield instrumentation
+    instrumentation.disable()
+    instrumentation.reset()
+
+def _count(stage):
+    return instrumentation.snapshot().get(stage, {}).get("count", 0)
+
+@pytest.mark.parametrize("cls", [CompactEMAMastery, DecayEMAMastery])
+def test_super_chain_is_recorded_once(metrics, cls):
+    engine = cls()
+    engine.update("s1", "t1", 1, datetime(2025, 1, 1))
+    engine.update("s1", "t1", 0, datetime(2025, 1, 2))
+    assert _count("mastery.update") == 2
+
+def test_guard_is_per_thread(metrics):
+    engine = DecayEMAMastery()
+    threads = [threading.Thread(target=engine.update, args=(f"s{i}", "t1", 1, datetime(2025, 1, 1)))
+               for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert _count("mastery.update") == 4
@@ -0,0 +1,38 @@
+# tests/test_mastery.py
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from compact_mastery import CompactSM2Mastery
+from mastery import SM2Mastery
+
+TOPICS = [f"t{i}" for i in range(30)]
+STUDENTS = ["s1", "s2", "s3"]
+
+def _expected(engine, student_id, now, limit=None):
+    times = sorted(w for w in (engine.get_next_review(student_id, t) for t in TOPICS) if w is not None)
+    due = [w for w in times if w <= now]
+    return due if limit is None else due[:limit], times
+
+@pytest.mark.parametrize("cls", [SM2Mastery, CompactSM2Mastery])
+@pytest.mark.parametrize("track_due", [True, False])
+def test_due_queries_match_a_full_scan(cls, track_due):
+    rng = random.Random(7)
+    engine = cls(track_due=track_due)
+    now = datetime(2025, 1, 1)
+    for step in range(1500):
+        now += timedelta(hours=rng.randint(0, 30))
+        student_id, topic_id = rng.choice(STUDENTS), rng.choice(TOPICS)
+        if rng.random() < 0.05:
+            engine.reset(student_id, topic_id)
+        else:
+            engine.update(student_id, topic_id, rng.random() < 0.4, now)
+        if step % 5 == 0:
+            limit = rng.choice([None, 1, 3])
+            due, times = _expected(engine, student_id, now, limit)
+            got = engine.due_topics(student_id, now=now, limit=limit)
+            assert [engine.get_next_review(student_id, t) for t in got] == due
+            top = engine.top_due(student_id, 4)
+            assert [engine.get_next_review(student_id, t) for t in top] == times[:4]
+    assert engine.top_due("s1", 0) == engine.top_due("s1", -1) == []
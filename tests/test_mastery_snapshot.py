@@ -0,0 +1,62 @@
+# tests/test_mastery_snapshot.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import interaction_log
+from interaction_log import InteractionLog, log_positions
+from mastery import EMAMastery
+from mastery_snapshot import SnapshotEMAMastery, engine_from_progress, progress_as_of, save_snapshot
+from progress_store import JSONProgressStore
+
+class _App:
+    """Answers written the way app.py writes them: progress entry, then the log row."""
+    def __init__(self, tmp_path):
+        self.store = JSONProgressStore(str(tmp_path / "progress.json"))
+        self.csv = str(tmp_path / "students.csv")
+        self.log = InteractionLog(self.csv)
+        self.ref = EMAMastery()
+        self.now = datetime(2025, 1, 1)
+
+    def answer(self, sid, tid, correct):
+        self.now += timedelta(minutes=1)
+        self.ref.update(sid, tid, correct, self.now)
+        entry = self.store.load_entry(sid, tid) or {"attempts": 0, "corrects": 0}
+        entry.update(attempts=entry["attempts"] + 1, corrects=entry["corrects"] + correct,
+                     last_review=self.now.isoformat(), mastery=self.ref.get_mastery(sid, tid))
+        self.store.upsert(sid, tid, entry)
+        self.log.append(sid, tid, correct, timestamp=self.now)
+        self.log.flush()
+
+    def snapshot(self, path):
+        log_at = log_positions(self.csv)
+        progress = self.store.load_all()
+        save_snapshot(engine_from_progress(progress), path, as_of=progress_as_of(progress), log_at=log_at)
+
+@pytest.fixture
+def app(tmp_path):
+    app = _App(tmp_path)
+    for i in range(200):
+        app.answer(f"s{i % 4}", f"t{i % 3}", i % 3 > 0)
+    app.snapshot(str(tmp_path / "snap"))
+    return app
+
+def test_progress_store_resets_and_newer_entries(app, tmp_path):
+    app.answer("s0", "t0", 0)
+    app.store.delete("s0", "t1")
+    app.ref.reset("s0", "t1")
+    engine = SnapshotEMAMastery(str(tmp_path / "snap"), progress=app.store)
+    for tid in ("t0", "t1", "t2"):
+        assert engine.get_mastery("s0", tid) == pytest.approx(app.ref.get_mastery("s0", tid))
+    assert engine.get_last_review("s0", "t1") is None
+
+def test_log_replay_reads_only_rows_after_snapshot(app, tmp_path, monkeypatch):
+    for i in range(10):
+        app.answer(f"s{i % 2}", "t2", i % 2)
+    parsed = []
+    parse = interaction_log._parse_rows
+    monkeypatch.setattr(interaction_log, "_parse_rows", lambda data, header: parsed.append(data.count(b"\n")) or parse(data, header))
+    engine = SnapshotEMAMastery(str(tmp_path / "snap"), replay_log=app.csv)
+    for sid in ("s0", "s1", "s3"):
+        assert engine.get_mastery(sid, "t2") == pytest.approx(app.ref.get_mastery(sid, "t2"))
+    assert sum(parsed) == 10
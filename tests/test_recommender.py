@@ -0,0 +1,53 @@
+# tests/test_recommender.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from compact_mastery import DecayEMAMastery
+from mastery import EMAMastery
+from recommendation_cache import RecommendationCache
+from recommender import Recommender
+
+TOPICS = ["t1", "t2", "t3", "t4"]
+NOW = datetime(2025, 1, 10)
+
+def _recommender(tmp_path, cache=None, engine=None, **kwargs):
+    if engine is None:
+        engine = EMAMastery()
+        engine.update("s1", "t2", 1, datetime(2025, 1, 1))
+        engine.update("s1", "t3", 0, datetime(2025, 1, 5))
+    recommender = Recommender(TOPICS, mastery_engine=engine, data_csv=str(tmp_path / "log.csv"), cache=cache,
+                              **kwargs)
+    recommender.model = None  # score with the mastery engine only
+    return recommender
+
+@pytest.mark.parametrize("n", [-1, 0, 2, 10])
+def test_cached_and_uncached_agree(tmp_path, n):
+    plain = _recommender(tmp_path)
+    cached = _recommender(tmp_path, RecommendationCache())
+    expected = plain.recommend("s1", n, NOW)
+    assert cached.recommend("s1", n, NOW) == expected
+    assert cached.recommend("s1", n, NOW) == expected  # served from the cache
+    assert cached.cache.hits == 1
+
+def _decaying_engine():
+    # t1 is reviewed an hour from NOW and only starts decaying then; t2 decays from NOW on
+    engine = DecayEMAMastery(half_life_days=0.0625)
+    engine.set_state("s1", "t1", 0.5, NOW + timedelta(hours=1))
+    engine.set_state("s1", "t2", 0.6, NOW)
+    return engine
+
+def test_decaying_engine_rankings_expire(tmp_path):
+    plain = _recommender(tmp_path, engine=_decaying_engine())
+    cached = _recommender(tmp_path, RecommendationCache(), engine=_decaying_engine())
+    later = NOW + timedelta(minutes=50)
+    assert plain.recommend("s1", 4, NOW) != plain.recommend("s1", 4, later)  # t2 decayed below t1
+    for when in (NOW, NOW + timedelta(seconds=30), later):
+        assert cached.recommend("s1", 4, when) == plain.recommend("s1", 4, when)
+    assert (cached.cache.hits, cached.cache.misses) == (1, 2)
+
+def test_decaying_engine_caching_can_be_turned_off(tmp_path):
+    cached = _recommender(tmp_path, RecommendationCache(), engine=_decaying_engine(), decay_cache_seconds=0)
+    cached.recommend("s1", 2, NOW)
+    cached.recommend("s1", 2, NOW)
+    assert cached.cache.hits == 0
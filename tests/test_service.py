@@ -0,0 +1,49 @@
+# tests/test_service.py
+import http.client
+import json
+import threading
+
+import pytest
+
+from service import Handler, StudyServer, StudyService
+
+@pytest.fixture
+def server(tmp_path):
+    log_csv = tmp_path / "students.csv"
+    log_csv.write_text("student_id,topic_id,timestamp,correct\n"
+                       "s1,topic_1,2025-01-01T10:00:00,1\n"
+                       "s1,topic_2,2025-01-01T11:00:00,0\n"
+                       "s2,topic_3,2025-01-01T12:00:00,1\n")
+    srv = StudyServer(("127.0.0.1", 0), Handler)
+    srv.service = StudyService(progress_path=str(tmp_path / "progress.db"), log_csv=str(log_csv),
+                               subjects_path=str(tmp_path / "missing.json"), model_path=str(tmp_path / "none.pkl"))
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.service.close()
+    srv.server_close()
+
+def _request(srv, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=10)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None)
+    resp = conn.getresponse()
+    status, payload = resp.status, json.loads(resp.read())
+    conn.close()
+    return status, payload
+
+@pytest.mark.parametrize("n", ["0", "-1"])
+def test_recommend_rejects_n_below_one(server, n):
+    status, payload = _request(server, "GET", f"/recommend?student_id=s1&n={n}")
+    assert status == 400 and "n must be at least 1" in payload["error"]
+    status, _ = _request(server, "POST", "/recommend/bulk", {"student_ids": ["s1"], "n": int(n)})
+    assert status == 400
+
+def test_recommend_and_answer(server):
+    status, payload = _request(server, "GET", "/recommend?student_id=s1&n=2")
+    assert status == 200 and len(payload["topics"]) == 2
+    status, payload = _request(server, "POST", "/answer", {"student_id": "s1", "topic_id": "topic_3", "correct": 1})
+    assert status == 200 and payload["entry"]["attempts"] == 1
+    stored = payload["entry"]["mastery"]
+    status, payload = _request(server, "GET", "/mastery?student_id=s1&topic_id=topic_3")
+    assert status == 200 and payload["mastery"] == {"topic_3": stored}
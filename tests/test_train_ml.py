@@ -0,0 +1,46 @@
+# tests/test_train_ml.py
+import glob
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import train_ml
+from feature_store import FEATURE_COLUMNS
+
+def _log(path, n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    students = rng.integers(0, 40, n)
+    times = datetime(2025, 1, 1) + pd.to_timedelta(np.cumsum(rng.integers(1, 3600, n)), unit="s")
+    pd.DataFrame({
+        "student_id": [f"student_{s}" for s in students],
+        "topic_id": [f"topic_{t}" for t in rng.integers(0, 6, n)],
+        "timestamp": times,
+        "correct": (rng.random(n) < 0.6).astype(int),
+    }).to_csv(path, index=False)
+
+@pytest.mark.parametrize("window", [1, 5])
+def test_feature_shards_match_build_features(tmp_path, window):
+    src = str(tmp_path / "students.csv")
+    _log(src)
+    out = str(tmp_path / "features")
+    # 1000-row chunks: pairs and students span several chunks
+    n = train_ml.build_feature_shards(src, out, window=window, max_memory_mb=0.5)
+    shards = [np.load(p) for p in sorted(glob.glob(os.path.join(out, "part-*.npz")))]
+    assert len(shards) == 5 and n == 5000
+    got = pd.DataFrame({c: np.concatenate([s[c] for s in shards]) for c in FEATURE_COLUMNS + ["label"]})
+    log = pd.read_csv(src, parse_dates=["timestamp"])
+    got["student_id"], got["timestamp"] = log["student_id"], log["timestamp"]
+    # shards keep log order; build_features orders by student, then time
+    got = got.sort_values(["student_id", "timestamp"], kind="mergesort").reset_index(drop=True)
+    want = train_ml.build_features(log, window=window)
+    for c in FEATURE_COLUMNS + ["label"]:
+        np.testing.assert_allclose(got[c].to_numpy(dtype=float), want[c].to_numpy(dtype=float), err_msg=c)
+
+def test_feature_shards_enforce_memory_limit(tmp_path):
+    src = str(tmp_path / "students.csv")
+    _log(src)
+    with pytest.raises(MemoryError):
+        train_ml.build_feature_shards(src, str(tmp_path / "features"), max_memory_mb=0.005)
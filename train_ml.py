@@ -3,59 +3,253 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
 from sklearn.metrics import classification_report, roc_auc_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+import argparse
+import glob
 import joblib
 import os
+import shutil
+import sys
+
+from compiled_forest import can_compile, compiled_path, export_forest
+from feature_store import FEATURE_COLUMNS
+from interaction_log import iter_log_chunks, read_log
 
 MODEL_DIR = "models"
 MODEL_PATH = os.path.join(MODEL_DIR, "rf_study_recommender.pkl")
+FEATURES_DIR = os.path.join(MODEL_DIR, "features")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# rough peak footprint of one log row while its features are built (pandas objects,
+# sort buffers, feature columns); used to turn a memory limit into a chunk size
+BYTES_PER_ROW = 512
+# dict slot and index int per student / topic id in the streaming state (plus the id itself)
+ID_ENTRY_BYTES = 100
+# one sampled feature row while a forest is fit (float64 X and y while shards are stacked,
+# sklearn's float32 copy, bootstrap weights) and one tree node (node struct + class counts)
+SAMPLE_BYTES_PER_ROW = 200
+TREE_NODE_BYTES = 96
+NAT = np.datetime64("NaT", "us")
+
 def build_features(df, window=5):
-    rows = []
-    for sid, g in df.groupby('student_id'):
-        g = g.sort_values('timestamp').reset_index(drop=True)
-        topic_total = {}
-        topic_correct = {}
-        for idx, r in g.iterrows():
-            topic = r['topic_id']
-            correct = r['correct']
-            total = topic_total.get(topic, 0)
-            corrects = topic_correct.get(topic, 0)
-            acc = corrects / total if total > 0 else 0.5
-            prevs = g.loc[:idx-1]
-            last_topic_attempts = prevs[prevs['topic_id'] == topic].tail(window)
-            rec_corrects = int(last_topic_attempts['correct'].sum()) if not last_topic_attempts.empty else 0
-            last_time = None
-            if not prevs.empty:
-                last_time = (pd.to_datetime(r['timestamp']) - pd.to_datetime(prevs.iloc[-1]['timestamp'])).total_seconds() / 3600.0
-            else:
-                last_time = 9999.0
-            rows.append({
-                "student_id": sid,
-                "topic_id": topic,
-                "total_attempts_on_topic": total,
-                "accuracy_on_topic": acc,
-                "recent_corrects_on_topic": rec_corrects,
-                "hours_since_last_activity": last_time,
-                "label": correct
-            })
-            topic_total[topic] = total + 1
-            topic_correct[topic] = corrects + int(correct)
-    return pd.DataFrame(rows)
+    """
+    One row per event with the features known just before that event:
+    - total_attempts_on_topic / accuracy_on_topic: earlier attempts on the topic
+    - recent_corrects_on_topic: corrects in the previous `window` attempts on the topic
+    - hours_since_last_activity: gap to the student's previous event (9999 if none)
+    Rows are ordered by student, then time. Uses cumulative sums and shifted
+    windows per group instead of rescanning history, so it runs in O(n log n).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=["student_id", "topic_id"] + FEATURE_COLUMNS + ["label"])
+    df = df.sort_values(['student_id', 'timestamp'], kind='mergesort').reset_index(drop=True)
+    correct = df['correct'].astype(np.int64)
+    pair_id = df.groupby(['student_id', 'topic_id'], sort=False, observed=True).ngroup()
+    # attempts and corrects on this topic before the event
+    total = correct.groupby(pair_id).cumcount()
+    corrects = correct.groupby(pair_id).cumsum() - correct
+    acc = np.where(total > 0, corrects / total.where(total > 0, 1), 0.5)
+    # corrects in the previous `window` attempts = running sum minus the sum `window` attempts back
+    rec_corrects = corrects - corrects.groupby(pair_id).shift(window, fill_value=0)
+    # gap to the student's previous event
+    gap = df.groupby('student_id', sort=False, observed=True)['timestamp'].diff()
+    hours_since = (gap.dt.total_seconds() / 3600.0).fillna(9999.0)
+    return pd.DataFrame({
+        "student_id": df['student_id'],
+        "topic_id": df['topic_id'],
+        "total_attempts_on_topic": total.to_numpy(),
+        "accuracy_on_topic": acc,
+        "recent_corrects_on_topic": rec_corrects.to_numpy(),
+        "hours_since_last_activity": hours_since.to_numpy(),
+        "label": correct.to_numpy(),
+    })
 
-def train_and_save(csv_path="data/students.csv"):
-    df = pd.read_csv(csv_path)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    features_df = build_features(df)
-    X = features_df[["total_attempts_on_topic", "accuracy_on_topic", "recent_corrects_on_topic", "hours_since_last_activity"]].fillna(0)
-    y = features_df['label']
-    if len(y.unique()) == 1:
-        print("Warning: only one class present in data. Need balanced labels to train.")
-        return
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-    clf = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
-    clf.fit(X_train, y_train)
+# ---------- Streaming (chunked) feature building ----------
+class _StreamState:
+    """
+    What the streaming feature builder knows about the log before the current chunk,
+    in flat arrays: per (student, topic) pair the attempts, corrects and a ring of the
+    last `window` outcomes, per student the time of the last event. Pairs are found by
+    an int64 key (student index << 32 | topic index) in a sorted array, so a chunk costs
+    a binary search per distinct pair in it plus one insert of the pairs new to it.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.student_index = {}  # student_id -> index into last_time
+        self.topic_index = {}
+        self.keys = np.empty(0, dtype=np.int64)  # sorted pair keys
+        self.rows = np.empty(0, dtype=np.int32)  # state row of each key
+        self.total = np.zeros(0, dtype=np.int32)
+        self.corrects = np.zeros(0, dtype=np.int32)
+        self.ring = np.zeros((0, window), dtype=np.int8)  # outcome of attempt i at column i % window
+        self.last_time = np.full(0, NAT)
+        self.n_pairs = 0
+        self._id_bytes = 0
+
+    @property
+    def nbytes(self):
+        """Memory held by the state: arrays (with spare capacity) plus the id dicts."""
+        arrays = (self.keys, self.rows, self.total, self.corrects, self.ring, self.last_time)
+        return sum(a.nbytes for a in arrays) + self._id_bytes
+
+    def _ids(self, mapping, values):
+        codes, uniques = pd.factorize(values)
+        n_before = len(mapping)
+        idx = np.fromiter((mapping.setdefault(u, len(mapping)) for u in uniques), dtype=np.int64, count=len(uniques))
+        self._id_bytes += sum(sys.getsizeof(u) + ID_ENTRY_BYTES for u in uniques[idx >= n_before])
+        return idx[codes]
+
+    def _grow(self, n):
+        """Room for n pairs and for every student seen."""
+        if n > len(self.total):
+            cap = max(n, len(self.total) * 3 // 2)
+            for name in ("total", "corrects", "ring"):
+                old = getattr(self, name)
+                new = np.zeros((cap,) + old.shape[1:], dtype=old.dtype)
+                new[:len(old)] = old
+                setattr(self, name, new)
+        if len(self.student_index) > len(self.last_time):
+            cap = max(len(self.student_index), len(self.last_time) * 3 // 2)
+            self.last_time = np.concatenate([self.last_time, np.full(cap - len(self.last_time), NAT)])
+
+    def _pair_rows(self, keys):
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        pos = np.searchsorted(self.keys, uniq)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == uniq[found]
+        new = ~found
+        rows = np.empty(len(uniq), dtype=np.int32)
+        rows[found] = self.rows[pos[found]]
+        rows[new] = np.arange(self.n_pairs, self.n_pairs + new.sum())
+        if new.any():
+            self.keys = np.insert(self.keys, pos[new], uniq[new])
+            self.rows = np.insert(self.rows, pos[new], rows[new])
+            self.n_pairs += int(new.sum())
+        self._grow(self.n_pairs)
+        return rows[inverse]
+
+    def features(self, chunk):
+        """
+        Feature columns (FEATURE_COLUMNS + label, in chunk row order) of the next chunk
+        of the log, then the chunk is folded into the state.
+        """
+        w = self.window
+        n = len(chunk)
+        s = self._ids(self.student_index, chunk['student_id'])
+        t = self._ids(self.topic_index, chunk['topic_id'])
+        p = self._pair_rows((s << 32) | t)
+        ts = chunk['timestamp'].to_numpy(dtype="datetime64[us]")
+        correct = chunk['correct'].to_numpy(dtype=np.int64)
+        positions = np.arange(n)
+
+        # gap to the student's previous event, in this chunk or an earlier one
+        order = np.argsort(s, kind="stable")
+        s_sorted, ts_sorted = s[order], ts[order]
+        first = np.r_[True, s_sorted[1:] != s_sorted[:-1]]
+        prev = np.r_[NAT, ts_sorted[:-1]]
+        prev[first] = self.last_time[s_sorted[first]]
+        hours = np.empty(n)
+        hours[order] = np.where(np.isnat(prev), 9999.0, (ts_sorted - prev) / np.timedelta64(1, "h"))
+        last = np.r_[s_sorted[1:] != s_sorted[:-1], True]
+        self.last_time[s_sorted[last]] = ts_sorted[last]
+
+        # per pair, in log order: attempts and corrects before each event
+        order = np.argsort(p, kind="stable")
+        p_sorted, c_sorted = p[order], correct[order]
+        starts = np.flatnonzero(np.r_[True, p_sorted[1:] != p_sorted[:-1]])
+        group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+        k = positions - starts[group]  # earlier attempts on the pair within this chunk
+        cum = np.r_[0, np.cumsum(c_sorted)]  # cum[i]: corrects in sorted rows before i
+        prior_total = self.total[p_sorted]
+        total = prior_total + k
+        corrects = self.corrects[p_sorted] + cum[:-1] - cum[starts][group]
+        # corrects in the previous `w` attempts: those in this chunk, plus the newest
+        # w - k outcomes in the ring when there are fewer than w in the chunk
+        recent = cum[:-1] - cum[np.maximum(positions - w, starts[group])]
+        short = np.flatnonzero(k < w)
+        if len(short):
+            rows, prior = p_sorted[short], prior_total[short].astype(np.int64)
+            back = np.arange(w)  # 0 = newest
+            slots = (prior[:, None] - 1 - back) % w
+            outcomes = self.ring[rows[:, None], slots].astype(np.int64) * (back < prior[:, None])
+            newest = np.concatenate([np.zeros((len(short), 1), dtype=np.int64), np.cumsum(outcomes, axis=1)], axis=1)
+            recent[short] += newest[np.arange(len(short)), w - k[short]]
+
+        # fold the chunk in: the last w outcomes of each pair go to the ring
+        sizes = np.diff(np.r_[starts, n])
+        tail = k >= sizes[group] - w
+        self.ring[p_sorted[tail], (prior_total[tail] + k[tail]) % w] = c_sorted[tail]
+        self.total[p_sorted[starts]] += sizes.astype(np.int32)
+        self.corrects[p_sorted[starts]] += (cum[starts + sizes] - cum[starts]).astype(np.int32)
+
+        columns = {}
+        for name, values in (("total_attempts_on_topic", total),
+                             ("accuracy_on_topic", np.where(total > 0, corrects / np.maximum(total, 1), 0.5)),
+                             ("recent_corrects_on_topic", recent)):
+            columns[name] = np.empty(n, dtype=values.dtype)
+            columns[name][order] = values
+        columns["hours_since_last_activity"] = hours
+        columns["label"] = correct.astype(np.int8)
+        return columns
+
+def rows_for_memory(max_memory_mb, bytes_per_row=BYTES_PER_ROW):
+    """Number of rows processed at once under a memory limit."""
+    return max(1000, int(max_memory_mb * 2**20 // bytes_per_row))
+
+def build_feature_shards(csv_path="data/students.csv", out_dir=FEATURES_DIR, window=5, max_memory_mb=512):
+    """
+    Stream the log in chunks and write its features to out_dir as columnar shards
+    (part-NNNNN.npz, one array per feature column plus label), with the same rows as
+    build_features. Half of max_memory_mb goes to the chunk being processed, half to the
+    state carried between chunks (_StreamState: about 20 bytes per (student, topic)
+    pair plus the student ids); MemoryError once that state outgrows its half.
+    Each student's events must appear in time order in the file, which holds for logs
+    appended by app.py and written by data_gen.py (the columnar file and date partitions
+    of the log are read in log order, see interaction_log.log_files).
+    Returns the number of rows written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, "part-*.npz")):
+        os.remove(old)
+    state = _StreamState(window)
+    state_budget = max_memory_mb * 2**20 // 2
+    n_rows = 0
+    for i, chunk in enumerate(iter_log_chunks(csv_path, chunksize=rows_for_memory(max_memory_mb / 2))):
+        columns = state.features(chunk)
+        del chunk
+        np.savez(os.path.join(out_dir, f"part-{i:05d}.npz"), **columns)
+        n_rows += len(columns["label"])
+        if state.nbytes > state_budget:
+            raise MemoryError(f"streaming state for {state.n_pairs} (student, topic) pairs needs "
+                              f"{state.nbytes / 2**20:.1f} MB, over half of max_memory_mb={max_memory_mb}")
+    return n_rows
+
+def iter_feature_shards(feature_dir=FEATURES_DIR, fraction=1.0, holdout=0.2, split="train", seed=42):
+    """
+    Yield (X, y) per shard. Each shard is split into train/test with a fixed seed
+    (holdout share goes to "test") and optionally subsampled to `fraction` of its rows.
+    """
+    for i, path in enumerate(sorted(glob.glob(os.path.join(feature_dir, "part-*.npz")))):
+        with np.load(path) as shard:
+            X = np.column_stack([shard[c] for c in FEATURE_COLUMNS]).astype(float)
+            y = shard["label"].astype(np.int64)
+        rng = np.random.default_rng([seed, i])
+        is_test = rng.random(len(y)) < holdout
+        keep = is_test if split == "test" else ~is_test
+        if fraction < 1.0:
+            keep &= rng.random(len(y)) < fraction
+        yield np.nan_to_num(X[keep]), y[keep]
+
+def _collect(shards):
+    parts = list(shards)
+    if not parts:
+        return np.empty((0, len(FEATURE_COLUMNS))), np.empty(0, dtype=np.int64)
+    return np.vstack([X for X, _ in parts]), np.concatenate([y for _, y in parts])
+
+def _report_and_save(clf, X_test, y_test):
     pred = clf.predict(X_test)
     prob = clf.predict_proba(X_test)[:,1]
     print(classification_report(y_test, pred))
@@ -65,6 +259,73 @@ def train_and_save(csv_path="data/students.csv"):
         pass
     joblib.dump(clf, MODEL_PATH)
     print("Saved model to", MODEL_PATH)
+    if can_compile(clf):
+        # flat node arrays served by the recommender (faster to load and to predict with)
+        export_forest(clf, compiled_path(MODEL_PATH))
+        print("Saved compiled model to", compiled_path(MODEL_PATH))
+    else:
+        shutil.rmtree(compiled_path(MODEL_PATH), ignore_errors=True)  # don't serve an older forest
+
+def train_streaming(csv_path="data/students.csv", learner="rf", max_memory_mb=512, window=5, feature_dir=FEATURES_DIR):
+    """
+    Out-of-core training: features are built chunk by chunk into on-disk shards, then
+    - learner="rf": a RandomForest is fit on a row sample of the shards, with the sample
+      and the trees' leaf count each sized to half of the memory limit
+    - learner="sgd": a scaled logistic-regression SGD model is fit shard by shard with partial_fit
+    Beyond the interpreter and its libraries, peak memory stays near max_memory_mb
+    rather than growing with the size of the log (see build_feature_shards).
+    """
+    n_rows = build_feature_shards(csv_path, feature_dir, window=window, max_memory_mb=max_memory_mb)
+    if n_rows == 0:
+        print("Warning: no interactions in", csv_path)
+        return
+    budget = max_memory_mb * 2**20 // 2
+    fraction = min(1.0, rows_for_memory(max_memory_mb / 2, SAMPLE_BYTES_PER_ROW) / n_rows)
+    X_test, y_test = _collect(iter_feature_shards(feature_dir, fraction=fraction, split="test"))
+    if learner == "sgd":
+        scaler = StandardScaler()
+        for X, _ in iter_feature_shards(feature_dir):
+            if len(X):
+                scaler.partial_fit(X)
+        sgd = SGDClassifier(loss="log_loss", learning_rate="adaptive", eta0=0.01, random_state=42)
+        for X, y in iter_feature_shards(feature_dir):
+            if len(X):
+                sgd.partial_fit(scaler.transform(X), y, classes=np.array([0, 1]))
+        clf = Pipeline([("scaler", scaler), ("clf", sgd)])
+    else:
+        X_train, y_train = _collect(iter_feature_shards(feature_dir, fraction=fraction))
+        if len(np.unique(y_train)) < 2:
+            print("Warning: only one class present in data. Need balanced labels to train.")
+            return
+        n_estimators = 200
+        # a tree with L leaves has 2L - 1 nodes
+        max_leaf_nodes = max(2, budget // (n_estimators * 2 * TREE_NODE_BYTES))
+        print(f"Fitting RandomForest on {len(y_train)} of {n_rows} rows, at most {max_leaf_nodes} leaves per tree")
+        clf = RandomForestClassifier(n_estimators=n_estimators, max_leaf_nodes=max_leaf_nodes, random_state=42, n_jobs=-1)
+        clf.fit(X_train, y_train)
+    _report_and_save(clf, X_test, y_test)
+
+def train_and_save(csv_path="data/students.csv"):
+    df = read_log(csv_path)
+    features_df = build_features(df)
+    X = features_df[FEATURE_COLUMNS].fillna(0)
+    y = features_df['label']
+    if len(y.unique()) == 1:
+        print("Warning: only one class present in data. Need balanced labels to train.")
+        return
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    clf = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
+    clf.fit(X_train, y_train)
+    _report_and_save(clf, X_test, y_test)
 
 if __name__ == "__main__":
-    train_and_save()
+    parser = argparse.ArgumentParser(description="Train the study recommender model.")
+    parser.add_argument("--csv", default="data/students.csv")
+    parser.add_argument("--stream", action="store_true", help="read the log in chunks (for logs that do not fit in RAM)")
+    parser.add_argument("--learner", choices=["rf", "sgd"], default="rf", help="model used with --stream")
+    parser.add_argument("--max-memory-mb", type=int, default=512, help="memory limit used with --stream")
+    args = parser.parse_args()
+    if args.stream:
+        train_streaming(args.csv, learner=args.learner, max_memory_mb=args.max_memory_mb)
+    else:
+        train_and_save(args.csv)
@@ -0,0 +1,78 @@
+# utils/helpers.py
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-process use only
+    fcntl = None
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive advisory lock held on `path` (created if missing) for the duration
+    of the block. Serializes writers across processes on the same host.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+class StripedLock:
+    """
+    `stripes` exclusive locks keyed by string (e.g. a student id). A key's stripe is a
+    threading.Lock plus flock on its own file in the `path` directory (flock, not
+    lockf: POSIX record locks belong to the process, and threads of two processes
+    waiting on each other's stripes are refused as a deadlock). Keys on different
+    stripes never wait for each other.
+    """
+    def __init__(self, path, stripes=64):
+        self.path = path
+        self.stripes = stripes
+        os.makedirs(path, exist_ok=True)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._threads = [threading.Lock() for _ in range(self.stripes)]
+        self._fds = [None] * self.stripes  # opened on first use
+
+    def stripe(self, key):
+        # crc32, not hash(): every process must map a key to the same stripe
+        return zlib.crc32(str(key).encode("utf-8")) % self.stripes
+
+    @contextmanager
+    def hold(self, key):
+        if os.getpid() != self._pid:
+            # forked: inherited descriptors share the parent's flock, and thread locks may be held
+            for fd in self._fds:
+                if fd is not None:
+                    os.close(fd)
+            self._reset()
+        i = self.stripe(key)
+        with self._threads[i]:
+            fd = self._fds[i]
+            if fd is None:
+                fd = self._fds[i] = os.open(os.path.join(self.path, f"{i:04d}"), os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+
+def atomic_write_text(path, text, encoding="utf-8"):
+    """Write `text` to `path` via a temp file + rename, so readers never see a partial file."""
+    # unique per thread too: two threads of one process may write the same path
+    tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w", encoding=encoding) as f:
+        f.write(text)
+    os.replace(tmp, path)